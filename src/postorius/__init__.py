@@ -17,3 +17,5 @@
 # Postorius.  If not, see <http://www.gnu.org/licenses/>.
 
 __version__ = '1.0.1'
+
+default_app_config = 'postorius.apps.PostoriusConfig'
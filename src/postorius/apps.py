@@ -0,0 +1,43 @@
+# -*- coding: utf-8 -*-
+# Copyright (C) 1998-2015 by the Free Software Foundation, Inc.
+#
+# This file is part of Postorius.
+#
+# Postorius is free software: you can redistribute it and/or modify it under
+# the terms of the GNU General Public License as published by the Free
+# Software Foundation, either version 3 of the License, or (at your option)
+# any later version.
+#
+# Postorius is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or
+# FITNESS FOR A PARTICULAR PURPOSE.  See the GNU General Public License for
+# more details.
+#
+# You should have received a copy of the GNU General Public License along with
+# Postorius.  If not, see <http://www.gnu.org/licenses/>.
+
+from django.apps import AppConfig
+from django.conf import settings
+
+
+def _precompile_templates(sender, **kwargs):
+    from django.core.signals import request_started
+    from postorius.utils import precompile_templates
+    request_started.disconnect(dispatch_uid='postorius.precompile_templates')
+    precompile_templates()
+
+
+class PostoriusConfig(AppConfig):
+    name = 'postorius'
+    verbose_name = 'Postorius'
+
+    def ready(self):
+        # With the cached template loader, compile the templates when the
+        # first request starts instead of on the first request using each
+        # of them. Not done here, so that django.setup() stays fast for
+        # management commands.
+        if getattr(settings, 'PRECOMPILE_TEMPLATES', False):
+            from django.core.signals import request_started
+            request_started.connect(
+                _precompile_templates,
+                dispatch_uid='postorius.precompile_templates')
@@ -18,29 +18,160 @@
 """Postorius view decorators."""
 
 
-from django.contrib.auth import logout, authenticate, login
+import hmac
+import binascii
+import time
+import hashlib
+import threading
+
+from django.conf import settings
+from django.contrib.auth import authenticate
+from django.contrib.auth.models import User
+from django.core import signing
 from django.core.exceptions import PermissionDenied
+from django.middleware.csrf import CsrfViewMiddleware
+from django.utils.crypto import constant_time_compare, salted_hmac
 
 from postorius.models import (Domain, List, Member, MailmanUser,
                               MailmanApiError, Mailman404Error)
 
 
+API_AUTH_CACHE_TIMEOUT = getattr(settings, 'API_AUTH_CACHE_TIMEOUT', 300)
+API_TOKEN_MAX_AGE = getattr(settings, 'API_TOKEN_MAX_AGE', 3600)
+
+API_TOKEN_SALT = 'postorius.api.token'
+
+# Maps a digest of verified credentials to a user id, the password hash of
+# that user and an expiry time.
+_verified_credentials = {}
+_verified_credentials_lock = threading.Lock()
+
+
+def _credentials_digest(username, password):
+    # Keyed with the secret key, so the cache holds nothing that could be
+    # used to recover or replay the password.
+    return hmac.new(settings.SECRET_KEY,
+                    u'{0}:{1}'.format(username, password).encode('utf-8'),
+                    hashlib.sha256).hexdigest()
+
+
+def _get_active_user(user_id):
+    try:
+        return User.objects.get(pk=user_id, is_active=True)
+    except User.DoesNotExist:
+        return None
+
+
+def authenticate_basic(username, password):
+    """Checks basic auth credentials.
+
+    Verified credentials are remembered in memory for
+    ``API_AUTH_CACHE_TIMEOUT`` seconds, so that API clients don't pay for
+    the password hashing on every request. Remembered credentials stop
+    working as soon as the password of the user is changed.
+    """
+    digest = _credentials_digest(username, password)
+    now = time.time()
+    with _verified_credentials_lock:
+        user_id, password_hash, expires = _verified_credentials.get(
+            digest, (None, None, 0))
+    if expires > now:
+        user = _get_active_user(user_id)
+        if user is not None and user.password == password_hash:
+            return user
+    user = authenticate(username=username, password=password)
+    if user is not None and not user.is_active:
+        user = None
+    with _verified_credentials_lock:
+        for key, (_, _, key_expires) in _verified_credentials.items():
+            if key_expires <= now:
+                del _verified_credentials[key]
+        _verified_credentials.pop(digest, None)
+        if user is not None:
+            _verified_credentials[digest] = (user.pk, user.password,
+                                             now + API_AUTH_CACHE_TIMEOUT)
+    return user
+
+
+def _password_digest(user):
+    # Changes with the password, so that changing it revokes the tokens.
+    return salted_hmac(API_TOKEN_SALT, user.password).hexdigest()[:20]
+
+
+def make_api_token(user):
+    """Returns a signed token authenticating ``user`` to the API.
+
+    The token is valid for ``API_TOKEN_MAX_AGE`` seconds, or until the
+    password of the user is changed.
+    """
+    return signing.TimestampSigner(salt=API_TOKEN_SALT).sign(
+        '{0}:{1}'.format(user.pk, _password_digest(user)))
+
+
+def authenticate_token(token):
+    """Returns the user of an API token, or None if it is invalid."""
+    try:
+        value = signing.TimestampSigner(salt=API_TOKEN_SALT).unsign(
+            token, max_age=API_TOKEN_MAX_AGE)
+    except signing.BadSignature:
+        return None
+    user_id, _, digest = value.partition(':')
+    user = _get_active_user(user_id)
+    if user is None or not constant_time_compare(digest,
+                                                 _password_digest(user)):
+        return None
+    return user
+
+
 def basic_auth_login(fn):
+    """Authenticates API requests without creating a session.
+
+    Accepts ``Authorization: Basic`` credentials and the tokens made by
+    ``make_api_token`` (``Authorization: Token <token>``). The user is only
+    set on the request, which is marked as authenticated by credentials.
+    """
     def wrapper(*args, **kwargs):
         request = args[0]
-        if request.user.is_authenticated():
-            print 'already logged in'
-        if not request.user.is_authenticated():
-            if request.META.has_key('HTTP_AUTHORIZATION'):
-                authmeth, auth = request.META['HTTP_AUTHORIZATION'].split(' ',
-                                                                          1)
-                if authmeth.lower() == 'basic':
-                    auth = auth.strip().decode('base64')
-                    username, password = auth.split(':', 1)
-                    user = authenticate(username=username, password=password)
-                    if user:
-                        login(request, user)
-        return fn(request, **kwargs)
+        if not request.user.is_authenticated() and \
+                'HTTP_AUTHORIZATION' in request.META:
+            try:
+                authmeth, auth = request.META['HTTP_AUTHORIZATION'].split(
+                    ' ', 1)
+            except ValueError:
+                authmeth, auth = None, None
+            user = None
+            if authmeth and authmeth.lower() == 'basic':
+                try:
+                    username, password = auth.strip().decode(
+                        'base64').split(':', 1)
+                except (ValueError, binascii.Error):
+                    username, password = None, None
+                if username is not None:
+                    user = authenticate_basic(username, password)
+            elif authmeth and authmeth.lower() == 'token':
+                user = authenticate_token(auth.strip())
+            if user is not None:
+                request.user = user
+                request._postorius_api_auth = True
+        return fn(*args, **kwargs)
+    return wrapper
+
+
+def csrf_protect_sessions(fn):
+    """Checks the CSRF token of requests not authenticated by
+    ``basic_auth_login``.
+
+    For views exempt from the CSRF middleware that API clients post to:
+    browsers send the session cookie along with requests from other sites,
+    but not API credentials. Use it below ``basic_auth_login``.
+    """
+    def wrapper(request, *args, **kwargs):
+        if not getattr(request, '_postorius_api_auth', False):
+            rejected = CsrfViewMiddleware().process_view(request, None, (),
+                                                         {})
+            if rejected is not None:
+                return rejected
+        return fn(request, *args, **kwargs)
     return wrapper
 
 
@@ -58,11 +189,10 @@ def list_owner_required(fn):
             return fn(*args, **kwargs)
         if getattr(user, 'is_list_owner', None):
             return fn(*args, **kwargs)
-        mlist = List.objects.get_or_404(fqdn_listname=list_id)
-        if user.email not in mlist.owners:
+        List.objects.get_for_request(args[0], list_id)
+        if not user.is_list_owner:
             raise PermissionDenied
         else:
-            user.is_list_owner = True
             return fn(*args, **kwargs)
     return wrapper
 
@@ -83,17 +213,10 @@ def list_moderator_required(fn):
             return fn(*args, **kwargs)
         if getattr(user, 'is_list_moderator', None):
             return fn(*args, **kwargs)
-        mlist = List.objects.get_or_404(fqdn_listname=list_id)
-        if user.email not in mlist.moderators and \
-                user.email not in mlist.owners:
+        List.objects.get_for_request(args[0], list_id)
+        if not (user.is_list_owner or user.is_list_moderator):
             raise PermissionDenied
         else:
-            if user.email in mlist.moderators and \
-                    user.email not in mlist.owners:
-                user.is_list_moderator = True
-            else:
-                user.is_list_moderator = True
-                user.is_list_owner = True
             return fn(*args, **kwargs)
     return wrapper
 
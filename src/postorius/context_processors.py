@@ -21,6 +21,8 @@ import logging
 from django.conf import settings
 from django.core.urlresolvers import reverse, NoReverseMatch
 
+from postorius.storage import bundles_enabled
+
 logger = logging.getLogger(__name__)
 
 
@@ -47,4 +49,7 @@ def postorius(request):
         'postorius_base_template': template_to_extend,
         'request': request,
         'hyperkitty_url': hyperkitty_url,
+        'fragment_cache_timeout': getattr(
+            settings, 'FRAGMENT_CACHE_TIMEOUT', 300),
+        'static_bundles': bundles_enabled(),
     }
@@ -0,0 +1,133 @@
+# -*- coding: utf-8 -*-
+# Copyright (C) 2012-2015 by the Free Software Foundation, Inc.
+#
+# This file is part of Postorius.
+#
+# Postorius is free software: you can redistribute it and/or modify it under
+# the terms of the GNU General Public License as published by the Free
+# Software Foundation, either version 3 of the License, or (at your option)
+# any later version.
+# Postorius is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or
+# FITNESS FOR A PARTICULAR PURPOSE.  See the GNU General Public License for
+# more details.
+#
+# You should have received a copy of the GNU General Public License along with
+# Postorius.  If not, see <http://www.gnu.org/licenses/>.
+
+"""Records the calls made to Mailman's REST API while serving a request.
+
+:func:`postorius.utils.get_client` wraps the connection of every client in
+an :class:`InstrumentedConnection`, which feeds the REST latency metrics.
+While a :class:`RestCallLog` is active in the current thread (see
+:class:`postorius.middleware.RestTimingMiddleware`) the connections created
+during that time also append every call to it.
+"""
+
+import time
+import threading
+
+from collections import namedtuple
+from urllib2 import HTTPError
+
+from postorius import metrics
+
+
+RestCall = namedtuple('RestCall', 'method path status duration size')
+
+_local = threading.local()
+
+
+class RestCallLog(object):
+    """The REST calls made while serving one request."""
+
+    def __init__(self):
+        self.calls = []
+        self.started = time.time()
+
+    def append(self, call):
+        # Connections are shared with worker threads, list.append is
+        # atomic.
+        self.calls.append(call)
+
+    @property
+    def count(self):
+        return len(self.calls)
+
+    @property
+    def duration(self):
+        return sum(call.duration for call in self.calls)
+
+    @property
+    def size(self):
+        return sum(call.size for call in self.calls)
+
+
+def start_log():
+    """Starts recording the REST calls of the current thread."""
+    _local.log = RestCallLog()
+    return _local.log
+
+
+def stop_log():
+    """Stops recording and returns the log, or None if none was started."""
+    log = getattr(_local, 'log', None)
+    _local.log = None
+    return log
+
+
+def current_log():
+    return getattr(_local, 'log', None)
+
+
+class InstrumentedConnection(object):
+    """Wraps a mailmanclient connection and records its calls.
+
+    The calls are recorded in the log that was active when the connection
+    was created, if any, so calls made from thread pools are counted for
+    the request that started them.
+    """
+
+    def __init__(self, connection, log):
+        self._wrapped = connection
+        self._log = log
+
+    def __getattr__(self, name):
+        return getattr(self._wrapped, name)
+
+    def call(self, path, data=None, method=None):
+        if method is None:
+            method = 'GET' if data is None else 'POST'
+        name = path
+        if name.startswith(self._wrapped.baseurl):
+            name = name[len(self._wrapped.baseurl):]
+        started = time.time()
+        status = None
+        size = 0
+        try:
+            response, content = self._wrapped.call(path, data, method)
+            status = response.status
+            size = int(response.get('content-length') or 0)
+            return response, content
+        except HTTPError, e:
+            status = e.code
+            raise
+        finally:
+            duration = time.time() - started
+            method = method.upper()
+            endpoint = metrics.endpoint_name(name)
+            metrics.MAILMAN_REQUEST_DURATION.observe(
+                duration, endpoint=endpoint, method=method)
+            if status is None or status >= 400:
+                metrics.MAILMAN_REQUEST_ERRORS.inc(
+                    endpoint=endpoint, method=method, status=status or 0)
+            if self._log is not None:
+                self._log.append(RestCall(method, name.lstrip('/'), status,
+                                          duration, size))
+
+
+def instrument(client):
+    """Wraps the connection of ``client``."""
+    client._connection = InstrumentedConnection(client._connection,
+                                                current_log())
+    return client
@@ -0,0 +1,47 @@
+# -*- coding: utf-8 -*-
+# Copyright (C) 1998-2015 by the Free Software Foundation, Inc.
+#
+# This file is part of Postorius.
+#
+# Postorius is free software: you can redistribute it and/or modify it under
+# the terms of the GNU General Public License as published by the Free
+# Software Foundation, either version 3 of the License, or (at your option)
+# any later version.
+#
+# Postorius is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or
+# FITNESS FOR A PARTICULAR PURPOSE.  See the GNU General Public License for
+# more details.
+#
+# You should have received a copy of the GNU General Public License along with
+# Postorius.  If not, see <http://www.gnu.org/licenses/>.
+
+from optparse import make_option
+
+from django.core.management.base import BaseCommand, CommandError
+from postorius.models import MailmanApiError, UserIndexEntry
+
+
+class Command(BaseCommand):
+    help = """Updates the local index of Mailman users used by the user index.
+
+Only new users are fetched completely, unless --full is given. Run a full
+refresh now and then to pick up new addresses and deleted users."""
+
+    option_list = BaseCommand.option_list + (
+        make_option('--full', action='store_true', default=False,
+                    help='Fetch the addresses of all users and remove '
+                         'deleted users.'),
+        make_option('--page-size', type='int', default=100,
+                    help='Number of users fetched per REST call.'),
+        )
+
+    def handle(self, *args, **options):
+        try:
+            UserIndexEntry.objects.refresh(page_size=options['page_size'],
+                                           full=options['full'])
+        except MailmanApiError as e:
+            raise CommandError(
+                'Mailman REST API not available: {0}'.format(e))
+        self.stdout.write('Indexed {0} users.'.format(
+            UserIndexEntry.objects.count()))
@@ -0,0 +1,39 @@
+# -*- coding: utf-8 -*-
+# Copyright (C) 1998-2015 by the Free Software Foundation, Inc.
+#
+# This file is part of Postorius.
+#
+# Postorius is free software: you can redistribute it and/or modify it under
+# the terms of the GNU General Public License as published by the Free
+# Software Foundation, either version 3 of the License, or (at your option)
+# any later version.
+#
+# Postorius is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or
+# FITNESS FOR A PARTICULAR PURPOSE.  See the GNU General Public License for
+# more details.
+#
+# You should have received a copy of the GNU General Public License along with
+# Postorius.  If not, see <http://www.gnu.org/licenses/>.
+
+from optparse import make_option
+
+from django.core.management.base import BaseCommand
+from postorius.models import AddressConfirmationProfile
+
+
+class Command(BaseCommand):
+    help = """Deletes expired address confirmation profiles.
+
+Profiles expire after EMAIL_CONFIRMATION_EXPIRATION_DELTA (default: one
+day). Run it from cron."""
+
+    option_list = BaseCommand.option_list + (
+        make_option('--batch-size', type='int', default=1000,
+                    help='Number of profiles deleted per statement.'),
+        )
+
+    def handle(self, *args, **options):
+        deleted = AddressConfirmationProfile.objects.purge_expired(
+            batch_size=options['batch_size'])
+        self.stdout.write('Deleted {0} expired profiles.'.format(deleted))
@@ -0,0 +1,48 @@
+# -*- coding: utf-8 -*-
+# Copyright (C) 1998-2015 by the Free Software Foundation, Inc.
+#
+# This file is part of Postorius.
+#
+# Postorius is free software: you can redistribute it and/or modify it under
+# the terms of the GNU General Public License as published by the Free
+# Software Foundation, either version 3 of the License, or (at your option)
+# any later version.
+#
+# Postorius is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or
+# FITNESS FOR A PARTICULAR PURPOSE.  See the GNU General Public License for
+# more details.
+#
+# You should have received a copy of the GNU General Public License along with
+# Postorius.  If not, see <http://www.gnu.org/licenses/>.
+
+import time
+
+from optparse import make_option
+
+from django.core.management.base import BaseCommand
+from postorius.models import QueuedMail
+
+
+class Command(BaseCommand):
+    help = """Sends the messages in the outgoing mail queue.
+
+Run it from cron, or keep it running with --interval, after disabling the
+worker thread with EMAIL_QUEUE_WORKER = False."""
+
+    option_list = BaseCommand.option_list + (
+        make_option('--interval', type='int', default=0,
+                    help='Send queued messages every INTERVAL seconds '
+                         'instead of exiting after the first run.'),
+        make_option('--batch-size', type='int', default=100,
+                    help='Number of messages sent per SMTP connection.'),
+        )
+
+    def handle(self, *args, **options):
+        while True:
+            sent = QueuedMail.objects.send_queued(
+                batch_size=options['batch_size'])
+            self.stdout.write('Sent {0} messages.'.format(sent))
+            if not options['interval']:
+                break
+            time.sleep(options['interval'])
@@ -0,0 +1,56 @@
+# -*- coding: utf-8 -*-
+# Copyright (C) 1998-2015 by the Free Software Foundation, Inc.
+#
+# This file is part of Postorius.
+#
+# Postorius is free software: you can redistribute it and/or modify it under
+# the terms of the GNU General Public License as published by the Free
+# Software Foundation, either version 3 of the License, or (at your option)
+# any later version.
+#
+# Postorius is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or
+# FITNESS FOR A PARTICULAR PURPOSE.  See the GNU General Public License for
+# more details.
+#
+# You should have received a copy of the GNU General Public License along with
+# Postorius.  If not, see <http://www.gnu.org/licenses/>.
+
+import time
+
+from optparse import make_option
+
+from django.core.management.base import BaseCommand, CommandError
+from postorius.models import ListSnapshot, MailmanApiError
+
+
+class Command(BaseCommand):
+    help = """Stores a snapshot of all mailing lists for the list index.
+
+Run it from cron, or keep it running with --interval. Set
+LIST_INDEX_SNAPSHOT = True to serve the list index from the snapshot."""
+
+    option_list = BaseCommand.option_list + (
+        make_option('--interval', type='int', default=0,
+                    help='Refresh the snapshot every INTERVAL seconds '
+                         'instead of exiting after the first run.'),
+        make_option('--page-size', type='int', default=100,
+                    help='Number of lists fetched per REST call.'),
+        )
+
+    def handle(self, *args, **options):
+        while True:
+            try:
+                ListSnapshot.objects.refresh(page_size=options['page_size'])
+            except MailmanApiError as e:
+                if not options['interval']:
+                    raise CommandError(
+                        'Mailman REST API not available: {0}'.format(e))
+                self.stderr.write(
+                    'Mailman REST API not available: {0}'.format(e))
+            else:
+                self.stdout.write('Stored snapshots of {0} lists.'.format(
+                    ListSnapshot.objects.count()))
+            if not options['interval']:
+                break
+            time.sleep(options['interval'])
@@ -0,0 +1,308 @@
+# -*- coding: utf-8 -*-
+# Copyright (C) 2012-2015 by the Free Software Foundation, Inc.
+#
+# This file is part of Postorius.
+#
+# Postorius is free software: you can redistribute it and/or modify it under
+# the terms of the GNU General Public License as published by the Free
+# Software Foundation, either version 3 of the License, or (at your option)
+# any later version.
+# Postorius is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or
+# FITNESS FOR A PARTICULAR PURPOSE.  See the GNU General Public License for
+# more details.
+#
+# You should have received a copy of the GNU General Public License along with
+# Postorius.  If not, see <http://www.gnu.org/licenses/>.
+
+"""Counters and histograms of Postorius internals.
+
+Metrics are kept in memory by every process. If ``METRICS_DIR`` names a
+directory writable by all web server processes, each process also writes
+its values to a file in it, at most every ``METRICS_FLUSH_INTERVAL``
+seconds (default: 5), and the metrics view adds up the files of all
+processes, so that pre-forking servers report totals::
+
+    >>> METRICS_DIR = '/var/lib/postorius/metrics'
+
+When the metrics are collected, the values of processes that no longer
+run are added to ``metrics-exited.json`` and their files are removed, so
+that the totals never go down, like the counters of a single process.
+"""
+
+import os
+import json
+import errno
+import fcntl
+import time
+import tempfile
+import threading
+
+from collections import OrderedDict
+
+from django.conf import settings
+
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0,
+                   10.0)
+
+# Placeholders for the ids in Mailman REST paths, by the collection they
+# follow.
+_ENDPOINT_IDS = {
+    'addresses': '{address}',
+    'domains': '{domain}',
+    'held': '{id}',
+    'lists': '{list}',
+    'member': '{address}',
+    'members': '{member}',
+    'moderator': '{address}',
+    'owner': '{address}',
+    'requests': '{id}',
+    'users': '{user}',
+}
+
+
+def endpoint_name(path):
+    """Replaces the ids in a Mailman REST path with placeholders."""
+    parts = path.split('?', 1)[0].strip('/').split('/')
+    for index in range(1, len(parts)):
+        placeholder = _ENDPOINT_IDS.get(parts[index - 1])
+        if placeholder is not None and parts[index] != 'find':
+            parts[index] = placeholder
+    return '/'.join(parts)
+
+
+def _is_running(pid):
+    try:
+        os.kill(pid, 0)
+    except OSError, e:
+        return e.errno != errno.ESRCH
+    return True
+
+
+def _read_values(path):
+    """Reads the values written by ``_write_values``."""
+    with open(path) as stream:
+        samples = json.load(stream)
+    return dict(((name, suffix, tuple(tuple(label) for label in labels)),
+                 value) for name, suffix, labels, value in samples)
+
+
+def _write_values(path, values):
+    """Replaces the file at ``path`` with ``values``, in one step."""
+    handle, temp_path = tempfile.mkstemp(dir=os.path.dirname(path),
+                                         suffix='.tmp')
+    with os.fdopen(handle, 'w') as stream:
+        json.dump([[name, suffix, labels, value] for
+                   (name, suffix, labels), value in values.items()], stream)
+    os.rename(temp_path, path)
+
+
+def _add_values(values, other):
+    for key, value in other.items():
+        values[key] = values.get(key, 0) + value
+
+
+def _format_value(value):
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value))
+
+
+def _format_labels(labels):
+    if not labels:
+        return ''
+    return '{' + ','.join(
+        u'{0}="{1}"'.format(name, unicode(value).replace('\\', r'\\')
+                            .replace('"', r'\"').replace('\n', r'\n'))
+        for name, value in labels) + '}'
+
+
+class Counter(object):
+
+    def __init__(self, registry, name):
+        self._registry = registry
+        self.name = name
+
+    def inc(self, amount=1, **labels):
+        self._registry.add(self.name, '', labels, amount)
+
+
+class Histogram(object):
+
+    def __init__(self, registry, name, buckets):
+        self._registry = registry
+        self.name = name
+        self.buckets = tuple(buckets) + (float('inf'),)
+
+    def observe(self, value, **labels):
+        samples = [('_sum', labels, value), ('_count', labels, 1)]
+        for bound in self.buckets:
+            if value <= bound:
+                bucket_labels = dict(labels, le=_format_value(bound))
+                samples.append(('_bucket', bucket_labels, 1))
+        self._registry.add_many(self.name, samples)
+
+
+class Registry(object):
+    """Holds the metrics of this process, see the module docstring."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._metrics = OrderedDict()
+        self._gauges = OrderedDict()
+        self._values = {}
+        self._pid = os.getpid()
+        self._flushed = 0
+
+    def counter(self, name, documentation):
+        self._metrics[name] = ('counter', documentation)
+        return Counter(self, name)
+
+    def histogram(self, name, documentation, buckets=DEFAULT_BUCKETS):
+        self._metrics[name] = ('histogram', documentation)
+        return Histogram(self, name, buckets)
+
+    def gauge(self, name, documentation, collect):
+        """Registers a gauge read when the metrics are exposed.
+
+        ``collect`` returns ``(labels, value)`` pairs. Gauges are not
+        stored, so they report the state seen by the exposing process.
+        """
+        self._gauges[name] = (documentation, collect)
+
+    def add(self, name, suffix, labels, amount):
+        self.add_many(name, [(suffix, labels, amount)])
+
+    def add_many(self, name, samples):
+        with self._lock:
+            if os.getpid() != self._pid:
+                # Forked from the process that collected these values.
+                self._values = {}
+                self._pid = os.getpid()
+            for suffix, labels, amount in samples:
+                key = (name, suffix, tuple(sorted(labels.items())))
+                self._values[key] = self._values.get(key, 0) + amount
+            if self._directory() and time.time() - self._flushed >= \
+                    getattr(settings, 'METRICS_FLUSH_INTERVAL', 5):
+                self._flush()
+
+    def _directory(self):
+        return getattr(settings, 'METRICS_DIR', None)
+
+    def _flush(self):
+        _write_values(os.path.join(self._directory(),
+                                   'metrics-{0}.json'.format(self._pid)),
+                      self._values)
+        self._flushed = time.time()
+
+    def _files(self, directory):
+        """Returns the paths of the metrics files and the pids of the
+        processes that wrote them.
+        """
+        files = []
+        for filename in os.listdir(directory):
+            if (filename.startswith('metrics-') and
+                    filename.endswith('.json')):
+                pid = filename[len('metrics-'):-len('.json')]
+                files.append((os.path.join(directory, filename),
+                              int(pid) if pid.isdigit() else None))
+        return files
+
+    def _fold_exited(self, directory):
+        """Adds the values of processes that have exited to
+        ``metrics-exited.json`` and removes their files.
+        """
+        exited = [path for path, pid in self._files(directory)
+                  if pid is not None and not _is_running(pid)]
+        if not exited:
+            return
+        exited_path = os.path.join(directory, 'metrics-exited.json')
+        try:
+            values = _read_values(exited_path)
+        except IOError:
+            values = {}
+        folded = []
+        for path in exited:
+            try:
+                _add_values(values, _read_values(path))
+            except ValueError:
+                pass
+            except IOError:
+                continue
+            folded.append(path)
+        _write_values(exited_path, values)
+        for path in folded:
+            os.remove(path)
+
+    def collect(self):
+        """Returns the values of all processes."""
+        directory = self._directory()
+        if not directory:
+            with self._lock:
+                return dict(self._values)
+        with self._lock:
+            self._flush()
+        values = {}
+        # The lock keeps other processes from folding the same files at
+        # the same time, or while the files are being added up.
+        with open(os.path.join(directory, 'metrics.lock'), 'a') as lock:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            try:
+                self._fold_exited(directory)
+                for path, pid in self._files(directory):
+                    try:
+                        _add_values(values, _read_values(path))
+                    except (IOError, ValueError):
+                        continue
+            finally:
+                fcntl.flock(lock, fcntl.LOCK_UN)
+        return values
+
+    def exposition(self):
+        """Returns the metrics in the Prometheus text format."""
+        values = self.collect()
+        lines = []
+        for name, (kind, documentation) in self._metrics.items():
+            lines.append(u'# HELP {0} {1}'.format(name, documentation))
+            lines.append(u'# TYPE {0} {1}'.format(name, kind))
+            for (sample, suffix, labels), value in sorted(values.items()):
+                if sample == name:
+                    lines.append(u'{0}{1}{2} {3}'.format(
+                        name, suffix, _format_labels(labels),
+                        _format_value(value)))
+        for name, (documentation, collect) in self._gauges.items():
+            lines.append(u'# HELP {0} {1}'.format(name, documentation))
+            lines.append(u'# TYPE {0} gauge'.format(name))
+            for labels, value in collect():
+                lines.append(u'{0}{1} {2}'.format(
+                    name, _format_labels(sorted(labels.items())),
+                    _format_value(value)))
+        return u'\n'.join(lines) + u'\n'
+
+
+def _mail_queue_depth():
+    from postorius.models import QueuedMail
+    return [({}, QueuedMail.objects.pending().count())]
+
+
+REGISTRY = Registry()
+
+VIEW_DURATION = REGISTRY.histogram(
+    'postorius_view_duration_seconds',
+    'Time taken to answer requests, by URL name.')
+MAILMAN_REQUEST_DURATION = REGISTRY.histogram(
+    'postorius_mailman_request_duration_seconds',
+    'Time taken by calls to the Mailman REST API, by endpoint.')
+MAILMAN_REQUEST_ERRORS = REGISTRY.counter(
+    'postorius_mailman_request_errors_total',
+    'Failed calls to the Mailman REST API, by endpoint and status.')
+CACHE_REQUESTS = REGISTRY.counter(
+    'postorius_cache_requests_total',
+    'Cache lookups, by cache and result (hit or miss).')
+MASS_OPERATIONS = REGISTRY.counter(
+    'postorius_mass_operations_total',
+    'Addresses processed by mass subscriptions and removals.')
+REGISTRY.gauge(
+    'postorius_mail_queue_depth',
+    'Messages waiting in the outgoing mail queue.', _mail_queue_depth)
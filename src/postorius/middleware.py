@@ -0,0 +1,146 @@
+# -*- coding: utf-8 -*-
+# Copyright (C) 2012-2015 by the Free Software Foundation, Inc.
+#
+# This file is part of Postorius.
+#
+# Postorius is free software: you can redistribute it and/or modify it under
+# the terms of the GNU General Public License as published by the Free
+# Software Foundation, either version 3 of the License, or (at your option)
+# any later version.
+# Postorius is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or
+# FITNESS FOR A PARTICULAR PURPOSE.  See the GNU General Public License for
+# more details.
+#
+# You should have received a copy of the GNU General Public License along with
+# Postorius.  If not, see <http://www.gnu.org/licenses/>.
+
+import time
+import logging
+import cProfile
+
+from django.conf import settings
+
+from postorius import instrumentation, metrics, profiling
+
+
+logger = logging.getLogger(__name__)
+
+
+class RestTimingMiddleware(object):
+    """Reports the Mailman REST calls made for each request.
+
+    Logs a summary line per request and adds a ``Server-Timing`` header
+    with the number and duration of the REST calls and the total time::
+
+        >>> MIDDLEWARE_CLASSES += ('postorius.middleware.RestTimingMiddleware',)
+
+    The header can be turned off::
+
+        >>> REST_SERVER_TIMING = False
+
+    Requests taking longer than the threshold (in seconds) are logged as
+    warnings together with every REST call they made::
+
+        >>> REST_SLOW_REQUEST_THRESHOLD = 1.0
+
+    Calls made while a streaming response is consumed are not included.
+    """
+
+    def process_request(self, request):
+        instrumentation.start_log()
+
+    def process_response(self, request, response):
+        log = instrumentation.stop_log()
+        if log is None:
+            return response
+        total = time.time() - log.started
+        logger.info('%s %s %s: %d REST calls, %.1f ms of %.1f ms, %d bytes',
+                    request.method, request.path, response.status_code,
+                    log.count, log.duration * 1000, total * 1000, log.size)
+        if getattr(settings, 'REST_SERVER_TIMING', True):
+            response['Server-Timing'] = (
+                'mailman;desc="{0} REST calls";dur={1:.1f}, '
+                'total;dur={2:.1f}'.format(
+                    log.count, log.duration * 1000, total * 1000))
+        threshold = getattr(settings, 'REST_SLOW_REQUEST_THRESHOLD', None)
+        if threshold is not None and total >= threshold:
+            logger.warning(
+                'Slow request %s %s took %.1f ms:\n%s',
+                request.method, request.path, total * 1000,
+                '\n'.join('  {0} {1} {2} {3:.1f} ms {4} bytes'.format(
+                    call.method, call.path, call.status,
+                    call.duration * 1000, call.size)
+                    for call in log.calls))
+        return response
+
+
+class MetricsMiddleware(object):
+    """Measures the time taken to answer requests, by URL name::
+
+        >>> MIDDLEWARE_CLASSES += ('postorius.middleware.MetricsMiddleware',)
+
+    The times are exposed by the ``metrics`` view together with the other
+    metrics of :mod:`postorius.metrics`.
+    """
+
+    def process_request(self, request):
+        request._metrics_started = time.time()
+
+    def process_response(self, request, response):
+        started = getattr(request, '_metrics_started', None)
+        if started is None:
+            return response
+        resolver_match = getattr(request, 'resolver_match', None)
+        url_name = None
+        if resolver_match is not None:
+            url_name = resolver_match.url_name
+        metrics.VIEW_DURATION.observe(
+            time.time() - started, url_name=url_name or 'unknown',
+            method=request.method, status=response.status_code // 100 * 100)
+        return response
+
+
+class ProfilingMiddleware(object):
+    """Profiles slow requests with cProfile.
+
+    Add it after the authentication middleware, as the last middleware::
+
+        >>> MIDDLEWARE_CLASSES += ('postorius.middleware.ProfilingMiddleware',)
+
+    Superusers can profile a single request by sending it with an
+    ``X-Postorius-Profile`` header. To profile every request and keep the
+    profiles of those taking longer than ``PROFILING_THRESHOLD`` seconds
+    (default: 1.0), enable it in the settings::
+
+        >>> PROFILING = True
+
+    The profiles include the rendering of the response and are listed on
+    the site settings page, see :mod:`postorius.profiling`. The profiler
+    runs from the request to the response, so the view is still called by
+    Django's handler, within its transaction and exception handling.
+    """
+
+    def process_request(self, request):
+        requested = ('HTTP_X_POSTORIUS_PROFILE' in request.META and
+                     request.user.is_superuser)
+        if not (requested or getattr(settings, 'PROFILING', False)):
+            return None
+        profiler = cProfile.Profile()
+        request._postorius_profile = (profiler, time.time(), requested)
+        profiler.enable()
+
+    def process_response(self, request, response):
+        profile = getattr(request, '_postorius_profile', None)
+        if profile is None:
+            return response
+        profiler, started, requested = profile
+        profiler.disable()
+        del request._postorius_profile
+        duration = time.time() - started
+        if requested or duration >= getattr(settings, 'PROFILING_THRESHOLD',
+                                             1.0):
+            name = profiling.save_profile(profiler, request, duration)
+            if requested:
+                response['X-Postorius-Profile'] = name
+        return response
@@ -0,0 +1,29 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.db import models, migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('postorius', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ListSnapshot',
+            fields=[
+                ('id', models.AutoField(verbose_name='ID', serialize=False, auto_created=True, primary_key=True)),
+                ('list_id', models.CharField(unique=True, max_length=255)),
+                ('fqdn_listname', models.CharField(max_length=255)),
+                ('list_name', models.CharField(max_length=255)),
+                ('mail_host', models.CharField(max_length=255)),
+                ('display_name', models.CharField(max_length=255, blank=True)),
+                ('description', models.TextField(blank=True)),
+                ('advertised', models.BooleanField(default=False)),
+                ('member_count', models.IntegerField(default=0)),
+                ('updated', models.DateTimeField()),
+            ],
+        ),
+    ]
@@ -0,0 +1,23 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.db import models, migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('postorius', '0002_listsnapshot'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ListSearchToken',
+            fields=[
+                ('id', models.AutoField(verbose_name='ID', serialize=False, auto_created=True, primary_key=True)),
+                ('token', models.CharField(max_length=100, db_index=True)),
+                ('weight', models.IntegerField()),
+                ('snapshot', models.ForeignKey(related_name='search_tokens', to='postorius.ListSnapshot')),
+            ],
+        ),
+    ]
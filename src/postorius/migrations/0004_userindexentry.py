@@ -0,0 +1,25 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.db import models, migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('postorius', '0003_listsearchtoken'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='UserIndexEntry',
+            fields=[
+                ('id', models.AutoField(verbose_name='ID', serialize=False, auto_created=True, primary_key=True)),
+                ('user_id', models.CharField(unique=True, max_length=64)),
+                ('display_name', models.CharField(max_length=255, blank=True)),
+                ('emails', models.TextField(blank=True)),
+                ('created_on', models.CharField(max_length=40, blank=True)),
+                ('updated', models.DateTimeField()),
+            ],
+        ),
+    ]
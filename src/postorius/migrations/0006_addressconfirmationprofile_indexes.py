@@ -0,0 +1,29 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.db import models, migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('postorius', '0005_queuedmail'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='addressconfirmationprofile',
+            name='activation_key',
+            field=models.CharField(unique=True, max_length=40),
+        ),
+        migrations.AlterField(
+            model_name='addressconfirmationprofile',
+            name='created',
+            field=models.DateTimeField(db_index=True),
+        ),
+        migrations.AlterField(
+            model_name='addressconfirmationprofile',
+            name='email',
+            field=models.EmailField(max_length=254, db_index=True),
+        ),
+    ]
@@ -0,0 +1,41 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+import re
+
+from django.db import models, migrations
+
+
+def index_entries(apps, schema_editor):
+    UserIndexEntry = apps.get_model('postorius', 'UserIndexEntry')
+    UserIndexToken = apps.get_model('postorius', 'UserIndexToken')
+    for entry in UserIndexEntry.objects.iterator():
+        tokens = set(re.findall(r'\w+', entry.display_name.lower(),
+                                re.UNICODE))
+        for email in entry.emails.split():
+            tokens.add(email)
+            tokens.update(email.split('@', 1))
+        UserIndexToken.objects.bulk_create(
+            UserIndexToken(entry=entry, token=token[:100])
+            for token in tokens if token)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('postorius', '0006_addressconfirmationprofile_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='UserIndexToken',
+            fields=[
+                ('id', models.AutoField(verbose_name='ID', serialize=False, auto_created=True, primary_key=True)),
+                ('token', models.CharField(max_length=100, db_index=True)),
+                ('entry', models.ForeignKey(related_name='search_tokens', to='postorius.UserIndexEntry')),
+            ],
+        ),
+        # RunPython.noop only exists since Django 1.8.
+        migrations.RunPython(index_entries,
+                             lambda apps, schema_editor: None),
+    ]
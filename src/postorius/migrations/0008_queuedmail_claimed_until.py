@@ -0,0 +1,19 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.db import models, migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('postorius', '0007_userindextoken'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='queuedmail',
+            name='claimed_until',
+            field=models.DateTimeField(null=True, db_index=True),
+        ),
+    ]
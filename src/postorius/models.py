@@ -19,24 +19,28 @@ from __future__ import (
     absolute_import, division, print_function, unicode_literals)
 
 
+import re
 import random
 import hashlib
 import logging
+import threading
 
 from datetime import datetime, timedelta
 from django.conf import settings
 from django.contrib.auth.models import User
+from django.core.cache import cache
 from django.core.exceptions import ImproperlyConfigured
-from django.core.mail import send_mail
+from django.core.mail import EmailMessage, get_connection
 from django.db.models.signals import post_save
 from django.core.urlresolvers import reverse
 from django.dispatch import receiver
-from django.db import models
+from django.db import connection as db_connection, models, transaction
 from django.http import Http404
 from django.template import Context
 from django.template.loader import get_template
 from mailmanclient import MailmanConnectionError
-from postorius.utils import get_client
+from postorius import metrics
+from postorius.utils import get_cache_generation, get_client
 from urllib2 import HTTPError
 
 
@@ -132,6 +136,51 @@ class MailmanRestManager(object):
         pass
 
 
+# The list data kept by ``get_for_request``.
+CACHED_LIST_FIELDS = ('list_id', 'fqdn_listname', 'list_name', 'mail_host',
+                      'display_name')
+
+
+class CachedList(object):
+    """A list rebuilt from the data cached by ``get_for_request``.
+
+    The ids and names of the list are answered from the cached data.
+    Anything else is taken from the list in Mailman, which is only fetched
+    once it is needed.
+    """
+
+    def __init__(self, info):
+        self._info = info
+        self._list = None
+
+    def __repr__(self):
+        return '<List "{0}">'.format(self.fqdn_listname)
+
+    def __getattr__(self, name):
+        if name.startswith('_'):
+            raise AttributeError(name)
+        if name in self._info:
+            return self._info[name]
+        if self._list is None:
+            try:
+                self._list = get_client().get_list(self._info['list_id'])
+            except MailmanConnectionError, e:
+                raise MailmanApiError(e)
+        return getattr(self._list, name)
+
+
+def _cached_list_info(mlist):
+    """Returns the data of a list kept by ``get_for_request``, or None for
+    objects that are not Mailman lists.
+    """
+    info = dict((name, getattr(mlist, name, None))
+                for name in CACHED_LIST_FIELDS)
+    if all(isinstance(value, basestring) for value in info.values()
+           if value is not None):
+        return info
+    return None
+
+
 class MailmanListManager(MailmanRestManager):
 
     def __init__(self):
@@ -161,6 +210,109 @@ class MailmanListManager(MailmanRestManager):
                 host_objects.append(obj)
         return host_objects
 
+    def _access_key(self, user, list_id):
+        return 'postorius:list_access:{0}:{1}:{2}'.format(
+            user.pk, hashlib.sha1(list_id.encode('utf-8')).hexdigest(),
+            get_cache_generation('list:{0}'.format(list_id)))
+
+    def get_for_request(self, request, list_id):
+        """Returns a list and sets the list roles of the requesting user.
+
+        The list is only looked up once per request, however many
+        decorators and views ask for it. Its data and the roles of the user
+        are cached as well, and reused by the list pages that are loaded
+        via AJAX when switching list tabs. Requests that may change data
+        always look the roles up again. The cached access expires after
+        ``LIST_ACCESS_CACHE_TIMEOUT`` seconds (default: 60), or when the
+        list or its rosters are changed through Postorius.
+        """
+        lists = getattr(request, '_postorius_lists', None)
+        if lists is None:
+            lists = request._postorius_lists = {}
+        user = request.user
+        if list_id in lists:
+            mlist, is_owner, is_moderator = lists[list_id]
+        else:
+            key = self._access_key(user, list_id)
+            record = None
+            if request.is_ajax() and request.method in ('GET', 'HEAD'):
+                record = cache.get(key)
+                metrics.CACHE_REQUESTS.inc(
+                    cache='list_access',
+                    result='miss' if record is None else 'hit')
+            if record is None:
+                mlist = self.get_or_404(fqdn_listname=list_id)
+                is_owner = is_moderator = False
+                try:
+                    # Superusers may see every list page anyway.
+                    if user.is_authenticated() and not user.is_superuser:
+                        is_owner = user.email in mlist.owners
+                        is_moderator = user.email in mlist.moderators
+                except MailmanConnectionError, e:
+                    raise MailmanApiError(e)
+                info = _cached_list_info(mlist)
+                if info is not None:
+                    cache.set(key, (info, is_owner, is_moderator),
+                              getattr(settings,
+                                      'LIST_ACCESS_CACHE_TIMEOUT', 60))
+            else:
+                info, is_owner, is_moderator = record
+                mlist = CachedList(info)
+            lists[list_id] = (mlist, is_owner, is_moderator)
+        user.is_list_owner = is_owner
+        user.is_list_moderator = is_moderator
+        return mlist
+
+
+class MailmanUserManager(MailmanRestManager):
+
+    def __init__(self):
+        super(MailmanUserManager, self).__init__('user', 'users')
+
+    def _record_key(self, user):
+        # The email address is part of the key, so that changing it in
+        # Django resolves the Mailman user again.
+        return 'postorius:mailman_user:{0}:{1}'.format(
+            user.pk, hashlib.sha1(user.email.encode('utf-8')).hexdigest())
+
+    def get_record(self, user):
+        """Returns the Mailman user id and the addresses of a Django user.
+
+        The record is cached by the id of the Django user for
+        ``MAILMAN_USER_CACHE_TIMEOUT`` seconds (default: 300). Both values
+        are None if the Django user has no Mailman user.
+        """
+        key = self._record_key(user)
+        record = cache.get(key)
+        metrics.CACHE_REQUESTS.inc(cache='mailman_user',
+                                   result='miss' if record is None else 'hit')
+        if record is None:
+            try:
+                mm_user = self.get(address=user.email)
+                record = (unicode(mm_user.user_id),
+                          [str(address) for address in mm_user.addresses])
+            except Mailman404Error:
+                record = (None, None)
+            except MailmanConnectionError, e:
+                raise MailmanApiError(e)
+            cache.set(key, record, getattr(
+                settings, 'MAILMAN_USER_CACHE_TIMEOUT', 300))
+        return record
+
+    def get_addresses(self, user):
+        """Returns the addresses of the Mailman user of a Django user.
+
+        Raises Mailman404Error if there is no Mailman user.
+        """
+        user_id, addresses = self.get_record(user)
+        if user_id is None:
+            raise Mailman404Error('Mailman resource could not be found.')
+        return addresses
+
+    def invalidate(self, user):
+        """Forgets the cached record of a Django user."""
+        cache.delete(self._record_key(user))
+
 
 class MailmanRestModel(object):
     """Simple REST Model class to make REST API calls Django style.
@@ -193,7 +345,7 @@ class List(MailmanRestModel):
 class MailmanUser(MailmanRestModel):
     """MailmanUser model class.
     """
-    objects = MailmanRestManager('user', 'users')
+    objects = MailmanUserManager()
 
 
 class Member(MailmanRestModel):
@@ -202,11 +354,524 @@ class Member(MailmanRestModel):
     objects = MailmanRestManager('member', 'members')
 
 
+def _tokenize(text):
+    """Splits text into lower case words for the list search index."""
+    return re.findall(r'\w+', (text or '').lower(), re.UNICODE)
+
+
+def _update_or_create(manager, defaults, **lookup):
+    """Like ``QuerySet.update_or_create``, which Django < 1.7 lacks."""
+    obj, created = manager.get_or_create(defaults=defaults, **lookup)
+    if not created:
+        for name, value in defaults.items():
+            setattr(obj, name, value)
+        obj.save()
+    return obj, created
+
+
+class ListSnapshotManager(models.Manager):
+    """
+    Manager class for ListSnapshot.
+    """
+
+    def visible(self, only_public=False):
+        snapshots = self.order_by('fqdn_listname')
+        if only_public:
+            snapshots = snapshots.filter(advertised=True)
+        return snapshots
+
+    def last_updated(self):
+        """Returns the time of the oldest snapshot, or None."""
+        return self.aggregate(models.Min('updated'))['updated__min']
+
+    def is_stale(self):
+        """
+        Snapshots older than 30 minutes are considered stale by default.
+        This can be configured in the settings.
+
+            >>> LIST_INDEX_SNAPSHOT_MAX_AGE = timedelta(minutes=10)
+
+        """
+        last_updated = self.last_updated()
+        if last_updated is None:
+            return True
+        max_age = getattr(settings, 'LIST_INDEX_SNAPSHOT_MAX_AGE',
+                          timedelta(minutes=30))
+        return datetime.now() - last_updated > max_age
+
+    def refresh(self, page_size=100):
+        """
+        Replaces the snapshots with the current lists from Mailman.
+
+        Walks the paged lists collection and fetches the settings of
+        each list. Snapshots of lists that no longer exist are removed.
+        Lists deleted while walking are skipped; if anything else fails,
+        no snapshot is removed.
+        """
+        connection = get_client()._connection
+        started = datetime.now()
+        page = 1
+        try:
+            while True:
+                response, content = connection.call(
+                    'lists?count={0}&page={1}'.format(page_size, page))
+                entries = content.get('entries', [])
+                with transaction.atomic():
+                    for entry in entries:
+                        try:
+                            response, list_settings = connection.call(
+                                'lists/{0}/config'.format(entry['list_id']))
+                        except HTTPError, e:
+                            if e.code != 404:
+                                raise
+                            continue
+                        snapshot, created = _update_or_create(
+                            self, list_id=entry['list_id'],
+                            defaults=dict(
+                                fqdn_listname=entry['fqdn_listname'],
+                                list_name=entry['list_name'],
+                                mail_host=entry['mail_host'],
+                                display_name=entry.get('display_name') or '',
+                                description=list_settings.get(
+                                    'description') or '',
+                                advertised=list_settings.get(
+                                    'advertised', False),
+                                member_count=entry.get('member_count', 0),
+                                updated=datetime.now()))
+                        snapshot.update_search_index()
+                total_size = content.get('total_size', 0)
+                if not entries or page * page_size >= total_size:
+                    break
+                page += 1
+        except (MailmanConnectionError, HTTPError), e:
+            raise MailmanApiError(e)
+        self.filter(updated__lt=started).delete()
+
+    def search(self, query, only_public=False):
+        """
+        Returns the snapshots matching all words in ``query``, best first.
+
+        Words match tokens of the list name, display name and description
+        exactly or, if they have at least ``LIST_SEARCH_MIN_PREFIX``
+        characters (default: 3), as a prefix. Exact matches and matches in
+        the names rank higher than prefix matches and matches in the
+        description. The result can be paged with a ``Paginator``, which
+        only loads the snapshots of the shown page.
+        """
+        min_prefix = getattr(settings, 'LIST_SEARCH_MIN_PREFIX', 3)
+        scores = None
+        names = {}
+        # Tokens are stored truncated to the length of their column.
+        for term in set(term[:100] for term in _tokenize(query)):
+            tokens = ListSearchToken.objects.all()
+            if only_public:
+                tokens = tokens.filter(snapshot__advertised=True)
+            matches = [(tokens.filter(token=term), 2)]
+            if len(term) >= min_prefix:
+                matches.append((tokens.filter(token__startswith=term)
+                                .exclude(token=term), 1))
+            term_scores = {}
+            for matching, factor in matches:
+                for row in matching.values(
+                        'snapshot_id', 'snapshot__fqdn_listname').annotate(
+                            weight=models.Max('weight')):
+                    snapshot_id = row['snapshot_id']
+                    names[snapshot_id] = row['snapshot__fqdn_listname']
+                    term_scores[snapshot_id] = max(
+                        row['weight'] * factor,
+                        term_scores.get(snapshot_id, 0))
+            if scores is None:
+                scores = term_scores
+            else:
+                scores = dict((snapshot_id, score + term_scores[snapshot_id])
+                              for snapshot_id, score in scores.items()
+                              if snapshot_id in term_scores)
+            if not scores:
+                break
+        return ListSearchResults(self, scores or {}, names)
+
+
+class ListSearchResults(object):
+    """
+    The snapshots found by a search, best first.
+
+    Supports ``len`` and slicing, and only loads the snapshots in a slice.
+    """
+
+    def __init__(self, manager, scores, names):
+        self.manager = manager
+        self.ids = sorted(scores, key=lambda snapshot_id: (
+            -scores[snapshot_id], names[snapshot_id]))
+
+    def count(self):
+        return len(self.ids)
+
+    def __len__(self):
+        return len(self.ids)
+
+    def __iter__(self):
+        return iter(self[:])
+
+    def __getitem__(self, key):
+        if not isinstance(key, slice):
+            return self[key:key + 1][0]
+        ids = self.ids[key]
+        snapshots = self.manager.in_bulk(ids)
+        return [snapshots[snapshot_id] for snapshot_id in ids
+                if snapshot_id in snapshots]
+
+
+class ListSnapshot(models.Model):
+    """
+    A local copy of the list data shown in the list index, refreshed by
+    the ``snapshot_lists`` management command. If the setting
+
+        >>> LIST_INDEX_SNAPSHOT = True
+
+    is set, the list index is served from these snapshots instead of
+    querying Mailman.
+    """
+    list_id = models.CharField(max_length=255, unique=True)
+    fqdn_listname = models.CharField(max_length=255)
+    list_name = models.CharField(max_length=255)
+    mail_host = models.CharField(max_length=255)
+    display_name = models.CharField(max_length=255, blank=True)
+    description = models.TextField(blank=True)
+    advertised = models.BooleanField(default=False)
+    member_count = models.IntegerField(default=0)
+    updated = models.DateTimeField()
+
+    objects = ListSnapshotManager()
+
+    def __unicode__(self):
+        return u'List Snapshot for {0}'.format(self.fqdn_listname)
+
+    @property
+    def settings(self):
+        # Mimic the settings of a mailmanclient list, so that templates
+        # can render both.
+        return {'advertised': self.advertised,
+                'description': self.description}
+
+    def update_search_index(self):
+        """Replaces the search tokens of this list."""
+        weights = {}
+        for text, weight in ((self.fqdn_listname, 3),
+                             (self.display_name, 3),
+                             (self.description, 1)):
+            for token in _tokenize(text):
+                weights[token] = max(weight, weights.get(token, 0))
+        self.search_tokens.all().delete()
+        ListSearchToken.objects.bulk_create(
+            ListSearchToken(snapshot=self, token=token[:100], weight=weight)
+            for token, weight in weights.items())
+
+    def as_entry(self):
+        """Returns the snapshot like an entry of Mailman's lists resource.
+        """
+        return {'list_id': self.list_id,
+                'fqdn_listname': self.fqdn_listname,
+                'list_name': self.list_name,
+                'mail_host': self.mail_host,
+                'display_name': self.display_name,
+                'member_count': self.member_count}
+
+
+class ListSearchToken(models.Model):
+    """
+    An entry of the inverted index used to search the list snapshots.
+    """
+    token = models.CharField(max_length=100, db_index=True)
+    snapshot = models.ForeignKey(ListSnapshot, related_name='search_tokens')
+    weight = models.IntegerField()
+
+
+class UserIndexEntryManager(models.Manager):
+    """
+    Manager class for UserIndexEntry.
+    """
+
+    def search(self, query):
+        """Returns the entries matching all words of ``query``.
+
+        Each word is matched as a prefix of the words of the display name
+        and of the addresses, their local parts and domains.
+        """
+        entries = self.order_by('pk')
+        for term in set(term[:100] for term in query.lower().split()):
+            # The tokens are stored in lower case, so a case sensitive
+            # prefix match can use the index on the token column.
+            entries = entries.filter(pk__in=UserIndexToken.objects.filter(
+                token__startswith=term).values('entry_id'))
+        return entries
+
+    def refresh(self, page_size=100, full=False):
+        """
+        Updates the index from Mailman's users collection.
+
+        The addresses are only fetched for users that are new to the
+        index, so regular runs are cheap. A ``full`` refresh fetches the
+        addresses of all users and removes users that no longer exist.
+        """
+        connection = get_client()._connection
+        started = datetime.now()
+        page = 1
+        try:
+            while True:
+                response, content = connection.call(
+                    'users?count={0}&page={1}'.format(page_size, page))
+                entries = content.get('entries', [])
+                user_ids = [unicode(entry['user_id']) for entry in entries]
+                known = set(self.filter(user_id__in=user_ids).values_list(
+                    'user_id', flat=True))
+                with transaction.atomic():
+                    for user_id, entry in zip(user_ids, entries):
+                        defaults = dict(
+                            display_name=entry.get('display_name') or '',
+                            created_on=entry.get('created_on') or '',
+                            updated=datetime.now())
+                        if full or user_id not in known:
+                            response, addresses = connection.call(
+                                'users/{0}/addresses'.format(user_id))
+                            defaults['emails'] = ' '.join(
+                                address['email'] for address in
+                                addresses.get('entries', [])).lower()
+                        entry, created = _update_or_create(
+                            self, defaults, user_id=user_id)
+                        entry.update_search_index()
+                total_size = content.get('total_size', 0)
+                if not entries or page * page_size >= total_size:
+                    break
+                page += 1
+        except MailmanConnectionError, e:
+            raise MailmanApiError(e)
+        if full:
+            self.filter(updated__lt=started).delete()
+
+
+class UserIndexEntry(models.Model):
+    """
+    A local copy of a Mailman user, used to search and page through the
+    users on the user index. Refreshed by the ``index_users`` management
+    command.
+    """
+    user_id = models.CharField(max_length=64, unique=True)
+    display_name = models.CharField(max_length=255, blank=True)
+    emails = models.TextField(blank=True)
+    created_on = models.CharField(max_length=40, blank=True)
+    updated = models.DateTimeField()
+
+    objects = UserIndexEntryManager()
+
+    def __unicode__(self):
+        return u'User Index Entry for {0}'.format(self.user_id)
+
+    @property
+    def addresses(self):
+        return self.emails.split()
+
+    def update_search_index(self):
+        """Replaces the search tokens of this user."""
+        tokens = set(_tokenize(self.display_name))
+        for email in self.addresses:
+            tokens.add(email)
+            tokens.update(email.split('@', 1))
+        self.search_tokens.all().delete()
+        UserIndexToken.objects.bulk_create(
+            UserIndexToken(entry=self, token=token[:100])
+            for token in tokens if token)
+
+
+class UserIndexToken(models.Model):
+    """
+    An entry of the index used to search the user index.
+    """
+    token = models.CharField(max_length=100, db_index=True)
+    entry = models.ForeignKey(UserIndexEntry, related_name='search_tokens')
+
+
+class QueuedMailManager(models.Manager):
+    """
+    Manager class for QueuedMail.
+    """
+
+    def enqueue(self, subject, body, from_email, recipient_list):
+        """Stores a message to be sent by ``send_queued``."""
+        mail = self.create(subject=subject, body=body, from_email=from_email,
+                           to=u','.join(recipient_list),
+                           created=datetime.now())
+        wake_mail_worker()
+        return mail
+
+    def pending(self):
+        """Returns the messages that will still be tried."""
+        return self.filter(
+            attempts__lt=getattr(settings, 'EMAIL_QUEUE_MAX_ATTEMPTS', 5))
+
+    def _claim(self, pks):
+        """Claims the unclaimed messages of ``pks`` for this run.
+
+        Each message is claimed with a conditional update, so a message is
+        only sent by the run whose update changed it. Claims expire after
+        ``EMAIL_QUEUE_CLAIM_TIMEOUT`` seconds, so the messages of a run
+        that died are sent again later.
+        """
+        now = datetime.now()
+        claimed_until = now + timedelta(
+            seconds=getattr(settings, 'EMAIL_QUEUE_CLAIM_TIMEOUT', 300))
+        unclaimed = (models.Q(claimed_until__isnull=True) |
+                     models.Q(claimed_until__lt=now))
+        return [pk for pk in pks
+                if self.filter(unclaimed, pk=pk).update(
+                    claimed_until=claimed_until)]
+
+    def send_queued(self, batch_size=100):
+        """
+        Sends queued messages in batches over a single SMTP connection.
+
+        Sent messages are deleted. Failed messages are retried on the next
+        run, up to ``EMAIL_QUEUE_MAX_ATTEMPTS`` times. Several runs may
+        drain the queue at the same time; each message is claimed before
+        it is sent.
+
+        Returns the number of messages sent.
+        """
+        sent = 0
+        failed = set()
+        while True:
+            pks = list(self.pending().exclude(pk__in=failed).exclude(
+                claimed_until__gte=datetime.now()).order_by('pk').values_list(
+                'pk', flat=True)[:batch_size])
+            if not pks:
+                return sent
+            batch = list(self.filter(
+                pk__in=self._claim(pks)).order_by('pk'))
+            if not batch:
+                continue
+            connection = get_connection()
+            try:
+                connection.open()
+                for mail in batch:
+                    try:
+                        mail.as_message(connection).send()
+                    except Exception, e:
+                        logger.error('Could not send queued mail %s: %s',
+                                     mail.pk, e)
+                        failed.add(mail.pk)
+                        self.filter(pk=mail.pk).update(
+                            attempts=models.F('attempts') + 1,
+                            last_error=unicode(e), claimed_until=None)
+                    else:
+                        mail.delete()
+                        sent += 1
+            except Exception, e:
+                # The connection could not be opened, try again later.
+                logger.error('Could not send queued mail: %s', e)
+                self.filter(pk__in=[mail.pk for mail in batch]).update(
+                    claimed_until=None)
+                return sent
+            finally:
+                connection.close()
+
+
+class QueuedMail(models.Model):
+    """
+    An outgoing message, stored so that requests don't wait for the mail
+    server. The queue is drained by a worker thread that is woken whenever
+    a message is queued or, if ``EMAIL_QUEUE_WORKER`` is set to False, by
+    the ``send_queued_mail`` management command.
+    """
+    subject = models.CharField(max_length=255)
+    body = models.TextField()
+    from_email = models.CharField(max_length=255)
+    to = models.TextField()
+    created = models.DateTimeField()
+    attempts = models.IntegerField(default=0)
+    last_error = models.TextField(blank=True)
+    claimed_until = models.DateTimeField(null=True, db_index=True)
+
+    objects = QueuedMailManager()
+
+    def __unicode__(self):
+        return u'Queued Mail to {0}'.format(self.to)
+
+    def as_message(self, connection=None):
+        return EmailMessage(self.subject, self.body, self.from_email,
+                            self.to.split(u','), connection=connection)
+
+
+_mail_worker = None
+_mail_worker_wakeup = threading.Event()
+_mail_worker_lock = threading.Lock()
+
+
+def _run_mail_worker():
+    interval = getattr(settings, 'EMAIL_QUEUE_WORKER_INTERVAL', 60)
+    while True:
+        _mail_worker_wakeup.wait(interval)
+        _mail_worker_wakeup.clear()
+        try:
+            QueuedMail.objects.send_queued()
+        except Exception, e:
+            logger.error('Mail queue worker failed: %s', e)
+        finally:
+            db_connection.close()
+
+
+def wake_mail_worker():
+    """Starts the mail queue worker thread if needed, and wakes it.
+
+    The worker is enabled unless ``EMAIL_QUEUE_WORKER`` is False, so that
+    mail is still sent where nobody set up the ``send_queued_mail``
+    command.
+    """
+    global _mail_worker
+    if not getattr(settings, 'EMAIL_QUEUE_WORKER', True):
+        return
+    with _mail_worker_lock:
+        if _mail_worker is None or not _mail_worker.is_alive():
+            _mail_worker = threading.Thread(target=_run_mail_worker,
+                                            name='postorius-mail-queue')
+            _mail_worker.daemon = True
+            _mail_worker.start()
+    _mail_worker_wakeup.set()
+
+
+def _confirmation_expiration_delta():
+    return getattr(settings, 'EMAIL_CONFIRMATION_EXPIRATION_DELTA',
+                   timedelta(days=1))
+
+
 class AddressConfirmationProfileManager(models.Manager):
     """
     Manager class for AddressConfirmationProfile.
     """
 
+    def _expiry_limit(self):
+        return datetime.now() - _confirmation_expiration_delta()
+
+    def unexpired(self):
+        """Returns the profiles that have not expired yet."""
+        return self.filter(created__gt=self._expiry_limit())
+
+    def expired(self):
+        """Returns the expired profiles."""
+        return self.filter(created__lte=self._expiry_limit())
+
+    def purge_expired(self, batch_size=1000):
+        """
+        Deletes the expired profiles, ``batch_size`` rows per statement,
+        and returns the number of deleted profiles.
+        """
+        deleted = 0
+        while True:
+            pks = list(self.expired().values_list('pk', flat=True)[
+                :batch_size])
+            if not pks:
+                return deleted
+            self.filter(pk__in=pks).delete()
+            deleted += len(pks)
+
     def create_profile(self, email, user):
         # Create or update a profile
         # Guarantee an email bytestr type that can be fed to hashlib.
@@ -237,9 +902,9 @@ class AddressConfirmationProfile(models.Model):
     Profile model for temporarily storing an activation key to register
     an email address.
     """
-    email = models.EmailField()
-    activation_key = models.CharField(max_length=40)
-    created = models.DateTimeField()
+    email = models.EmailField(db_index=True)
+    activation_key = models.CharField(max_length=40, unique=True)
+    created = models.DateTimeField(db_index=True)
     user = models.ForeignKey(User)
 
     objects = AddressConfirmationProfileManager()
@@ -256,11 +921,9 @@ class AddressConfirmationProfile(models.Model):
             >>> EMAIL_CONFIRMATION_EXPIRATION_DELTA = timedelta(days=2)
 
         """
-        expiration_delta = getattr(
-            settings, 'EMAIL_CONFIRMATION_EXPIRATION_DELTA', timedelta(days=1))
         age = datetime.now().replace(tzinfo=None) - \
             self.created.replace(tzinfo=None)
-        return age > expiration_delta
+        return age > _confirmation_expiration_delta()
 
     def _create_host_url(self, request):
         # Create the host url
@@ -276,6 +939,7 @@ class AddressConfirmationProfile(models.Model):
                                template_path=None):
         """
         Send out a message containing a link to activate the given address.
+        The message is put into the mail queue (see ``QueuedMail``).
 
         The following settings are recognized:
 
@@ -319,7 +983,8 @@ class AddressConfirmationProfile(models.Model):
             except AttributeError:
                 raise ImproperlyConfigured
 
-        send_mail(email_subject,
-                  get_template(template_path).render(template_context),
-                  sender_address,
-                  [self.email])
+        QueuedMail.objects.enqueue(
+            email_subject,
+            get_template(template_path).render(template_context),
+            sender_address,
+            [self.email])
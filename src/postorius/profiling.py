@@ -0,0 +1,113 @@
+# -*- coding: utf-8 -*-
+# Copyright (C) 2012-2015 by the Free Software Foundation, Inc.
+#
+# This file is part of Postorius.
+#
+# Postorius is free software: you can redistribute it and/or modify it under
+# the terms of the GNU General Public License as published by the Free
+# Software Foundation, either version 3 of the License, or (at your option)
+# any later version.
+# Postorius is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or
+# FITNESS FOR A PARTICULAR PURPOSE.  See the GNU General Public License for
+# more details.
+#
+# You should have received a copy of the GNU General Public License along with
+# Postorius.  If not, see <http://www.gnu.org/licenses/>.
+
+"""Storage of the request profiles taken by
+:class:`postorius.middleware.ProfilingMiddleware`.
+
+Profiles are written with :meth:`cProfile.Profile.dump_stats` to
+``PROFILING_DIR`` (default: ``postorius-profiles`` in the temporary
+directory). Only the newest ``PROFILING_MAX_PROFILES`` (default: 20) are
+kept.
+"""
+
+import os
+import re
+import pstats
+import tempfile
+
+from cStringIO import StringIO
+from datetime import datetime
+
+from django.conf import settings
+
+
+_NAME_RE = re.compile(
+    r'^(?P<created>\d{20})-(?P<duration>\d+)ms-(?P<method>[A-Z]+)-'
+    r'(?P<view>[\w.-]+)\.prof$')
+
+
+class Profile(object):
+    """A stored profile."""
+
+    def __init__(self, name, match):
+        self.name = name
+        self.created = datetime.strptime(match.group('created'),
+                                         '%Y%m%d%H%M%S%f')
+        self.duration = int(match.group('duration')) / 1000.0
+        self.method = match.group('method')
+        self.view = match.group('view')
+
+    @property
+    def path(self):
+        return os.path.join(profile_dir(), self.name)
+
+
+def profile_dir():
+    return getattr(settings, 'PROFILING_DIR', os.path.join(
+        tempfile.gettempdir(), 'postorius-profiles'))
+
+
+def save_profile(profiler, request, duration):
+    """Stores a profile and removes the oldest ones."""
+    directory = profile_dir()
+    if not os.path.isdir(directory):
+        os.makedirs(directory)
+    resolver_match = getattr(request, 'resolver_match', None)
+    view = (resolver_match and resolver_match.url_name) or \
+        re.sub(r'[^\w.-]+', '_', request.path).strip('_') or 'root'
+    name = '{0}-{1}ms-{2}-{3}.prof'.format(
+        datetime.now().strftime('%Y%m%d%H%M%S%f'), int(duration * 1000),
+        request.method, view[:80])
+    profiler.dump_stats(os.path.join(directory, name))
+    for profile in list_profiles()[
+            getattr(settings, 'PROFILING_MAX_PROFILES', 20):]:
+        try:
+            os.remove(profile.path)
+        except OSError:
+            pass
+    return name
+
+
+def list_profiles():
+    """Returns the stored profiles, newest first."""
+    try:
+        names = os.listdir(profile_dir())
+    except OSError:
+        return []
+    profiles = []
+    for name in names:
+        match = _NAME_RE.match(name)
+        if match is not None:
+            profiles.append(Profile(name, match))
+    return sorted(profiles, key=lambda profile: profile.name, reverse=True)
+
+
+def get_profile(name):
+    """Returns the stored profile called ``name`` or None."""
+    match = _NAME_RE.match(name)
+    if match is None or not os.path.isfile(os.path.join(profile_dir(),
+                                                        name)):
+        return None
+    return Profile(name, match)
+
+
+def profile_summary(profile, limit=50):
+    """Returns the functions with the highest cumulative time as text."""
+    stream = StringIO()
+    stats = pstats.Stats(profile.path, stream=stream)
+    stats.sort_stats('cumulative').print_stats(limit)
+    return stream.getvalue()
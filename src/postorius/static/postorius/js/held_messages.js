@@ -0,0 +1,56 @@
+/*
+ * Keeps the held messages table up to date by polling the
+ * `list_held_messages_poll` endpoint. Only the messages that were added or
+ * removed since the last known cursor are transferred; an unchanged queue
+ * is answered with a 304. New rows are rendered by the server with the same
+ * template as the page.
+ */
+(function ($) {
+    'use strict';
+
+    var POLL_INTERVAL = 30000;
+
+    function update(table, data) {
+        var body = table.find('tbody');
+        if (data.reset) {
+            body.empty();
+        }
+        $.each(data.removed, function (i, requestId) {
+            body.find('tr[data-request-id="' + requestId + '"]').remove();
+        });
+        $.each(data.added, function (i, msg) {
+            body.append(msg.html);
+        });
+        table.toggle(data.count > 0);
+        $('.held-messages-empty').toggle(data.count === 0);
+        table.data('cursor', data.cursor);
+    }
+
+    function poll(table) {
+        // Stop once another list tab replaced the table.
+        if (!$.contains(document.documentElement, table[0])) {
+            return;
+        }
+        var cursor = table.data('cursor');
+        $.ajax({
+            url: table.data('poll-url'),
+            data: {cursor: cursor},
+            dataType: 'json',
+            cache: false,
+            headers: {'If-None-Match': '"' + cursor + '"'}
+        }).done(function (data, status, xhr) {
+            if (xhr.status === 200 && data) {
+                update(table, data);
+            }
+        }).always(function () {
+            window.setTimeout(function () { poll(table); }, POLL_INTERVAL);
+        });
+    }
+
+    $(function () {
+        var table = $('table.held-messages');
+        if (table.length) {
+            window.setTimeout(function () { poll(table); }, POLL_INTERVAL);
+        }
+    });
+}(jQuery));
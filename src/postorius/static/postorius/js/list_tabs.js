@@ -0,0 +1,55 @@
+/*
+ * Loads the pages of the list navigation via AJAX. Only the main block of
+ * the page is fetched and replaced; the server renders it without header
+ * and footer (`base_ajax.html`) and reuses the list it looked up for the
+ * previous tab. Falls back to a normal page load on errors.
+ */
+(function ($) {
+    'use strict';
+
+    var TAB_LINKS = '.mm_subHeader .mm_nav a';
+
+    function load(url, push) {
+        var main = $('.mm_main').addClass('mm_loading');
+        $.ajax({
+            url: url,
+            dataType: 'html'
+        }).done(function (html) {
+            // Anything but a list page (e.g. the login page) is loaded
+            // normally.
+            if (html.indexOf('mm_subHeader') === -1) {
+                window.location.href = url;
+                return;
+            }
+            if (push) {
+                window.history.pushState({listTab: true}, '', url);
+            }
+            main.html(html);
+        }).fail(function () {
+            window.location.href = url;
+        }).always(function () {
+            main.removeClass('mm_loading');
+        });
+    }
+
+    $(function () {
+        if (!window.history.pushState || !$(TAB_LINKS).length) {
+            return;
+        }
+        window.history.replaceState({listTab: true}, '', window.location.href);
+        $(document).on('click', TAB_LINKS, function (event) {
+            if (event.which > 1 || event.metaKey || event.ctrlKey ||
+                    event.shiftKey || event.altKey) {
+                return;
+            }
+            event.preventDefault();
+            load(this.href, true);
+        });
+        $(window).on('popstate', function (event) {
+            var state = event.originalEvent.state;
+            if (state && state.listTab) {
+                load(window.location.href, false);
+            }
+        });
+    });
+}(jQuery));
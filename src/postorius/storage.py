@@ -0,0 +1,108 @@
+# -*- coding: utf-8 -*-
+# Copyright (C) 2012-2015 by the Free Software Foundation, Inc.
+#
+# This file is part of Postorius.
+#
+# Postorius is free software: you can redistribute it and/or modify it under
+# the terms of the GNU General Public License as published by the Free
+# Software Foundation, either version 3 of the License, or (at your option)
+# any later version.
+# Postorius is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or
+# FITNESS FOR A PARTICULAR PURPOSE.  See the GNU General Public License for
+# more details.
+#
+# You should have received a copy of the GNU General Public License along with
+# Postorius.  If not, see <http://www.gnu.org/licenses/>.
+
+"""A static files storage that bundles and fingerprints the Postorius
+assets, see the "Static files" section of the setup documentation.
+"""
+
+import re
+
+from collections import OrderedDict
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import get_storage_class
+
+try:
+    from django.contrib.staticfiles.storage import (
+        ManifestStaticFilesStorage as HashedStaticFilesStorage)
+except ImportError:
+    # Django < 1.7 keeps the hashed names in the cache instead of a
+    # manifest file.
+    from django.contrib.staticfiles.storage import (
+        CachedStaticFilesStorage as HashedStaticFilesStorage)
+
+try:
+    from rjsmin import jsmin
+except ImportError:
+    jsmin = None
+
+
+# The stylesheets and scripts included by every page, by bundle. Bundles
+# are kept next to their sources, so relative URLs stay valid.
+BUNDLES = OrderedDict((
+    ('postorius/css/postorius.bundle.css', (
+        'postorius/css/bootstrap.css',
+        'postorius/css/style.css',
+    )),
+    ('postorius/js/postorius.bundle.js', (
+        'postorius/js/libs/jquery-1.8.3.min.js',
+        'postorius/js/libs/bootstrap.js',
+        'postorius/js/list_tabs.js',
+    )),
+))
+
+
+def minify_css(css):
+    """Removes comments and whitespace from a stylesheet."""
+    css = re.sub(r'/\*.*?\*/', '', css, flags=re.DOTALL)
+    css = re.sub(r'\s+', ' ', css)
+    css = re.sub(r'\s*([{};,])\s*', r'\1', css)
+    return css.replace(';}', '}').strip()
+
+
+def minify_js(js):
+    """Minifies a script with rjsmin, if it is installed."""
+    if jsmin is None:
+        return js
+    return jsmin(js)
+
+
+def bundles_enabled():
+    """Tells whether the pages should include the bundles."""
+    return (not settings.DEBUG and
+            issubclass(get_storage_class(settings.STATICFILES_STORAGE),
+                       PostoriusStaticFilesStorage))
+
+
+class PostoriusStaticFilesStorage(HashedStaticFilesStorage):
+    """Builds the ``BUNDLES`` when the static files are collected and
+    stores all files under names containing a hash of their content.
+    """
+
+    def post_process(self, paths, dry_run=False, **options):
+        if not dry_run:
+            for name, sources in BUNDLES.items():
+                self._build_bundle(name, sources)
+                paths[name] = (self, name)
+        return super(PostoriusStaticFilesStorage, self).post_process(
+            paths, dry_run, **options)
+
+    def _build_bundle(self, name, sources):
+        parts = []
+        for source in sources:
+            with self.open(source) as stream:
+                parts.append(stream.read().decode('utf-8'))
+        if name.endswith('.css'):
+            content = minify_css(u'\n'.join(parts))
+        else:
+            # Scripts without a trailing semicolon must not run into the
+            # next one.
+            content = u';\n'.join(minify_js(part) for part in parts)
+        if self.exists(name):
+            self.delete(name)
+        self.save(name, ContentFile(content.encode('utf-8')))
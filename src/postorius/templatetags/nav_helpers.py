@@ -16,21 +16,53 @@
 # You should have received a copy of the GNU General Public License along with
 # Postorius.  If not, see <http://www.gnu.org/licenses/>.
 
+from django.conf import settings
 from django.core.urlresolvers import reverse
 from django import template
+from django.utils.translation import get_language
+
+from postorius import utils
 
 
 register = template.Library()
 
 
+def _role_tier(user):
+    """Returns the role that decides which list pages ``user`` can see.
+    """
+    if not user.is_authenticated():
+        return 'anonymous'
+    if user.is_superuser:
+        return 'superuser'
+    if getattr(user, 'is_list_owner', False):
+        return 'owner'
+    if getattr(user, 'is_list_moderator', False):
+        return 'moderator'
+    return 'member'
+
+
 @register.inclusion_tag('postorius/menu/list_nav.html', takes_context=True)
 def list_nav(context, current, title=None):
+    """Renders the list navigation.
+
+    The rendered navigation is cached per list, role tier and language
+    until the list is changed through Postorius (or the cache expires
+    after ``FRAGMENT_CACHE_TIMEOUT`` seconds).
+    """
     if title is None:
         title = ''
-    return dict(list=context['list'],
+    mlist = context['list']
+    user = context['request'].user
+    return dict(list=mlist,
                 current=current,
-                user=context['request'].user,
-                title=title)
+                user=user,
+                title=title,
+                role_tier=_role_tier(user),
+                language=get_language(),
+                generation=utils.get_cache_generation(
+                    'list:{0}'.format(mlist.list_id)),
+                cache_timeout=getattr(
+                    settings, 'FRAGMENT_CACHE_TIMEOUT', 300))
 
 
 @register.inclusion_tag('postorius/menu/mm_user_nav.html', takes_context=True)
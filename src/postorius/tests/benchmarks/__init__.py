@@ -0,0 +1,38 @@
+# -*- coding: utf-8 -*-
+# Copyright (C) 2012-2015 by the Free Software Foundation, Inc.
+#
+# This file is part of Postorius.
+#
+# Postorius is free software: you can redistribute it and/or modify it under
+# the terms of the GNU General Public License as published by the Free
+# Software Foundation, either version 3 of the License, or (at your option)
+# any later version.
+# Postorius is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or
+# FITNESS FOR A PARTICULAR PURPOSE.  See the GNU General Public License for
+# more details.
+#
+# You should have received a copy of the GNU General Public License along with
+# Postorius.  If not, see <http://www.gnu.org/licenses/>.
+
+"""Benchmarks of Postorius, see the development documentation.
+
+If ``POSTORIUS_BENCHMARK_REPORT`` names a file, the measured values are
+written to it as JSON.
+"""
+
+import os
+import json
+
+
+REPORT = os.environ.get('POSTORIUS_BENCHMARK_REPORT')
+
+results = {}
+
+
+def record(name, **values):
+    """Stores the measured values of a benchmark in the report."""
+    results[name] = values
+    if REPORT:
+        with open(REPORT, 'w') as report:
+            json.dump(results, report, indent=2, sort_keys=True)
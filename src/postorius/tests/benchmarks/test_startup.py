@@ -0,0 +1,85 @@
+# -*- coding: utf-8 -*-
+# Copyright (C) 2012-2015 by the Free Software Foundation, Inc.
+#
+# This file is part of Postorius.
+#
+# Postorius is free software: you can redistribute it and/or modify it under
+# the terms of the GNU General Public License as published by the Free
+# Software Foundation, either version 3 of the License, or (at your option)
+# any later version.
+# Postorius is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or
+# FITNESS FOR A PARTICULAR PURPOSE.  See the GNU General Public License for
+# more details.
+#
+# You should have received a copy of the GNU General Public License along with
+# Postorius.  If not, see <http://www.gnu.org/licenses/>.
+
+
+"""Import time of the URLconf and the management commands.
+
+The views and forms are only imported once a view is used, so loading the
+URLconf (at worker boot) or a management command doesn't pay for them.
+Each check runs in a fresh interpreter and fails if the view modules or
+the forms are imported. The time taken, including ``django.setup()``
+where it exists, is only checked if ``POSTORIUS_BENCHMARK_STARTUP_TIME``
+gives the time allowed (seconds).
+"""
+
+import os
+import sys
+import json
+import subprocess
+
+from django.conf import settings
+from django.test import SimpleTestCase
+
+
+STARTUP_TIME = os.environ.get('POSTORIUS_BENCHMARK_STARTUP_TIME')
+
+EAGER_MODULES = ('postorius.forms', 'postorius.views.api',
+                 'postorius.views.list', 'postorius.views.settings',
+                 'postorius.views.user')
+
+_SCRIPT = """
+import sys, time, json
+started = time.time()
+import django
+if hasattr(django, 'setup'):
+    # Django < 1.7 sets itself up on first use.
+    django.setup()
+{0}
+print(json.dumps([time.time() - started,
+                  [name for name, module in sys.modules.items() if module]]))
+"""
+
+
+def _measure(code):
+    """Sets up Django and runs ``code``, and returns the time that took
+    and the names of all imported modules.
+    """
+    env = dict(os.environ, PYTHONPATH=os.pathsep.join(sys.path),
+               DJANGO_SETTINGS_MODULE=settings.SETTINGS_MODULE)
+    output = subprocess.check_output(
+        [sys.executable, '-W', 'ignore', '-c', _SCRIPT.format(code)],
+        env=env)
+    duration, modules = json.loads(output.splitlines()[-1])
+    return duration, set(modules)
+
+
+class StartupBenchmarkTest(SimpleTestCase):
+
+    def _check(self, code):
+        duration, modules = _measure(code)
+        self.assertEqual(modules.intersection(EAGER_MODULES), set())
+        if STARTUP_TIME is not None:
+            self.assertTrue(duration <= float(STARTUP_TIME),
+                            'Took {0:.3f}s'.format(duration))
+
+    def test_urlconf(self):
+        self._check('from django.core.urlresolvers import reverse\n'
+                    "reverse('list_summary', args=['foo.example.org'])")
+
+    def test_mmclient_command(self):
+        self._check('from django.core.management import load_command_class\n'
+                    "load_command_class('postorius', 'mmclient')")
@@ -0,0 +1,160 @@
+# -*- coding: utf-8 -*-
+# Copyright (C) 2012-2015 by the Free Software Foundation, Inc.
+#
+# This file is part of Postorius.
+#
+# Postorius is free software: you can redistribute it and/or modify it under
+# the terms of the GNU General Public License as published by the Free
+# Software Foundation, either version 3 of the License, or (at your option)
+# any later version.
+# Postorius is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or
+# FITNESS FOR A PARTICULAR PURPOSE.  See the GNU General Public License for
+# more details.
+#
+# You should have received a copy of the GNU General Public License along with
+# Postorius.  If not, see <http://www.gnu.org/licenses/>.
+
+
+"""Render time of the largest templates.
+
+The templates are rendered with the cached template loader, after
+``precompile_templates``, from generated contexts. ``ROWS`` members, held
+messages and lists are rendered. If ``POSTORIUS_BENCHMARK_RENDER_TIME`` is
+set, each render must not take longer than that many seconds.
+"""
+
+import os
+import sys
+import time
+
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.core.signals import request_started
+from django.template import RequestContext
+from django.template.loader import get_template
+from django.test import TestCase
+from django.test.client import RequestFactory
+from django.test.utils import override_settings
+from django.utils import unittest
+from mock import patch
+
+try:
+    from django.apps import apps
+    from django.template.engine import Engine
+except ImportError:
+    # Django < 1.8
+    Engine = None
+
+from postorius.tests.benchmarks import record
+from postorius.tests.benchmarks.test_views import SCALE
+from postorius.tests.fake_mailman import DEFAULT_LIST_SETTINGS
+from postorius.utils import precompile_templates
+from postorius.views.list import SETTINGS_FORMS, SETTINGS_SECTION_NAMES
+
+
+RENDER_TIME = os.environ.get('POSTORIUS_BENCHMARK_RENDER_TIME')
+ROWS = 200 * SCALE
+
+CACHED_LOADERS = (
+    ('django.template.loaders.cached.Loader', (
+        'django.template.loaders.filesystem.Loader',
+        'django.template.loaders.app_directories.Loader',
+    )),
+)
+
+
+class FakeList(object):
+    # Mock objects are not usable in templates, since the template engine
+    # tries a dictionary lookup first.
+    list_id = 'foo.example.org'
+    fqdn_listname = 'foo@example.org'
+    display_name = 'Foo'
+    member_page_nr = 1
+    member_page_previous_nr = 0
+    member_page_next_nr = 2
+    member_page_show_next = True
+
+    def __init__(self, rows):
+        self.owners = ['owner{0}@example.org'.format(i) for i in range(3)]
+        self.moderators = ['mod{0}@example.org'.format(i) for i in range(3)]
+        self.member_page = [dict(email='user{0}@example.org'.format(i),
+                                 role='member') for i in range(rows)]
+        self.settings = dict(DEFAULT_LIST_SETTINGS,
+                             description='The Foo list')
+
+
+@override_settings(TEMPLATE_LOADERS=CACHED_LOADERS)
+class TemplateBenchmarkTest(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.request = RequestFactory().get('/')
+        self.request.user = User.objects.create_superuser(
+            'su', 'su@example.org', 'pwd')
+        self.list = FakeList(ROWS)
+
+    def _render(self, name, data):
+        template = get_template(name)
+        started = time.time()
+        content = template.render(RequestContext(self.request, data))
+        render_time = time.time() - started
+        record('render:' + name, render_time=render_time)
+        if RENDER_TIME is not None:
+            self.assertTrue(render_time <= float(RENDER_TIME),
+                            '{0} took {1:.3f}s'.format(name, render_time))
+        return content
+
+    @unittest.skipIf(Engine is None, 'Needs the template engines of 1.8')
+    def test_templates_are_precompiled(self):
+        self.assertTrue(precompile_templates() > 0)
+        loader = Engine.get_default().template_loaders[0]
+        for name in ('postorius/lists/members.html',
+                     'postorius/lists/held_messages.html',
+                     'postorius/lists/index.html',
+                     'postorius/lists/settings.html'):
+            self.assertTrue(name in loader.template_cache)
+
+    def test_precompile_needs_template_engines(self):
+        # Older versions of Django have no template engines to fill.
+        with patch.dict(sys.modules, {'django.template.engine': None}):
+            self.assertEqual(precompile_templates(), 0)
+
+    @unittest.skipIf(Engine is None, 'Needs the template engines of 1.8')
+    def test_precompiled_on_first_request(self):
+        self.addCleanup(request_started.disconnect,
+                        dispatch_uid='postorius.precompile_templates')
+        with patch('postorius.utils.precompile_templates') as mock_precompile:
+            apps.get_app_config('postorius').ready()
+            self.assertEqual(mock_precompile.call_count, 0)
+            with override_settings(PRECOMPILE_TEMPLATES=True):
+                apps.get_app_config('postorius').ready()
+            request_started.send(sender=None)
+            request_started.send(sender=None)
+        self.assertEqual(mock_precompile.call_count, 1)
+
+    def test_members(self):
+        content = self._render('postorius/lists/members.html',
+                               {'list': self.list})
+        self.assertTrue('user{0}@example.org'.format(ROWS - 1) in content)
+
+    def test_held_messages(self):
+        held_messages = [dict(
+            request_id=i, sender='spam{0}@example.net'.format(i),
+            subject='Message {0}'.format(i), reason='Not a member',
+            hold_date='2015-01-01T00:00:00',
+            msg='From: spam@example.net\n\nHello\n') for i in range(ROWS)]
+        self._render('postorius/lists/held_messages.html',
+                     {'list': self.list, 'held_messages': held_messages,
+                      'held_cursor': 'cursor'})
+
+    def test_list_index(self):
+        self._render('postorius/lists/index.html',
+                     {'lists': [self.list] * ROWS, 'domain_count': 1})
+
+    def test_settings(self):
+        for section, form_class in SETTINGS_FORMS.items():
+            self._render('postorius/lists/settings.html',
+                         {'list': self.list, 'visible_section': section,
+                          'section_names': SETTINGS_SECTION_NAMES,
+                          'form': form_class(initial=self.list.settings)})
@@ -0,0 +1,161 @@
+# -*- coding: utf-8 -*-
+# Copyright (C) 2012-2015 by the Free Software Foundation, Inc.
+#
+# This file is part of Postorius.
+#
+# Postorius is free software: you can redistribute it and/or modify it under
+# the terms of the GNU General Public License as published by the Free
+# Software Foundation, either version 3 of the License, or (at your option)
+# any later version.
+# Postorius is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or
+# FITNESS FOR A PARTICULAR PURPOSE.  See the GNU General Public License for
+# more details.
+#
+# You should have received a copy of the GNU General Public License along with
+# Postorius.  If not, see <http://www.gnu.org/licenses/>.
+
+
+"""REST call and wall time budgets of the most used views.
+
+The views are rendered against a seeded :class:`FakeMailman` server. Each
+view has a budget of REST calls, made of a fixed part and parts that grow
+with the number of lists and list members, and fails once it makes more
+calls than that. New N+1 query patterns are caught that way.
+
+The volumes and the latency injected into every REST call can be changed
+through the environment. Wall times are only checked if the time allowed
+on top of the REST calls is given as well::
+
+    POSTORIUS_BENCHMARK_SCALE=10 POSTORIUS_BENCHMARK_LATENCY=0.005 \\
+        POSTORIUS_BENCHMARK_TIME=2.0 \\
+        python manage.py test postorius.tests.benchmarks
+
+The measured calls and wall times are written to the benchmark report.
+"""
+
+import os
+import time
+
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.core.urlresolvers import reverse
+from django.test import Client, TestCase
+from django.test.utils import override_settings
+
+from postorius.tests.benchmarks import record
+from postorius.tests.fake_mailman import FakeMailman
+
+
+SCALE = int(os.environ.get('POSTORIUS_BENCHMARK_SCALE', 1))
+LATENCY = float(os.environ.get('POSTORIUS_BENCHMARK_LATENCY', 0))
+TIME_ALLOWANCE = os.environ.get('POSTORIUS_BENCHMARK_TIME')
+
+LISTS = 10 * SCALE
+MEMBERS_PER_LIST = 40 * SCALE
+
+# REST calls allowed per view: (fixed, per list, per list member), as
+# measured. Lower a budget whenever a view gets cheaper.
+CALL_BUDGETS = {
+    'list_index': (3, 3, 0),
+    # mailmanclient's get_member() walks the roster to find the user.
+    'list_summary': (4, 0, 1),
+    'list_members': (29, 0, 0),
+    'list_held_messages': (2, 0, 0),
+    'list_settings': (2, 0, 0),
+    'user_subscriptions': (4, 0, 0),
+    # Still looks up the members one by one while iterating over the
+    # roster.
+    'csv_view': (2, 0, 1),
+}
+
+
+def call_budget(view):
+    fixed, per_list, per_member = CALL_BUDGETS[view]
+    return fixed + per_list * LISTS + per_member * MEMBERS_PER_LIST
+
+
+class ViewBenchmarkTest(TestCase):
+    """Renders the hot views and checks their REST call budgets."""
+
+    @classmethod
+    def setUpClass(cls):
+        super(ViewBenchmarkTest, cls).setUpClass()
+        cls.mailman = FakeMailman(latency=LATENCY)
+        cls.list_ids = cls.mailman.seed(
+            lists=LISTS, members_per_list=MEMBERS_PER_LIST,
+            held_per_list=5, requests_per_list=3)
+        cls.mailman.start()
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.mailman.stop()
+        super(ViewBenchmarkTest, cls).tearDownClass()
+
+    def setUp(self):
+        cache.clear()
+        settings = override_settings(**self.mailman.settings())
+        settings.enable()
+        self.addCleanup(settings.disable)
+        # The superuser is not subscribed anywhere, which is the worst
+        # case for looking up the own membership.
+        User.objects.create_superuser('su', 'nobody@example.org', 'pwd')
+        self.client = Client()
+        self.client.login(username='su', password='pwd')
+
+    def _measure(self, view, url, client=None):
+        client = client or self.client
+        self.mailman.reset_log()
+        started = time.time()
+        response = client.get(url)
+        wall_time = time.time() - started
+        calls = len(self.mailman.request_log)
+        record(view, calls=calls, wall_time=wall_time,
+               budget=call_budget(view))
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(
+            calls <= call_budget(view),
+            '{0} made {1} REST calls, the budget is {2}'.format(
+                view, calls, call_budget(view)))
+        if TIME_ALLOWANCE is not None:
+            self.assertTrue(
+                wall_time <= (float(TIME_ALLOWANCE) +
+                              call_budget(view) * LATENCY),
+                '{0} took {1:.3f}s'.format(view, wall_time))
+        return response
+
+    def test_list_index(self):
+        response = self._measure('list_index', reverse('list_index'))
+        self.assertEqual(len(response.context['lists']), LISTS)
+
+    def test_list_summary(self):
+        self._measure('list_summary',
+                      reverse('list_summary', args=[self.list_ids[0]]))
+
+    def test_list_members(self):
+        self._measure('list_members',
+                      reverse('list_members', args=[self.list_ids[0]]))
+
+    def test_list_held_messages(self):
+        self._measure('list_held_messages',
+                      reverse('list_held_messages',
+                              args=[self.list_ids[0]]))
+
+    def test_list_settings(self):
+        self._measure('list_settings',
+                      reverse('list_settings', args=[self.list_ids[0]]))
+
+    def test_user_subscriptions(self):
+        # The first seeded user is subscribed to every list.
+        User.objects.create_user('member', 'user0@example.org', 'pwd')
+        client = Client()
+        client.login(username='member', password='pwd')
+        response = self._measure('user_subscriptions',
+                                 reverse('user_subscriptions'), client)
+        self.assertEqual(response.context['memberships'].paginator.count, LISTS)
+
+    def test_csv_view(self):
+        response = self._measure('csv_view',
+                                 reverse('csv_view', args=[self.list_ids[0]]))
+        self.assertEqual(len(response.content.splitlines()),
+                         MEMBERS_PER_LIST)
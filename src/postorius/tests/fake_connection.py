@@ -0,0 +1,65 @@
+# -*- coding: utf-8 -*-
+# Copyright (C) 2012-2015 by the Free Software Foundation, Inc.
+#
+# This file is part of Postorius.
+#
+# Postorius is free software: you can redistribute it and/or modify it under
+# the terms of the GNU General Public License as published by the Free
+# Software Foundation, either version 3 of the License, or (at your option)
+# any later version.
+# Postorius is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or
+# FITNESS FOR A PARTICULAR PURPOSE.  See the GNU General Public License for
+# more details.
+#
+# You should have received a copy of the GNU General Public License along with
+# Postorius.  If not, see <http://www.gnu.org/licenses/>.
+
+"""A stand-in for the connection of a mailmanclient ``Client``.
+
+It answers REST calls from a dictionary of resources, without a server::
+
+    >>> connection = FakeConnection({
+    ...     'lists': [dict(list_id='foo.example.org')],
+    ...     'lists/foo.example.org/config': dict(advertised=True)})
+    >>> client = MagicMock()
+    >>> client._connection = connection
+    >>> with patch.object(models, 'get_client', return_value=client):
+    ...     ListSnapshot.objects.refresh()
+    >>> connection.calls
+    ['lists?count=100&page=1', 'lists/foo.example.org/config']
+"""
+
+from urllib2 import HTTPError
+
+
+class FakeConnection(object):
+    """Answers REST calls from a dictionary of resources.
+
+    Lists are collections, paged with the ``count`` and ``page`` query
+    parameters. Anything else is returned as it is. Lookups with a
+    ``subscriber`` (like ``members/find``) are answered from the resource
+    ``<path>/<subscriber>``. Unknown paths raise a 404 ``HTTPError``.
+    Every called path is appended to ``calls``.
+    """
+
+    def __init__(self, resources):
+        self.resources = resources
+        self.calls = []
+
+    def call(self, path, data=None, method=None):
+        self.calls.append(path)
+        if data is not None and 'subscriber' in data:
+            path = '{0}/{1}'.format(path, data['subscriber'])
+        path, _, query = path.partition('?')
+        if path not in self.resources:
+            raise HTTPError(path, 404, 'Not Found', {}, None)
+        entries = self.resources[path]
+        if not isinstance(entries, list):
+            return None, entries
+        if query:
+            params = dict(param.split('=') for param in query.split('&'))
+            count, page = int(params['count']), int(params['page'])
+            entries = entries[(page - 1) * count:page * count]
+        return None, dict(entries=entries,
+                          total_size=len(self.resources[path]))
@@ -0,0 +1,742 @@
+# -*- coding: utf-8 -*-
+# Copyright (C) 2012-2015 by the Free Software Foundation, Inc.
+#
+# This file is part of Postorius.
+#
+# Postorius is free software: you can redistribute it and/or modify it under
+# the terms of the GNU General Public License as published by the Free
+# Software Foundation, either version 3 of the License, or (at your option)
+# any later version.
+# Postorius is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or
+# FITNESS FOR A PARTICULAR PURPOSE.  See the GNU General Public License for
+# more details.
+#
+# You should have received a copy of the GNU General Public License along with
+# Postorius.  If not, see <http://www.gnu.org/licenses/>.
+
+"""An in-process stand-in for the Mailman core REST API.
+
+The fake server keeps its data in memory and answers the parts of the
+REST API used by Postorius and mailmanclient. It can be seeded with large
+volumes of data and can delay every response, so that the number and cost
+of REST calls made by the views can be measured offline::
+
+    >>> mailman = FakeMailman(latency=0.005)
+    >>> mailman.seed(lists=10, members_per_list=100000)
+    >>> mailman.start()
+    >>> with override_settings(**mailman.settings()):
+    ...     response = client.get(reverse('list_index'))
+    >>> len(mailman.request_log)
+    >>> mailman.stop()
+
+Every answered request is appended to ``request_log`` as a
+``(method, path, status, duration)`` tuple.
+"""
+
+import re
+import json
+import time
+import hashlib
+import itertools
+import threading
+
+from collections import OrderedDict
+from contextlib import contextmanager
+from SocketServer import ThreadingMixIn
+from urllib import unquote
+from urlparse import parse_qs
+from wsgiref.simple_server import WSGIRequestHandler, WSGIServer, make_server
+
+
+DEFAULT_LIST_SETTINGS = {
+    'acceptable_aliases': [],
+    'admin_immed_notify': True,
+    'admin_notify_mchanges': False,
+    'administrivia': True,
+    'advertised': True,
+    'allow_list_posts': True,
+    'anonymous_list': False,
+    'archive_policy': 'public',
+    'autorespond_owner': 'none',
+    'autorespond_postings': 'none',
+    'autorespond_requests': 'none',
+    'autoresponse_grace_period': '90d',
+    'autoresponse_owner_text': '',
+    'autoresponse_postings_text': '',
+    'autoresponse_request_text': '',
+    'collapse_alternatives': True,
+    'convert_html_to_plaintext': False,
+    'created_at': '2015-01-01T00:00:00',
+    'default_member_action': 'defer',
+    'default_nonmember_action': 'hold',
+    'description': '',
+    'digest_last_sent_at': None,
+    'digest_size_threshold': 30.0,
+    'filter_content': False,
+    'first_strip_reply_to': False,
+    'include_rfc2369_headers': True,
+    'last_post_at': None,
+    'next_digest_number': 1,
+    'post_id': 1,
+    'posting_pipeline': 'default-posting-pipeline',
+    'reply_goes_to_list': 'no_munging',
+    'reply_to_address': '',
+    'scheme': 'http',
+    'send_welcome_message': True,
+    'subscription_policy': 'confirm',
+    'volume': 1,
+    'welcome_message_uri': 'mailman:///welcome.txt',
+}
+
+DEFAULT_PREFERENCES = {
+    'acknowledge_posts': False,
+    'delivery_mode': 'regular',
+    'delivery_status': 'enabled',
+    'hide_address': True,
+    'preferred_language': 'en',
+    'receive_list_copy': True,
+    'receive_own_postings': True,
+}
+
+
+class HTTPError(Exception):
+    """Turned into an error response by the fake server."""
+
+    def __init__(self, status, title=None):
+        super(HTTPError, self).__init__(title)
+        self.status = status
+        self.title = title or {404: '404 Not Found',
+                               400: '400 Bad Request',
+                               409: '409 Conflict'}.get(status, str(status))
+
+
+class _DataLock(object):
+    """Lets reads run side by side, and mutations run alone.
+
+    Used as a context manager, it is held for a mutation and is reentrant
+    like an RLock. ``reading()`` is held while answering a GET.
+    """
+
+    def __init__(self):
+        self._mutating = threading.RLock()
+        self._readers = 0
+        self._idle = threading.Condition(threading.Lock())
+
+    def __enter__(self):
+        self._mutating.acquire()
+        with self._idle:
+            while self._readers:
+                self._idle.wait()
+
+    def __exit__(self, *exc_info):
+        self._mutating.release()
+
+    @contextmanager
+    def reading(self):
+        with self._mutating:
+            with self._idle:
+                self._readers += 1
+        try:
+            yield
+        finally:
+            with self._idle:
+                self._readers -= 1
+                if not self._readers:
+                    self._idle.notify_all()
+
+
+class _ThreadingWSGIServer(ThreadingMixIn, WSGIServer):
+    daemon_threads = True
+
+
+class _QuietHandler(WSGIRequestHandler):
+
+    def log_message(self, *args):
+        pass
+
+
+def _etag(data):
+    return '"{0}"'.format(hashlib.sha1(
+        json.dumps(data, sort_keys=True)).hexdigest())
+
+
+def _bool(value):
+    return value in (True, 'True', 'true', '1')
+
+
+class FakeMailman(object):
+    """A fake Mailman core, see the module docstring."""
+
+    def __init__(self, latency=0.0, host='127.0.0.1', port=0):
+        self.latency = latency
+        self.host = host
+        self.port = port
+        self.request_log = []
+        self.domains = OrderedDict()
+        self.lists = OrderedDict()
+        self.users = OrderedDict()
+        self.addresses = OrderedDict()
+        self.members = OrderedDict()
+        self.held = {}
+        self.requests = {}
+        self.preferences = {}
+        self._rosters = {}
+        self._ids = itertools.count(1)
+        self._lock = _DataLock()
+        self._server = None
+        self._thread = None
+        self._routes = [
+            (re.compile(pattern), handler) for pattern, handler in (
+                (r'^system/versions$', self._system),
+                (r'^domains$', self._domains),
+                (r'^domains/([^/]+)$', self._domain),
+                (r'^domains/([^/]+)/lists$', self._domain_lists),
+                (r'^domains/([^/]+)/owners$', self._domain_owners),
+                (r'^lists$', self._lists),
+                (r'^lists/([^/]+)$', self._list),
+                (r'^lists/([^/]+)/config$', self._list_config),
+                (r'^lists/([^/]+)/roster/([^/]+)$', self._roster),
+                (r'^lists/([^/]+)/(owner|moderator|member)/([^/]+)$',
+                 self._list_role),
+                (r'^lists/([^/]+)/held$', self._held),
+                (r'^lists/([^/]+)/held/([^/]+)$', self._held_message),
+                (r'^lists/([^/]+)/requests$', self._requests),
+                (r'^lists/([^/]+)/requests/([^/]+)$', self._request),
+                (r'^lists/([^/]+)/archivers$', self._archivers),
+                (r'^members$', self._members),
+                (r'^members/find$', self._find_members),
+                (r'^members/([^/]+)$', self._member),
+                (r'^members/([^/]+)/preferences$', self._preferences),
+                (r'^users$', self._users),
+                (r'^users/([^/]+)$', self._user),
+                (r'^users/([^/]+)/addresses$', self._user_addresses),
+                (r'^users/([^/]+)/preferences$', self._preferences),
+                (r'^addresses/([^/]+)$', self._address),
+                (r'^addresses/([^/]+)/preferences$', self._preferences),
+            )]
+
+    # Server
+
+    @property
+    def url(self):
+        return 'http://{0}:{1}'.format(self.host, self.port)
+
+    def settings(self):
+        """Returns the settings pointing Postorius to this server."""
+        return {'MAILMAN_API_URL': self.url,
+                'MAILMAN_USER': 'restadmin',
+                'MAILMAN_PASS': 'restpass'}
+
+    def start(self):
+        self._server = make_server(self.host, self.port, self.app,
+                                   server_class=_ThreadingWSGIServer,
+                                   handler_class=_QuietHandler)
+        self.port = self._server.server_port
+        self._thread = threading.Thread(target=self._server.serve_forever)
+        self._thread.daemon = True
+        self._thread.start()
+
+    def stop(self):
+        if self._server is not None:
+            self._server.shutdown()
+            self._server.server_close()
+            self._server = None
+
+    def reset_log(self):
+        del self.request_log[:]
+
+    def _link(self, path):
+        # Links are stored relative to the server, so that data can be
+        # seeded before the port is known, and made absolute on output.
+        return '/3.0/' + path
+
+    def app(self, environ, start_response):
+        started = time.time()
+        if self.latency:
+            time.sleep(self.latency)
+        method = environ['REQUEST_METHOD']
+        path = unquote(environ.get('PATH_INFO', ''))
+        if path.startswith('/3.0/'):
+            path = path[len('/3.0/'):]
+        query = dict((key, values[-1]) for key, values in
+                     parse_qs(environ.get('QUERY_STRING', '')).items())
+        data = {}
+        if method in ('POST', 'PUT', 'PATCH'):
+            length = int(environ.get('CONTENT_LENGTH') or 0)
+            body = environ['wsgi.input'].read(length)
+            data = dict((key, values if len(values) > 1 else values[0])
+                        for key, values in parse_qs(body).items())
+        headers = [('Content-Type', 'application/json')]
+        try:
+            if method == 'GET':
+                with self._lock.reading():
+                    result = self._dispatch(method, path, query, data)
+            else:
+                with self._lock:
+                    result = self._dispatch(method, path, query, data)
+            status, content = result[:2]
+            if len(result) > 2:
+                headers.append(('Location', self.url + result[2]))
+        except HTTPError, e:
+            status, content = e.status, {'title': e.title}
+        body = '' if content is None else json.dumps(content).replace(
+            '"/3.0/', '"{0}/3.0/'.format(self.url))
+        self.request_log.append((method, path, status,
+                                 time.time() - started))
+        start_response('{0} {1}'.format(
+            status, {200: 'OK', 201: 'Created', 202: 'Accepted',
+                     204: 'No Content'}.get(status, 'Error')), headers)
+        return [body]
+
+    def _dispatch(self, method, path, query, data):
+        for pattern, handler in self._routes:
+            match = pattern.match(path)
+            if match:
+                return handler(method, query, data, *match.groups())
+        raise HTTPError(404)
+
+    # Seeding
+
+    def add_domain(self, mail_host, description=''):
+        with self._lock:
+            self.domains[mail_host] = dict(
+                mail_host=mail_host, url_host=mail_host,
+                base_url='http://{0}'.format(mail_host),
+                contact_address='postmaster@{0}'.format(mail_host),
+                description=description,
+                self_link=self._link('domains/' + mail_host))
+        return self.domains[mail_host]
+
+    def add_list(self, fqdn_listname, **settings):
+        list_name, mail_host = fqdn_listname.split('@')
+        list_id = '{0}.{1}'.format(list_name, mail_host)
+        with self._lock:
+            if mail_host not in self.domains:
+                self.add_domain(mail_host)
+            config = dict(DEFAULT_LIST_SETTINGS)
+            config.update(
+                display_name=list_name.capitalize(),
+                fqdn_listname=fqdn_listname, list_name=list_name,
+                mail_host=mail_host, web_host=mail_host,
+                posting_address=fqdn_listname,
+                bounces_address='{0}-bounces@{1}'.format(
+                    list_name, mail_host),
+                join_address='{0}-join@{1}'.format(list_name, mail_host),
+                leave_address='{0}-leave@{1}'.format(list_name, mail_host),
+                owner_address='{0}-owner@{1}'.format(list_name, mail_host),
+                request_address='{0}-request@{1}'.format(
+                    list_name, mail_host),
+                no_reply_address='noreply@{0}'.format(mail_host),
+                subject_prefix='[{0}] '.format(list_name.capitalize()))
+            config.update(settings)
+            self.lists[list_id] = dict(
+                list_id=list_id, config=config,
+                archivers={'mail-archive': False, 'mhonarc': False,
+                           'prototype': False})
+            self.held[list_id] = OrderedDict()
+            self.requests[list_id] = OrderedDict()
+        return list_id
+
+    def add_user(self, email, display_name=None):
+        with self._lock:
+            if email in self.addresses:
+                return self.addresses[email]['user_id']
+            user_id = next(self._ids)
+            self.users[user_id] = dict(
+                user_id=user_id, display_name=display_name or 'None',
+                created_on='2015-01-01T00:00:00', is_server_owner=False,
+                password='$6$rounds=656000$fake',
+                self_link=self._link('users/{0}'.format(user_id)),
+                addresses=[])
+            self._add_address(user_id, email)
+        return user_id
+
+    def _add_address(self, user_id, email):
+        self.addresses[email] = dict(
+            email=email, original_email=email,
+            display_name=self.users[user_id]['display_name'],
+            registered_on='2015-01-01T00:00:00',
+            verified_on='2015-01-01T00:00:00', user_id=user_id,
+            self_link=self._link('addresses/' + email))
+        self.users[user_id]['addresses'].append(email)
+
+    def subscribe(self, list_id, email, role='member',
+                  delivery_mode='regular'):
+        with self._lock:
+            list_id = self._get_list(list_id)['list_id']
+            if email not in self.addresses:
+                self.add_user(email)
+            for member_id in self._rosters.get((list_id, role), ()):
+                if self.members[member_id]['email'] == email:
+                    raise HTTPError(409, 'Member already subscribed')
+            member_id = next(self._ids)
+            self.members[member_id] = dict(
+                member_id=member_id, list_id=list_id, email=email,
+                role=role, delivery_mode=delivery_mode,
+                address=self._link('addresses/' + email),
+                user=self._link('users/{0}'.format(
+                    self.addresses[email]['user_id'])),
+                self_link=self._link('members/{0}'.format(member_id)))
+            self._rosters.setdefault((list_id, role), []).append(member_id)
+        return member_id
+
+    def hold_message(self, list_id, sender, subject='Held message',
+                     reason='Post by non-member to a members-only list'):
+        with self._lock:
+            request_id = next(self._ids)
+            self.held[list_id][request_id] = dict(
+                request_id=request_id, sender=sender, subject=subject,
+                reason=reason, hold_date='2015-01-01T00:00:00',
+                msg='From: {0}\nSubject: {1}\n\nHello\n'.format(
+                    sender, subject))
+        return request_id
+
+    def add_request(self, list_id, email):
+        with self._lock:
+            token = hashlib.sha1(str(next(self._ids))).hexdigest()
+            self.requests[list_id][token] = dict(
+                email=email, token=token, token_owner='moderator',
+                list_id=list_id, when='2015-01-01T00:00:00',
+                display_name='')
+        return token
+
+    def seed(self, domains=1, lists=10, members_per_list=100, owners=1,
+             moderators=1, held_per_list=0, requests_per_list=0,
+             users=None):
+        """Fills the server with generated data.
+
+        Members are drawn from a pool of ``users`` users (by default one
+        per member of the largest list), so users are subscribed to many
+        lists once the lists are large enough.
+        """
+        pool = users or max(members_per_list, 1)
+        list_ids = []
+        for domain_nr in range(domains):
+            mail_host = 'example{0}.org'.format(domain_nr)
+            self.add_domain(mail_host)
+            for list_nr in range(lists):
+                list_ids.append(self.add_list(
+                    'list{0}@{1}'.format(list_nr, mail_host),
+                    description='Seeded list number {0}'.format(list_nr)))
+        with self._lock:
+            for list_nr, list_id in enumerate(list_ids):
+                for i in range(owners):
+                    self.subscribe(list_id, 'owner{0}@example.org'.format(i),
+                                   'owner')
+                for i in range(moderators):
+                    self.subscribe(list_id,
+                                   'moderator{0}@example.org'.format(i),
+                                   'moderator')
+                for i in range(members_per_list):
+                    self.subscribe(list_id, 'user{0}@example.org'.format(
+                        (list_nr + i) % pool))
+                for i in range(held_per_list):
+                    self.hold_message(list_id, 'spam{0}@example.net'.format(i))
+                for i in range(requests_per_list):
+                    self.add_request(list_id,
+                                     'new{0}@example.net'.format(i))
+        return list_ids
+
+    # Helpers
+
+    def _collection(self, records, query, entry=None):
+        """Answers a collection of ``records``.
+
+        Only the records on the requested page are turned into entries,
+        with ``entry`` if given.
+        """
+        total_size = len(records)
+        start = 0
+        if 'count' in query and 'page' in query:
+            count, page = int(query['count']), int(query['page'])
+            start = (page - 1) * count
+            records = records[start:start + count]
+        entries = records if entry is None else map(entry, records)
+        content = dict(start=start, total_size=total_size)
+        if entries:
+            content['entries'] = entries
+        content['http_etag'] = _etag(content)
+        return 200, content
+
+    def _get_list(self, key):
+        if key in self.lists:
+            return self.lists[key]
+        if '@' in key:
+            list_name, mail_host = key.split('@', 1)
+            list_id = '{0}.{1}'.format(list_name, mail_host)
+            if list_id in self.lists:
+                return self.lists[list_id]
+        raise HTTPError(404)
+
+    def _list_entry(self, mlist):
+        config = mlist['config']
+        entry = dict(
+            list_id=mlist['list_id'], fqdn_listname=config['fqdn_listname'],
+            list_name=config['list_name'], mail_host=config['mail_host'],
+            display_name=config['display_name'], volume=config['volume'],
+            member_count=len(self._rosters.get(
+                (mlist['list_id'], 'member'), ())),
+            self_link=self._link('lists/' + mlist['list_id']))
+        entry['http_etag'] = _etag(entry)
+        return entry
+
+    def _member_entry(self, member_id):
+        entry = dict(self.members[member_id])
+        entry['http_etag'] = _etag(entry)
+        return entry
+
+    def _get_user(self, key):
+        try:
+            return self.users[int(key)]
+        except (ValueError, KeyError):
+            pass
+        if key in self.addresses:
+            return self.users[self.addresses[key]['user_id']]
+        raise HTTPError(404)
+
+    def _user_entry(self, user):
+        entry = dict((key, value) for key, value in user.items()
+                     if key != 'addresses')
+        entry['http_etag'] = _etag(entry)
+        return entry
+
+    def _address_entry(self, email):
+        entry = dict(self.addresses[email])
+        entry['user'] = self._link('users/{0}'.format(entry.pop('user_id')))
+        entry['http_etag'] = _etag(entry)
+        return entry
+
+    def _not_allowed(self):
+        raise HTTPError(405, '405 Method Not Allowed')
+
+    # Resources
+
+    def _system(self, method, query, data):
+        return 200, dict(mailman_version='GNU Mailman 3.0.0 (fake)',
+                         python_version='2.7', http_etag='"fake"',
+                         self_link=self._link('system/versions'))
+
+    def _domains(self, method, query, data):
+        if method == 'POST':
+            domain = self.add_domain(data['mail_host'],
+                                     data.get('description', ''))
+            return 201, None, domain['self_link']
+        return self._collection(self.domains.values(), query)
+
+    def _domain(self, method, query, data, mail_host):
+        if mail_host not in self.domains:
+            raise HTTPError(404)
+        if method == 'DELETE':
+            del self.domains[mail_host]
+            return 204, None
+        return 200, self.domains[mail_host]
+
+    def _domain_lists(self, method, query, data, mail_host):
+        return self._collection(
+            [mlist for mlist in self.lists.values()
+             if mlist['config']['mail_host'] == mail_host], query,
+            self._list_entry)
+
+    def _domain_owners(self, method, query, data, mail_host):
+        return self._collection([], query)
+
+    def _lists(self, method, query, data):
+        if method == 'POST':
+            fqdn_listname = data['fqdn_listname']
+            if fqdn_listname.split('@')[1] not in self.domains:
+                raise HTTPError(400, 'Domain does not exist')
+            list_id = self.add_list(fqdn_listname)
+            return 201, None, self._link('lists/' + list_id)
+        return self._collection(self.lists.values(), query,
+                                self._list_entry)
+
+    def _list(self, method, query, data, key):
+        mlist = self._get_list(key)
+        if method == 'DELETE':
+            list_id = mlist['list_id']
+            del self.lists[list_id]
+            for member_id in [member_id for member_id, member
+                              in self.members.items()
+                              if member['list_id'] == list_id]:
+                del self.members[member_id]
+            for roster in [roster for roster in self._rosters
+                           if roster[0] == list_id]:
+                del self._rosters[roster]
+            return 204, None
+        return 200, self._list_entry(mlist)
+
+    def _list_config(self, method, query, data, key):
+        config = self._get_list(key)['config']
+        if method in ('PATCH', 'PUT'):
+            for name, value in data.items():
+                if isinstance(DEFAULT_LIST_SETTINGS.get(name), bool):
+                    value = _bool(value)
+                config[name] = value
+            return 204, None
+        content = dict(config)
+        content['http_etag'] = _etag(content)
+        return 200, content
+
+    def _roster(self, method, query, data, key, role):
+        list_id = self._get_list(key)['list_id']
+        return self._collection(list(self._rosters.get((list_id, role), ())),
+                                query, self._member_entry)
+
+    def _list_role(self, method, query, data, key, role, email):
+        list_id = self._get_list(key)['list_id']
+        roster = self._rosters.get((list_id, role), [])
+        for member_id in roster:
+            if self.members[member_id]['email'] == email:
+                if method == 'DELETE':
+                    roster.remove(member_id)
+                    del self.members[member_id]
+                    return 204, None
+                return 200, self._member_entry(member_id)
+        raise HTTPError(404)
+
+    def _held(self, method, query, data, key):
+        list_id = self._get_list(key)['list_id']
+        return self._collection(self.held[list_id].values(), query)
+
+    def _held_message(self, method, query, data, key, request_id):
+        list_id = self._get_list(key)['list_id']
+        held = self.held[list_id]
+        try:
+            message = held[int(request_id)]
+        except (ValueError, KeyError):
+            raise HTTPError(404)
+        if method == 'POST':
+            if data.get('action') != 'defer':
+                del held[int(request_id)]
+            return 204, None
+        return 200, message
+
+    def _requests(self, method, query, data, key):
+        list_id = self._get_list(key)['list_id']
+        return self._collection(self.requests[list_id].values(), query)
+
+    def _request(self, method, query, data, key, token):
+        list_id = self._get_list(key)['list_id']
+        requests = self.requests[list_id]
+        if token not in requests:
+            raise HTTPError(404)
+        if method == 'POST':
+            request = requests.pop(token)
+            if data.get('action') == 'accept':
+                self.subscribe(list_id, request['email'])
+            elif data.get('action') == 'defer':
+                requests[token] = request
+            return 204, None
+        return 200, requests[token]
+
+    def _archivers(self, method, query, data, key):
+        archivers = self._get_list(key)['archivers']
+        if method in ('PUT', 'PATCH'):
+            for name, value in data.items():
+                archivers[name] = _bool(value)
+            return 204, None
+        content = dict(archivers)
+        content['http_etag'] = _etag(content)
+        return 200, content
+
+    def _members(self, method, query, data):
+        if method == 'POST':
+            list_id = self._get_list(data['list_id'])['list_id']
+            config = self.lists[list_id]['config']
+            role = data.get('role', 'member')
+            needs_approval = (
+                role == 'member' and
+                config['subscription_policy'] != 'open' and
+                not (_bool(data.get('pre_verified')) and
+                     _bool(data.get('pre_confirmed')) and
+                     (_bool(data.get('pre_approved')) or
+                      config['subscription_policy'] == 'confirm')))
+            if needs_approval:
+                token = self.add_request(list_id, data['subscriber'])
+                return 202, dict(token=token, token_owner='subscriber',
+                                 http_etag='"fake"')
+            member_id = self.subscribe(list_id, data['subscriber'], role,
+                                       data.get('delivery_mode', 'regular'))
+            return 201, None, self._link('members/{0}'.format(member_id))
+        return self._collection(self.members.keys(), query,
+                                self._member_entry)
+
+    def _find_members(self, method, query, data):
+        criteria = dict(query)
+        criteria.update(data)
+        member_ids = []
+        for member_id, member in self.members.items():
+            if 'list_id' in criteria and \
+                    member['list_id'] != criteria['list_id']:
+                continue
+            if 'subscriber' in criteria and \
+                    member['email'] != criteria['subscriber']:
+                continue
+            if 'role' in criteria and member['role'] != criteria['role']:
+                continue
+            member_ids.append(member_id)
+        return self._collection(member_ids, query, self._member_entry)
+
+    def _member(self, method, query, data, member_id):
+        try:
+            member_id = int(member_id)
+            member = self.members[member_id]
+        except (ValueError, KeyError):
+            raise HTTPError(404)
+        if method == 'DELETE':
+            self._rosters[(member['list_id'], member['role'])].remove(
+                member_id)
+            del self.members[member_id]
+            return 204, None
+        return 200, self._member_entry(member_id)
+
+    def _preferences(self, method, query, data, key):
+        preferences = self.preferences.setdefault(
+            key, dict(DEFAULT_PREFERENCES))
+        if method in ('PATCH', 'PUT'):
+            for name, value in data.items():
+                if isinstance(DEFAULT_PREFERENCES.get(name), bool):
+                    value = _bool(value)
+                preferences[name] = value
+            return 204, None
+        content = dict(preferences)
+        content['http_etag'] = _etag(content)
+        return 200, content
+
+    def _users(self, method, query, data):
+        if method == 'POST':
+            if data['email'] in self.addresses:
+                raise HTTPError(400, 'User already exists')
+            user_id = self.add_user(data['email'], data.get('display_name'))
+            return 201, None, self._link('users/{0}'.format(user_id))
+        return self._collection(self.users.values(), query,
+                                self._user_entry)
+
+    def _user(self, method, query, data, key):
+        user = self._get_user(key)
+        if method == 'PATCH':
+            if 'display_name' in data:
+                user['display_name'] = data['display_name']
+            return 204, None
+        if method == 'DELETE':
+            for email in user['addresses']:
+                del self.addresses[email]
+            del self.users[user['user_id']]
+            return 204, None
+        return 200, self._user_entry(user)
+
+    def _user_addresses(self, method, query, data, key):
+        user = self._get_user(key)
+        if method == 'POST':
+            if data['email'] in self.addresses:
+                raise HTTPError(400, 'Address already exists')
+            self._add_address(user['user_id'], data['email'])
+            return 201, None, self._link('addresses/' + data['email'])
+        return self._collection(user['addresses'], query,
+                                self._address_entry)
+
+    def _address(self, method, query, data, email):
+        if email not in self.addresses:
+            raise HTTPError(404)
+        return 200, self._address_entry(email)
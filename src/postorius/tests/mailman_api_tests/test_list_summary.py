@@ -17,6 +17,7 @@
 import logging
 
 from django.contrib.auth.models import User
+from django.core.cache import cache
 from django.core.urlresolvers import reverse
 from django.db import IntegrityError
 from django.test import Client, SimpleTestCase
@@ -66,6 +67,8 @@ class ListSummaryPageTest(SimpleTestCase):
         for user in self.mmclient.users:
             user.delete()
         User.objects.all().delete()
+        # The cached Mailman users were deleted as well.
+        cache.clear()
 
     @MM_VCR.use_cassette('test_list_summary.yaml')
     def test_list_summary_logged_out(self):
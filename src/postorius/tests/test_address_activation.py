@@ -12,7 +12,7 @@ from django.utils import unittest
 from mock import patch, call
 
 from postorius.forms import AddressActivationForm
-from postorius.models import AddressConfirmationProfile
+from postorius.models import AddressConfirmationProfile, QueuedMail
 from postorius import views
 from postorius.views.user import AddressActivationView, address_activation_link
 
@@ -175,6 +175,9 @@ class TestAddressConfirmationProfile(unittest.TestCase):
         self.profile.activation_key = \
             '6323fba0097781fdb887cfc37a1122ee7c8bb0b0'
         self.profile.send_confirmation_link(self.request)
+        # The message is queued and sent later.
+        self.assertEqual(len(mail.outbox), 0)
+        QueuedMail.objects.send_queued()
         self.assertEqual(mail.outbox[0].to[0], u'les@example.org')
         self.assertEqual(mail.outbox[0].subject, u'Confirmation needed')
         self.assertTrue(self.profile.activation_key in mail.outbox[0].body)
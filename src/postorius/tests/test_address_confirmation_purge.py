@@ -0,0 +1,69 @@
+# -*- coding: utf-8 -*-
+# Copyright (C) 2012-2015 by the Free Software Foundation, Inc.
+#
+# This file is part of Postorius.
+#
+# Postorius is free software: you can redistribute it and/or modify it under
+# the terms of the GNU General Public License as published by the Free
+# Software Foundation, either version 3 of the License, or (at your option)
+# any later version.
+# Postorius is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or
+# FITNESS FOR A PARTICULAR PURPOSE.  See the GNU General Public License for
+# more details.
+#
+# You should have received a copy of the GNU General Public License along with
+# Postorius.  If not, see <http://www.gnu.org/licenses/>.
+
+from datetime import datetime, timedelta
+from StringIO import StringIO
+
+from django.contrib.auth.models import User
+from django.core.management import call_command
+from django.core.urlresolvers import reverse
+from django.test import TestCase
+from django.test.client import RequestFactory
+from mock import patch
+
+from postorius import views
+from postorius.models import AddressConfirmationProfile
+from postorius.views.user import address_activation_link
+
+
+class ExpiredProfilesTest(TestCase):
+    """Tests the query-side expiry and the purge of confirmation profiles."""
+
+    def setUp(self):
+        self.user = User.objects.create_user('les', 'les@example.org', 'pwd')
+        now = datetime.now()
+        for i, age in enumerate((1, 2, 25, 26, 48)):
+            AddressConfirmationProfile.objects.create(
+                email='les%d@example.org' % i, user=self.user,
+                activation_key='%040d' % i,
+                created=now - timedelta(hours=age))
+
+    def test_expiry_filters(self):
+        self.assertEqual(
+            AddressConfirmationProfile.objects.unexpired().count(), 2)
+        self.assertEqual(
+            AddressConfirmationProfile.objects.expired().count(), 3)
+
+    def test_purge_in_batches(self):
+        stdout = StringIO()
+        call_command('purge_address_confirmations', batch_size=2,
+                     stdout=stdout)
+        self.assertEqual(stdout.getvalue().strip(),
+                         'Deleted 3 expired profiles.')
+        self.assertEqual(
+            sorted(AddressConfirmationProfile.objects.values_list(
+                'email', flat=True)),
+            ['les0@example.org', 'les1@example.org'])
+
+    @patch.object(views.user, '_add_address')
+    def test_expired_key_is_ignored(self, mock_add_address):
+        key = '%040d' % 2
+        request = RequestFactory().get(reverse(
+            'address_activation_link', kwargs={'activation_key': key}))
+        response = address_activation_link(request, key)
+        self.assertEqual(response.status_code, 200)
+        self.assertFalse(mock_add_address.called)
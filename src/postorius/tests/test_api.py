@@ -0,0 +1,452 @@
+# -*- coding: utf-8 -*-
+# Copyright (C) 2012-2015 by the Free Software Foundation, Inc.
+#
+# This file is part of Postorius.
+#
+# Postorius is free software: you can redistribute it and/or modify it under
+# the terms of the GNU General Public License as published by the Free
+# Software Foundation, either version 3 of the License, or (at your option)
+# any later version.
+# Postorius is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or
+# FITNESS FOR A PARTICULAR PURPOSE.  See the GNU General Public License for
+# more details.
+#
+# You should have received a copy of the GNU General Public License along with
+# Postorius.  If not, see <http://www.gnu.org/licenses/>.
+
+import gzip
+import json
+from datetime import datetime
+from StringIO import StringIO
+
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.core.urlresolvers import reverse
+from django.test import Client, TestCase
+from django.test.client import RequestFactory
+from django.test.utils import override_settings
+from mailmanclient import MailmanConnectionError
+from mock import patch, MagicMock
+from urllib2 import HTTPError
+
+from postorius import utils
+from postorius.models import ListSnapshot
+from postorius.tests.fake_connection import FakeConnection
+from postorius.tests.fake_mailman import FakeMailman
+from postorius.views import api
+
+
+def _member(list_id, email, role='member'):
+    return dict(list_id=list_id, email=email, role=role,
+                delivery_mode='regular', self_link='http://mm/members/1')
+
+
+class ApiTest(TestCase):
+    """Tests for the paginated JSON API."""
+
+    def setUp(self):
+        members = [_member('foo.example.org', 'les%d@example.org' % i)
+                   for i in range(5)]
+        cache.clear()
+        self.connection = FakeConnection({
+            'lists': [dict(list_id='%s.example.org' % name,
+                           fqdn_listname='%s@example.org' % name,
+                           display_name=name, member_count=5)
+                      for name in ('bar', 'baz', 'foo')],
+            'lists/bar.example.org/config': dict(advertised=True),
+            'lists/baz.example.org/config': dict(advertised=False),
+            'lists/foo.example.org/config': dict(advertised=True),
+            'lists/foo.example.org/roster/member': members,
+            'lists/foo.example.org/roster/owner': [
+                _member('foo.example.org', 'su@example.org', 'owner')],
+            'users/les@example.org': dict(user_id=42),
+            'users/su@example.org': dict(user_id=1),
+            'users/42/addresses': [dict(email='les@example.org'),
+                                   dict(email='les@example.com')],
+            'members/find/les@example.org': [
+                _member('foo.example.org', 'les@example.org')],
+            'members/find/les@example.com': [
+                _member('bar.example.org', 'les@example.com', 'owner')],
+        })
+        mm_client = MagicMock()
+        mm_client._connection = self.connection
+        patcher = patch.object(utils, 'get_client', return_value=mm_client)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        User.objects.create_superuser('su', 'su@example.org', 'pwd')
+        User.objects.create_user('les', 'les@example.org', 'pwd')
+        self.client = Client()
+
+    def _get(self, url, **params):
+        response = self.client.get(url, params)
+        return response.status_code, json.loads(response.content)
+
+    def test_lists_paging_and_fields(self):
+        self.client.login(username='su', password='pwd')
+        status, content = self._get(reverse('api_lists'), page=2, count=2,
+                                    fields='list_id,member_count')
+        self.assertEqual(status, 200)
+        self.assertEqual(content['total_size'], 3)
+        self.assertEqual(content['entries'], [
+            dict(list_id='foo.example.org', member_count=5)])
+        self.assertEqual(self.connection.calls, ['lists?count=2&page=2'])
+
+    def test_lists_only_advertised(self):
+        self.client.login(username='les', password='pwd')
+        status, content = self._get(reverse('api_lists'), page=2, count=1,
+                                    fields='list_id')
+        self.assertEqual(content['total_size'], 2)
+        self.assertEqual(content['entries'], [dict(list_id='foo.example.org')])
+        # Superusers get all lists, from a separately cached payload.
+        self.client.login(username='su', password='pwd')
+        status, content = self._get(reverse('api_lists'), page=2, count=1,
+                                    fields='list_id')
+        self.assertEqual(content['total_size'], 3)
+
+    @override_settings(LIST_INDEX_SNAPSHOT=True)
+    def test_lists_only_advertised_from_snapshot(self):
+        for name, advertised in (('bar', True), ('baz', False)):
+            ListSnapshot.objects.create(
+                list_id='%s.example.org' % name,
+                fqdn_listname='%s@example.org' % name, list_name=name,
+                mail_host='example.org', advertised=advertised,
+                updated=datetime.now())
+        self.client.login(username='les', password='pwd')
+        status, content = self._get(reverse('api_lists'), fields='list_id')
+        self.assertEqual(content['entries'], [dict(list_id='bar.example.org')])
+        self.assertEqual(self.connection.calls, [])
+
+    def test_lists_payload_is_cached(self):
+        self.client.login(username='su', password='pwd')
+        first = self.client.get(reverse('api_lists'), {'count': 2})
+        second = self.client.get(reverse('api_lists'), {'count': 2})
+        self.assertEqual(first.content, second.content)
+        self.assertEqual(self.connection.calls, ['lists?count=2&page=1'])
+        utils.bump_cache_generation('lists')
+        self.client.get(reverse('api_lists'), {'count': 2})
+        self.assertEqual(len(self.connection.calls), 2)
+
+    def test_list_index_and_pages_are_cached_apart(self):
+        request = RequestFactory().get(reverse('api_lists'))
+        request.user = User.objects.get(username='les')
+        index = json.loads(api.api_list_index(request).content)
+        page = json.loads(api.api_lists(request).content)
+        self.assertTrue(isinstance(index, list))
+        self.assertEqual(page['total_size'], 2)
+
+    def test_lists_gzip(self):
+        self.client.login(username='su', password='pwd')
+        plain = self.client.get(reverse('api_lists'))
+        self.assertFalse(plain.has_header('Content-Encoding'))
+        self.assertTrue('Accept-Encoding' in plain['Vary'])
+        compressed = self.client.get(reverse('api_lists'),
+                                     HTTP_ACCEPT_ENCODING='gzip, deflate')
+        self.assertEqual(compressed['Content-Encoding'], 'gzip')
+        self.assertEqual(
+            gzip.GzipFile(fileobj=StringIO(compressed.content)).read(),
+            plain.content)
+        self.assertEqual(len(self.connection.calls), 1)
+
+    def test_lists_bad_paging(self):
+        self.client.login(username='les', password='pwd')
+        status, content = self._get(reverse('api_lists'), page='x')
+        self.assertEqual(status, 400)
+        self.assertTrue('error' in content)
+
+    def test_lists_anonymous_is_denied(self):
+        response = self.client.get(reverse('api_lists'))
+        self.assertEqual(response.status_code, 403)
+
+    def test_list_members(self):
+        self.client.login(username='su', password='pwd')
+        url = reverse('api_list_members', args=['foo.example.org'])
+        status, content = self._get(url, count=2, fields='email')
+        self.assertEqual(content['total_size'], 5)
+        self.assertEqual(content['entries'], [dict(email='les0@example.org'),
+                                              dict(email='les1@example.org')])
+        status, content = self._get(url, role='owner')
+        self.assertEqual([member['email'] for member in content['entries']],
+                         ['su@example.org'])
+        status, content = self._get(url, role='nobody')
+        self.assertEqual(status, 400)
+
+    def test_user_subscriptions(self):
+        self.client.login(username='les', password='pwd')
+        url = reverse('api_user_subscriptions', args=['42'])
+        status, content = self._get(url, fields='list_id,role')
+        self.assertEqual(status, 200)
+        self.assertEqual(content['entries'], [
+            dict(list_id='foo.example.org', role='member'),
+            dict(list_id='bar.example.org', role='owner')])
+        status, content = self._get(url, count=1, page=2)
+        self.assertEqual(content['total_size'], 2)
+        self.assertEqual(len(content['entries']), 1)
+
+    def test_user_subscriptions_follow_roster_changes(self):
+        self.client.login(username='les', password='pwd')
+        url = reverse('api_user_subscriptions', args=['42'])
+
+        def lookups():
+            return len([path for path in self.connection.calls
+                        if path.startswith('members/find')])
+        self._get(url)
+        self._get(url)
+        self.assertEqual(lookups(), 2)
+        utils.invalidate_list('foo.example.org')
+        self._get(url)
+        self.assertEqual(lookups(), 4)
+
+    def test_user_subscriptions_of_others_are_denied(self):
+        self.client.login(username='les', password='pwd')
+        response = self.client.get(
+            reverse('api_user_subscriptions', args=['1']))
+        self.assertEqual(response.status_code, 403)
+
+
+class RosterInvalidationTest(TestCase):
+    """Tests that the views changing rosters expire the cached rosters."""
+
+    def setUp(self):
+        cache.clear()
+        self.mailman = FakeMailman()
+        self.list_id = self.mailman.seed(lists=1, members_per_list=2)[0]
+        self.mailman.start()
+        self.addCleanup(self.mailman.stop)
+        test_settings = override_settings(**self.mailman.settings())
+        test_settings.enable()
+        self.addCleanup(test_settings.disable)
+        User.objects.create_superuser('su', 'su@example.org', 'pwd')
+        self.client = Client()
+        self.client.login(username='su', password='pwd')
+        self.url = reverse('api_list_members', args=[self.list_id])
+
+    def _emails(self):
+        content = json.loads(self.client.get(self.url).content)
+        return sorted(entry['email'] for entry in content['entries'])
+
+    def test_mass_subscription(self):
+        self.assertEqual(len(self._emails()), 2)
+        self.client.post(reverse('mass_subscribe', args=[self.list_id]),
+                         {'emails': 'new@example.org'})
+        self.assertTrue('new@example.org' in self._emails())
+
+    def test_mass_removal(self):
+        self.client.post(reverse('mass_removal', args=[self.list_id]),
+                         {'emails': 'user0@example.org'})
+        self.assertEqual(self._emails(), ['user1@example.org'])
+
+
+class ExportTest(TestCase):
+    """Tests for the streaming NDJSON exports."""
+
+    def setUp(self):
+        members = [dict(_member('foo.example.org', 'les%d@example.org' % i),
+                        member_id=i) for i in range(5)]
+        resources = {
+            'members': members,
+            'users': [dict(user_id=1, display_name='Les', password='secret')],
+        }
+        for i in range(5):
+            resources['members/%d/preferences' % i] = dict(
+                delivery_status='enabled', http_etag='"1"')
+        self.connection = FakeConnection(resources)
+        mm_client = MagicMock()
+        mm_client._connection = self.connection
+        patcher = patch.object(utils, 'get_client', return_value=mm_client)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        patcher = patch('postorius.views.api.API_EXPORT_PAGE_SIZE', 2)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        User.objects.create_superuser('su', 'su@example.org', 'pwd')
+        self.client = Client()
+        self.client.login(username='su', password='pwd')
+
+    def _export(self, name, **params):
+        response = self.client.get(reverse(name), params)
+        self.assertEqual(response['Content-Type'], 'application/x-ndjson')
+        return [json.loads(line) for line in
+                ''.join(response.streaming_content).splitlines()]
+
+    def test_members_resume_from_cursor(self):
+        records = self._export('api_export_members', cursor=3,
+                               fields='email')
+        self.assertEqual(records, [dict(email='les3@example.org'),
+                                   dict(email='les4@example.org')])
+        # The pages before the cursor are not fetched.
+        self.assertEqual(self.connection.calls, ['members?count=2&page=2',
+                                                 'members?count=2&page=3'])
+
+    def test_members_with_preferences(self):
+        records = self._export('api_export_members', preferences='1')
+        self.assertEqual(len(records), 5)
+        self.assertEqual(records[0]['role'], 'member')
+        self.assertEqual(records[0]['preferences'],
+                         dict(delivery_status='enabled'))
+
+    def test_users_without_password(self):
+        self.assertEqual(self._export('api_export_users'),
+                         [dict(user_id=1, display_name='Les')])
+
+    def test_error_line(self):
+        with patch.object(self.connection, 'call',
+                          side_effect=MailmanConnectionError):
+            records = self._export('api_export_lists')
+        self.assertEqual(records, [dict(error='Mailman API unavailable')])
+
+    def test_only_superusers(self):
+        self.client.logout()
+        response = self.client.get(reverse('api_export_users'))
+        self.assertEqual(response.status_code, 403)
+
+
+class BulkConnection(object):
+    """Records the membership changes of the bulk API."""
+
+    def __init__(self):
+        self.members = set([('foo.example.org', 'old@example.org')])
+        self.owners = set([('foo.example.org', 'les@example.org')])
+        self.posted = []
+
+    def call(self, path, data=None, method=None):
+        if path == 'lists/foo.example.org/roster/owner':
+            return None, dict(entries=[dict(email='les@example.org')])
+        if path.startswith('lists/'):
+            return None, dict(entries=[])
+        if path == 'members':
+            self.posted.append(data)
+            key = (data['list_id'], data['subscriber'])
+            if key in self.members:
+                raise HTTPError(path, 409, 'Member already subscribed',
+                                None, None)
+            self.members.add(key)
+            return None, None
+        if path == 'members/find':
+            key = (data['list_id'], data['subscriber'])
+            entries = [dict(role=role, self_link='members/%s/%s' % key)
+                       for role, rows in (('owner', self.owners),
+                                          ('member', self.members))
+                       if key in rows]
+            if not entries:
+                return None, dict(total_size=0)
+            return None, dict(entries=entries)
+        if method == 'DELETE':
+            self.members.remove(tuple(path.split('/')[1:]))
+            return None, None
+        raise AssertionError(path)
+
+
+class BulkMembershipsTest(TestCase):
+    """Tests for the bulk membership API."""
+
+    def setUp(self):
+        cache.clear()
+        self.connection = BulkConnection()
+        mm_client = MagicMock()
+        mm_client._connection = self.connection
+        patcher = patch.object(utils, 'get_client', return_value=mm_client)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        User.objects.create_user('les', 'les@example.org', 'pwd')
+        self.client = Client()
+        self.client.login(username='les', password='pwd')
+
+    def _post(self, operations, **headers):
+        response = self.client.post(
+            reverse('api_bulk_memberships'),
+            json.dumps(dict(operations=operations)),
+            content_type='application/json', **headers)
+        return response.status_code, json.loads(response.content)
+
+    def test_per_item_results(self):
+        status, content = self._post([
+            dict(list_id='foo.example.org', address='new@example.org',
+                 action='subscribe', options=dict(pre_verified=True,
+                                                  ignored=True)),
+            dict(list_id='foo.example.org', address='old@example.org',
+                 action='subscribe'),
+            dict(list_id='foo.example.org', address='old@example.org',
+                 action='unsubscribe'),
+            dict(list_id='bar.example.org', address='new@example.org',
+                 action='subscribe'),
+            dict(list_id='foo.example.org', action='subscribe'),
+            dict(list_id='foo.example.org', address=['new@example.org'],
+                 action='subscribe'),
+        ])
+        self.assertEqual(status, 200)
+        self.assertEqual([r['status'] for r in content['results']],
+                         ['subscribed', 'unchanged', 'unsubscribed',
+                          'error', 'error', 'error'])
+        self.assertEqual(content['results'][3]['code'], 403)
+        self.assertEqual(content['results'][4]['code'], 400)
+        self.assertEqual(content['results'][5]['code'], 400)
+        self.assertEqual(content['summary']['error'], 3)
+        posted = dict((data['subscriber'], data)
+                      for data in self.connection.posted)
+        self.assertEqual(posted['new@example.org']['pre_verified'], True)
+        self.assertFalse('ignored' in posted['new@example.org'])
+
+    def test_unsubscribe_owner_only(self):
+        status, content = self._post([
+            dict(list_id='foo.example.org', address='les@example.org',
+                 action='unsubscribe')])
+        self.assertEqual(content['results'][0]['status'], 'unchanged')
+        self.assertTrue(('foo.example.org', 'les@example.org')
+                        in self.connection.owners)
+
+    def test_owner_lookup_without_mailman(self):
+        with patch.object(self.connection, 'call',
+                          side_effect=MailmanConnectionError):
+            status, content = self._post([
+                dict(list_id='foo.example.org', address='new@example.org',
+                     action='subscribe')])
+        self.assertEqual(status, 503)
+        self.assertTrue('error' in content)
+
+    def test_crashed_request_does_not_block_key(self):
+        operations = [dict(list_id='foo.example.org',
+                           address='new@example.org', action='subscribe')]
+        # A worker that dies while running leaves the marker behind.
+        with patch('postorius.views.api.API_IDEMPOTENCY_RUNNING_TIMEOUT', 0):
+            with patch('postorius.views.api._bulk_memberships',
+                       side_effect=KeyboardInterrupt):
+                with patch.object(api.cache, 'delete'):
+                    with self.assertRaises(KeyboardInterrupt):
+                        self._post(operations, HTTP_IDEMPOTENCY_KEY='abc')
+        status, content = self._post(operations, HTTP_IDEMPOTENCY_KEY='abc')
+        self.assertEqual(status, 200)
+
+    def test_csrf(self):
+        client = Client(enforce_csrf_checks=True)
+        client.login(username='les', password='pwd')
+        # Sessions need a CSRF token, browsers send them across sites.
+        response = client.post(reverse('api_bulk_memberships'),
+                               json.dumps(dict(operations=[])),
+                               content_type='application/json')
+        self.assertEqual(response.status_code, 403)
+        # API credentials don't.
+        response = Client(enforce_csrf_checks=True).post(
+            reverse('api_bulk_memberships'),
+            json.dumps(dict(operations=[])), content_type='application/json',
+            HTTP_AUTHORIZATION='Basic ' + 'les:pwd'.encode('base64').strip())
+        self.assertEqual(response.status_code, 200)
+
+    def test_json_only(self):
+        response = self.client.post(reverse('api_bulk_memberships'),
+                                    dict(operations='[]'))
+        self.assertEqual(response.status_code, 415)
+
+    def test_idempotency_key(self):
+        operations = [dict(list_id='foo.example.org',
+                           address='new@example.org', action='subscribe')]
+        first = self._post(operations, HTTP_IDEMPOTENCY_KEY='abc')
+        second = self._post(operations, HTTP_IDEMPOTENCY_KEY='abc')
+        self.assertEqual(first, second)
+        self.assertEqual(len(self.connection.posted), 1)
+        self.assertEqual(first[1]['results'][0]['status'], 'subscribed')
+
+    def test_invalid_body(self):
+        response = self.client.post(reverse('api_bulk_memberships'), 'nope',
+                                    content_type='application/json')
+        self.assertEqual(response.status_code, 400)
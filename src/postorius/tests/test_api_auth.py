@@ -0,0 +1,88 @@
+# -*- coding: utf-8 -*-
+# Copyright (C) 2012-2015 by the Free Software Foundation, Inc.
+#
+# This file is part of Postorius.
+#
+# Postorius is free software: you can redistribute it and/or modify it under
+# the terms of the GNU General Public License as published by the Free
+# Software Foundation, either version 3 of the License, or (at your option)
+# any later version.
+# Postorius is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or
+# FITNESS FOR A PARTICULAR PURPOSE.  See the GNU General Public License for
+# more details.
+#
+# You should have received a copy of the GNU General Public License along with
+# Postorius.  If not, see <http://www.gnu.org/licenses/>.
+
+import json
+
+from django.contrib.auth.models import User
+from django.contrib.sessions.models import Session
+from django.core.urlresolvers import reverse
+from django.test import Client, TestCase
+from mock import patch
+
+from postorius.auth import decorators
+
+
+class ApiAuthTest(TestCase):
+    """Tests the stateless authentication of API requests."""
+
+    def setUp(self):
+        decorators._verified_credentials.clear()
+        self.user = User.objects.create_user('les', 'les@example.org', 'pwd')
+        self.client = Client()
+        self.url = reverse('api_token')
+
+    def _get(self, authorization):
+        return self.client.get(self.url, HTTP_AUTHORIZATION=authorization)
+
+    def test_basic_auth_without_session(self):
+        credentials = 'Basic ' + 'les:pwd'.encode('base64').strip()
+        with patch.object(decorators, 'authenticate',
+                          wraps=decorators.authenticate) as mock_authenticate:
+            self.assertEqual(self._get(credentials).status_code, 200)
+            self.assertEqual(self._get(credentials).status_code, 200)
+        # The password was only checked once and no session was stored.
+        self.assertEqual(mock_authenticate.call_count, 1)
+        self.assertEqual(Session.objects.count(), 0)
+        self.assertFalse('pwd' in repr(decorators._verified_credentials))
+
+    def test_wrong_password(self):
+        response = self._get('Basic ' + 'les:nope'.encode('base64').strip())
+        self.assertEqual(response.status_code, 403)
+        response = self._get('Basic garbage')
+        self.assertEqual(response.status_code, 403)
+
+    def test_inactive_user_is_rejected_from_cache(self):
+        credentials = 'Basic ' + 'les:pwd'.encode('base64').strip()
+        self._get(credentials)
+        User.objects.filter(pk=self.user.pk).update(is_active=False)
+        self.assertEqual(self._get(credentials).status_code, 403)
+
+    def test_password_change_is_rejected_from_cache(self):
+        credentials = 'Basic ' + 'les:pwd'.encode('base64').strip()
+        self.assertEqual(self._get(credentials).status_code, 200)
+        self.user.set_password('new')
+        self.user.save()
+        self.assertEqual(self._get(credentials).status_code, 403)
+        self.assertEqual(self._get(
+            'Basic ' + 'les:new'.encode('base64').strip()).status_code, 200)
+
+    def test_token(self):
+        token = decorators.make_api_token(self.user)
+        response = self._get('Token ' + token)
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(json.loads(response.content)['token'])
+        self.assertEqual(self._get('Token ' + token + 'x').status_code, 403)
+        with patch.object(decorators, 'API_TOKEN_MAX_AGE', -1):
+            self.assertEqual(self._get('Token ' + token).status_code, 403)
+
+    def test_password_change_revokes_tokens(self):
+        token = decorators.make_api_token(self.user)
+        self.user.set_password('new')
+        self.user.save()
+        self.assertEqual(self._get('Token ' + token).status_code, 403)
+        token = decorators.make_api_token(self.user)
+        self.assertEqual(self._get('Token ' + token).status_code, 200)
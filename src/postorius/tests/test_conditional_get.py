@@ -0,0 +1,94 @@
+# -*- coding: utf-8 -*-
+# Copyright (C) 2012-2015 by the Free Software Foundation, Inc.
+#
+# This file is part of Postorius.
+#
+# Postorius is free software: you can redistribute it and/or modify it under
+# the terms of the GNU General Public License as published by the Free
+# Software Foundation, either version 3 of the License, or (at your option)
+# any later version.
+# Postorius is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or
+# FITNESS FOR A PARTICULAR PURPOSE.  See the GNU General Public License for
+# more details.
+#
+# You should have received a copy of the GNU General Public License along with
+# Postorius.  If not, see <http://www.gnu.org/licenses/>.
+
+from django.contrib.auth.models import User
+from django.core.urlresolvers import reverse
+from django.test import Client, TestCase
+from mock import patch
+
+from postorius import utils
+from postorius.models import Domain, List, MailmanApiError
+
+
+class ConditionalGetTest(TestCase):
+    """Tests ETag handling of the read-mostly pages."""
+
+    def setUp(self):
+        User.objects.create_superuser('su', 'su@example.org', 'pwd')
+        self.client = Client()
+        self.client.login(username='su', password='pwd')
+        patchers = [
+            patch.object(List.objects, 'all', return_value=[]),
+            patch.object(Domain.objects, 'all', return_value=[]),
+        ]
+        for patcher in patchers:
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def test_list_index_not_modified(self):
+        response = self.client.get(reverse('list_index'))
+        self.assertEqual(response.status_code, 200)
+        response = self.client.get(reverse('list_index'),
+                                   HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(response.status_code, 304)
+        # The ETag is built without asking Mailman.
+        self.assertEqual(List.objects.all.call_count, 1)
+
+    def test_list_index_invalidated(self):
+        # Changes made through Postorius produce a new ETag.
+        etag = self.client.get(reverse('list_index'))['ETag']
+        utils.bump_cache_generation('lists')
+        response = self.client.get(reverse('list_index'),
+                                   HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+
+    def test_etag_depends_on_user(self):
+        etag = self.client.get(reverse('list_index'))['ETag']
+        self.client.logout()
+        response = self.client.get(reverse('list_index'),
+                                   HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+
+    def test_domain_index_not_modified(self):
+        response = self.client.get(reverse('domain_index'))
+        self.assertEqual(response.status_code, 200)
+        response = self.client.get(reverse('domain_index'),
+                                   HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(response.status_code, 304)
+
+    def test_domain_index_invalidated(self):
+        etag = self.client.get(reverse('domain_index'))['ETag']
+        utils.bump_cache_generation('domains')
+        response = self.client.get(reverse('domain_index'),
+                                   HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+
+    def test_error_pages_have_no_etag(self):
+        with patch.object(Domain.objects, 'all',
+                          side_effect=MailmanApiError):
+            response = self.client.get(reverse('domain_index'))
+        self.assertEqual(response.status_code, 503)
+        self.assertFalse(response.has_header('ETag'))
+
+    def test_etag_depends_on_csrf_token(self):
+        etag = self.client.get(reverse('list_index'))['ETag']
+        # The CSRF token embedded in the forms changes, e.g. on login.
+        self.client.cookies['csrftoken'] = 'a' * 32
+        response = self.client.get(reverse('list_index'),
+                                   HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
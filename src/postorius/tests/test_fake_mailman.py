@@ -0,0 +1,114 @@
+# -*- coding: utf-8 -*-
+# Copyright (C) 2012-2015 by the Free Software Foundation, Inc.
+#
+# This file is part of Postorius.
+#
+# Postorius is free software: you can redistribute it and/or modify it under
+# the terms of the GNU General Public License as published by the Free
+# Software Foundation, either version 3 of the License, or (at your option)
+# any later version.
+# Postorius is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or
+# FITNESS FOR A PARTICULAR PURPOSE.  See the GNU General Public License for
+# more details.
+#
+# You should have received a copy of the GNU General Public License along with
+# Postorius.  If not, see <http://www.gnu.org/licenses/>.
+
+
+import threading
+
+from urllib2 import HTTPError
+
+from django.test import TestCase
+from django.test.utils import override_settings
+from mock import patch
+
+from postorius.tests.fake_mailman import FakeMailman
+from postorius.utils import get_client
+
+
+class FakeMailmanTest(TestCase):
+    """Tests mailmanclient against the fake Mailman server."""
+
+    def setUp(self):
+        self.mailman = FakeMailman()
+        self.list_ids = self.mailman.seed(lists=3, members_per_list=5,
+                                          held_per_list=2,
+                                          requests_per_list=1)
+        self.mailman.start()
+        self.addCleanup(self.mailman.stop)
+        settings = override_settings(**self.mailman.settings())
+        settings.enable()
+        self.addCleanup(settings.disable)
+        self.client = get_client()
+
+    def test_lists(self):
+        self.assertEqual([mlist.list_id for mlist in self.client.lists],
+                         self.list_ids)
+        page = self.client.get_list_page(count=2, page=2)
+        self.assertEqual([mlist.list_id for mlist in page],
+                         [self.list_ids[2]])
+        mlist = self.client.get_list('list0@example0.org')
+        self.assertEqual(mlist.settings['subject_prefix'], '[List0] ')
+        self.assertEqual(len(mlist.members), 5)
+        self.assertEqual(len(mlist.owners), 1)
+
+    def test_subscribe_and_find(self):
+        mlist = self.client.get_list(self.list_ids[0])
+        mlist.settings['subscription_policy'] = 'open'
+        mlist.settings.save()
+        mlist.subscribe('new@example.org', pre_verified=True,
+                        pre_confirmed=True)
+        member = mlist.get_member('new@example.org')
+        self.assertEqual(member.list_id, self.list_ids[0])
+        self.assertEqual(member.preferences['delivery_mode'], 'regular')
+        subscriptions = self.client.get_user('new@example.org').subscriptions
+        self.assertEqual([m.list_id for m in subscriptions],
+                         [self.list_ids[0]])
+        mlist.unsubscribe('new@example.org')
+        self.assertEqual(len(mlist.members), 5)
+
+    def test_held_messages_and_requests(self):
+        mlist = self.client.get_list(self.list_ids[0])
+        held = mlist.held
+        self.assertEqual(len(held), 2)
+        mlist.discard_message(held[0]['request_id'])
+        self.assertEqual(len(mlist.held), 1)
+        request = mlist.requests[0]
+        mlist.moderate_request(request['token'], 'accept')
+        self.assertEqual(len(mlist.members), 6)
+
+    def test_users(self):
+        user = self.client.get_user('user0@example.org')
+        self.assertEqual([str(a) for a in user.addresses],
+                         ['user0@example.org'])
+        self.assertEqual(len(user.subscriptions), 3)
+        with self.assertRaises(HTTPError):
+            self.client.get_user('nobody@example.org')
+
+    def test_latency_and_log(self):
+        self.mailman.latency = 0.01
+        self.mailman.reset_log()
+        self.client.get_list(self.list_ids[0])
+        self.assertEqual([entry[:3] for entry in self.mailman.request_log],
+                         [('GET', 'lists/' + self.list_ids[0], 200)])
+        self.assertTrue(self.mailman.request_log[0][3] >= 0.01)
+
+    def test_pages_build_only_their_entries(self):
+        mlist = self.client.get_list(self.list_ids[0])
+        with patch.object(self.mailman, '_member_entry',
+                          wraps=self.mailman._member_entry) as mock_entry:
+            page = mlist.get_member_page(count=2, page=2)
+            self.assertEqual(len(page), 2)
+        self.assertEqual(mock_entry.call_count, 2)
+
+    def test_reads_run_concurrently(self):
+        # A read in progress doesn't hold up other reads.
+        with self.mailman._lock.reading():
+            thread = threading.Thread(
+                target=self.client.get_list, args=(self.list_ids[0],))
+            thread.daemon = True
+            thread.start()
+            thread.join(5)
+            self.assertFalse(thread.is_alive())
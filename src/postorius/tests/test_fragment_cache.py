@@ -0,0 +1,93 @@
+# -*- coding: utf-8 -*-
+# Copyright (C) 2012-2015 by the Free Software Foundation, Inc.
+#
+# This file is part of Postorius.
+#
+# Postorius is free software: you can redistribute it and/or modify it under
+# the terms of the GNU General Public License as published by the Free
+# Software Foundation, either version 3 of the License, or (at your option)
+# any later version.
+# Postorius is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or
+# FITNESS FOR A PARTICULAR PURPOSE.  See the GNU General Public License for
+# more details.
+#
+# You should have received a copy of the GNU General Public License along with
+# Postorius.  If not, see <http://www.gnu.org/licenses/>.
+
+from django.contrib.auth.models import AnonymousUser, User
+from django.core.cache import cache
+from django.core.urlresolvers import reverse
+from django.template import Context, Template
+from django.test import Client, TestCase
+from django.test.client import RequestFactory
+from django.test.utils import override_settings
+
+from postorius import utils
+from postorius.tests.fake_mailman import FakeMailman
+
+
+class FakeList(object):
+    # Mock objects are not usable in templates, since the template engine
+    # tries a dictionary lookup first.
+    fqdn_listname = 'foo@example.org'
+    list_id = 'foo.example.org'
+
+
+class ListNavCacheTest(TestCase):
+    """Tests the fragment caching of the list navigation."""
+
+    def setUp(self):
+        cache.clear()
+        self.mock_list = FakeList()
+        self.template = Template(
+            "{% load nav_helpers %}{% list_nav 'list_summary' 'Info' %}")
+
+    def _render(self, user):
+        request = RequestFactory().get('/')
+        request.user = user
+        return self.template.render(Context({'list': self.mock_list,
+                                             'request': request}))
+
+    def test_navigation_depends_on_role_tier(self):
+        superuser = User.objects.create_superuser('su', 'su@example.org',
+                                                  'pwd')
+        admin_nav = self._render(superuser)
+        self.assertTrue('Delete List' in admin_nav)
+        member_nav = self._render(User.objects.create_user(
+            'les', 'les@example.org', 'pwd'))
+        self.assertFalse('Delete List' in member_nav)
+        self.assertFalse('mm_nav_item' in self._render(AnonymousUser()))
+
+    def test_navigation_is_cached_until_invalidated(self):
+        user = User.objects.create_user('les', 'les@example.org', 'pwd')
+        self._render(user)
+        self.mock_list.fqdn_listname = 'renamed@example.org'
+        self.assertTrue('foo@example.org' in self._render(user))
+        utils.invalidate_list('foo.example.org')
+        self.assertTrue('renamed@example.org' in self._render(user))
+
+
+class ListSummaryHeaderCacheTest(TestCase):
+    """Tests the fragment caching of the list info header."""
+
+    def setUp(self):
+        cache.clear()
+        self.mailman = FakeMailman()
+        self.list_id = self.mailman.seed(lists=1, members_per_list=1)[0]
+        self.mailman.start()
+        self.addCleanup(self.mailman.stop)
+        test_settings = override_settings(**self.mailman.settings())
+        test_settings.enable()
+        self.addCleanup(test_settings.disable)
+        User.objects.create_user('user0', 'user0@example.org', 'pwd')
+        self.client = Client()
+        self.client.login(username='user0', password='pwd')
+
+    def test_subscriptions_view_passes_generation(self):
+        response = self.client.post(
+            reverse('list_subscriptions', args=[self.list_id]),
+            {'name': 'unsubscribe', 'email': 'user0@example.org'})
+        self.assertEqual(
+            response.context['list_generation'],
+            utils.get_cache_generation('list:{0}'.format(self.list_id)))
@@ -0,0 +1,110 @@
+# -*- coding: utf-8 -*-
+# Copyright (C) 2012-2015 by the Free Software Foundation, Inc.
+#
+# This file is part of Postorius.
+#
+# Postorius is free software: you can redistribute it and/or modify it under
+# the terms of the GNU General Public License as published by the Free
+# Software Foundation, either version 3 of the License, or (at your option)
+# any later version.
+# Postorius is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or
+# FITNESS FOR A PARTICULAR PURPOSE.  See the GNU General Public License for
+# more details.
+#
+# You should have received a copy of the GNU General Public License along with
+# Postorius.  If not, see <http://www.gnu.org/licenses/>.
+
+import json
+
+from django.contrib.auth.models import User
+from django.core.urlresolvers import reverse
+from django.test import Client, TestCase
+from mailmanclient import Client as MailmanClient
+from mock import patch
+
+from postorius.models import MailmanApiError
+from postorius.tests.utils import create_mock_list
+
+
+def _held_message(request_id):
+    return dict(request_id=request_id, subject='Subject %d' % request_id,
+                sender='les@example.org', reason='Moderation',
+                hold_date='2015-01-01T00:00:00', msg='Message body')
+
+
+class HeldMessagesPollTest(TestCase):
+    """Tests for the incremental held messages endpoint."""
+
+    def setUp(self):
+        self.mock_list = create_mock_list(dict(
+            fqdn_listname='foo@example.org',
+            list_id='foo.example.org',
+            held=[_held_message(1), _held_message(2)],
+            moderators=['mod@example.org'], owners=[]))
+        User.objects.create_superuser('su', 'su@example.org', 'pwd')
+        self.client = Client()
+        self.client.login(username='su', password='pwd')
+        self.url = reverse('list_held_messages_poll',
+                           args=['foo.example.org'])
+
+    def _poll(self, cursor=None, **headers):
+        data = {}
+        if cursor is not None:
+            data['cursor'] = cursor
+        with patch.object(MailmanClient, 'get_list') as mock_get_list:
+            mock_get_list.return_value = self.mock_list
+            response = self.client.get(self.url, data, **headers)
+        self.get_list_calls = mock_get_list.call_count
+        return response
+
+    def test_without_cursor_returns_everything(self):
+        response = self._poll()
+        self.assertEqual(response.status_code, 200)
+        content = json.loads(response.content)
+        self.assertTrue(content['reset'])
+        self.assertEqual([msg['request_id'] for msg in content['added']],
+                         [1, 2])
+        self.assertEqual(response['ETag'], '"%s"' % content['cursor'])
+
+    def test_changes_since_cursor(self):
+        cursor = json.loads(self._poll().content)['cursor']
+        self.mock_list.held = [_held_message(2), _held_message(3)]
+        content = json.loads(self._poll(cursor).content)
+        self.assertFalse(content['reset'])
+        self.assertEqual([msg['request_id'] for msg in content['added']], [3])
+        self.assertEqual(content['removed'], [1])
+        self.assertEqual(content['count'], 2)
+
+    def test_added_rows_are_rendered(self):
+        cursor = json.loads(self._poll().content)['cursor']
+        self.mock_list.held = [_held_message(2), _held_message(3)]
+        html = json.loads(self._poll(cursor).content)['added'][0]['html']
+        self.assertTrue('data-request-id="3"' in html)
+        self.assertTrue('data-target="#msg-3"' in html)
+        self.assertTrue('Message body' in html)
+
+    def test_api_error(self):
+        with patch.object(MailmanClient, 'get_list') as mock_get_list:
+            mock_get_list.side_effect = MailmanApiError
+            response = self.client.get(self.url)
+        self.assertEqual(response.status_code, 503)
+        self.assertEqual(response['Content-Type'], 'application/json')
+        self.assertTrue('error' in json.loads(response.content))
+
+    def test_unchanged_queue_is_not_modified(self):
+        response = self._poll()
+        response = self._poll(json.loads(response.content)['cursor'],
+                              HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(response.status_code, 304)
+
+    def test_list_is_looked_up_once(self):
+        User.objects.create_user('mod', 'mod@example.org', 'pwd')
+        self.client.login(username='mod', password='pwd')
+        self.assertEqual(self._poll().status_code, 200)
+        self.assertEqual(self.get_list_calls, 1)
+
+    def test_anonymous_is_denied(self):
+        self.client.logout()
+        response = self._poll()
+        self.assertEqual(response.status_code, 403)
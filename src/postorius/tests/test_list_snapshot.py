@@ -0,0 +1,195 @@
+# -*- coding: utf-8 -*-
+# Copyright (C) 2012-2015 by the Free Software Foundation, Inc.
+#
+# This file is part of Postorius.
+#
+# Postorius is free software: you can redistribute it and/or modify it under
+# the terms of the GNU General Public License as published by the Free
+# Software Foundation, either version 3 of the License, or (at your option)
+# any later version.
+# Postorius is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or
+# FITNESS FOR A PARTICULAR PURPOSE.  See the GNU General Public License for
+# more details.
+#
+# You should have received a copy of the GNU General Public License along with
+# Postorius.  If not, see <http://www.gnu.org/licenses/>.
+
+from datetime import datetime, timedelta
+
+from django.core.urlresolvers import reverse
+from django.test import Client, TestCase
+from django.test.utils import override_settings
+from mock import patch, MagicMock
+from urllib2 import HTTPError
+
+from postorius import models
+from postorius.models import List, ListSnapshot, MailmanApiError
+from postorius.tests.fake_connection import FakeConnection
+
+
+def _list_entry(name):
+    return dict(list_id='{0}.example.org'.format(name),
+                fqdn_listname='{0}@example.org'.format(name),
+                list_name=name, mail_host='example.org',
+                display_name=name.capitalize(), member_count=3)
+
+
+def _resources(entries, advertised=()):
+    resources = {'lists': entries}
+    for entry in entries:
+        resources['lists/{0}/config'.format(entry['list_id'])] = dict(
+            description='About ' + entry['list_id'],
+            advertised=entry['list_id'] in advertised)
+    return resources
+
+
+class ListSnapshotTest(TestCase):
+    """Tests for the list index snapshot."""
+
+    def _refresh(self, connection):
+        client = MagicMock()
+        client._connection = connection
+        with patch.object(models, 'get_client', return_value=client):
+            ListSnapshot.objects.refresh(page_size=2)
+
+    def test_refresh_walks_all_pages(self):
+        self._refresh(FakeConnection(_resources(
+            [_list_entry('bar'), _list_entry('baz'), _list_entry('foo')],
+            advertised=('foo.example.org',))))
+        self.assertEqual(ListSnapshot.objects.count(), 3)
+        foo = ListSnapshot.objects.get(list_id='foo.example.org')
+        self.assertEqual(foo.display_name, 'Foo')
+        self.assertEqual(foo.settings, {'advertised': True,
+                                        'description': 'About foo.example.org'})
+        self.assertEqual(
+            [s.list_id for s in ListSnapshot.objects.visible(True)],
+            ['foo.example.org'])
+
+    def test_refresh_removes_deleted_lists(self):
+        self._refresh(FakeConnection(_resources([_list_entry('bar'),
+                                                 _list_entry('foo')])))
+        self._refresh(FakeConnection(_resources([_list_entry('foo')])))
+        self.assertEqual([s.list_id for s in ListSnapshot.objects.all()],
+                         ['foo.example.org'])
+
+    def test_refresh_skips_lists_deleted_meanwhile(self):
+        resources = _resources([_list_entry('bar'), _list_entry('foo')])
+        self._refresh(FakeConnection(dict(resources)))
+        del resources['lists/bar.example.org/config']
+        self._refresh(FakeConnection(resources))
+        self.assertEqual([s.list_id for s in ListSnapshot.objects.all()],
+                         ['foo.example.org'])
+
+    def test_failed_refresh_keeps_snapshots(self):
+        connection = FakeConnection(_resources([_list_entry('bar'),
+                                                _list_entry('foo')]))
+        self._refresh(connection)
+        call = connection.call
+
+        def failing_call(path):
+            if path == 'lists/foo.example.org/config':
+                raise HTTPError(path, 500, 'Internal Server Error', {}, None)
+            return call(path)
+        connection.call = failing_call
+        with self.assertRaises(MailmanApiError):
+            self._refresh(connection)
+        self.assertEqual(ListSnapshot.objects.count(), 2)
+
+    def test_staleness(self):
+        self.assertTrue(ListSnapshot.objects.is_stale())
+        self._refresh(FakeConnection(_resources([_list_entry('foo')])))
+        self.assertFalse(ListSnapshot.objects.is_stale())
+        ListSnapshot.objects.update(
+            updated=datetime.now() - timedelta(hours=1))
+        self.assertTrue(ListSnapshot.objects.is_stale())
+
+    @override_settings(LIST_INDEX_SNAPSHOT=True)
+    def test_list_index_uses_snapshot(self):
+        self._refresh(FakeConnection(_resources(
+            [_list_entry('bar'), _list_entry('foo')],
+            advertised=('foo.example.org',))))
+        with patch.object(List.objects, 'all') as mock_all:
+            response = Client().get(reverse('list_index'))
+        self.assertFalse(mock_all.called)
+        self.assertEqual([s.list_id for s in response.context['lists']],
+                         ['foo.example.org'])
+        self.assertFalse(response.context['snapshot_stale'])
+
+    @override_settings(LIST_INDEX_SNAPSHOT=True)
+    def test_list_index_without_snapshot(self):
+        response = Client().get(reverse('list_index'))
+        self.assertTrue(response.context['snapshot_missing'])
+        self.assertContains(response, 'has not been built yet')
+        self.assertNotContains(response, 'There are currently no mailing')
+
+
+class ListSearchTest(TestCase):
+    """Tests for the list search index."""
+
+    def setUp(self):
+        entries = [_list_entry('foo'), _list_entry('foo-dev'),
+                   _list_entry('bar')]
+        entries[2]['display_name'] = 'Bar Food'
+        client = MagicMock()
+        client._connection = FakeConnection(_resources(
+            entries, advertised=('foo.example.org', 'bar.example.org')))
+        with patch.object(models, 'get_client', return_value=client):
+            ListSnapshot.objects.refresh(page_size=2)
+
+    def _search(self, query, only_public=False):
+        return [s.list_id for s in
+                ListSnapshot.objects.search(query, only_public=only_public)]
+
+    def test_exact_matches_rank_first(self):
+        self.assertEqual(self._search('foo'), [
+            'foo-dev.example.org', 'foo.example.org', 'bar.example.org'])
+
+    def test_all_words_must_match(self):
+        self.assertEqual(self._search('foo dev'), ['foo-dev.example.org'])
+        self.assertEqual(self._search('about bar'), ['bar.example.org'])
+        self.assertEqual(self._search('foo nothing'), [])
+        self.assertEqual(self._search(' '), [])
+
+    def test_short_terms_match_whole_words(self):
+        self.assertEqual(self._search('fo'), [])
+        with self.settings(LIST_SEARCH_MIN_PREFIX=2):
+            self.assertEqual(self._search('fo dev'), ['foo-dev.example.org'])
+
+    def test_long_terms_are_truncated(self):
+        models.ListSearchToken.objects.filter(token='food').update(
+            token='f' * 100)
+        self.assertEqual(self._search('f' * 150), ['bar.example.org'])
+
+    def test_results_are_paged(self):
+        results = ListSnapshot.objects.search('foo')
+        self.assertEqual(len(results), 3)
+        with self.assertNumQueries(1):
+            page = results[1:2]
+        self.assertEqual([s.list_id for s in page], ['foo.example.org'])
+
+    def test_only_public(self):
+        self.assertEqual(self._search('foo', only_public=True),
+                         ['foo.example.org', 'bar.example.org'])
+
+    def test_index_follows_refresh(self):
+        self.assertEqual(models.ListSearchToken.objects.filter(
+            snapshot__list_id='foo.example.org', token='foo').count(), 1)
+        ListSnapshot.objects.get(list_id='bar.example.org').delete()
+        self.assertEqual(self._search('food'), [])
+
+    def test_list_index_search(self):
+        with patch.object(List.objects, 'all') as mock_all:
+            response = Client().get(reverse('list_index'), {'q': 'foo'})
+        self.assertFalse(mock_all.called)
+        self.assertTrue(response.context['search_enabled'])
+        self.assertEqual([s.list_id for s in response.context['lists']],
+                         ['foo.example.org', 'bar.example.org'])
+
+    def test_list_index_search_pages(self):
+        with self.settings(LIST_SEARCH_PAGE_SIZE=1):
+            response = Client().get(reverse('list_index'),
+                                    {'q': 'foo', 'page': 2})
+        self.assertEqual([s.list_id for s in response.context['lists']],
+                         ['bar.example.org'])
+        self.assertEqual(response.context['search_page'].paginator.count, 2)
@@ -0,0 +1,128 @@
+# -*- coding: utf-8 -*-
+# Copyright (C) 2012-2015 by the Free Software Foundation, Inc.
+#
+# This file is part of Postorius.
+#
+# Postorius is free software: you can redistribute it and/or modify it under
+# the terms of the GNU General Public License as published by the Free
+# Software Foundation, either version 3 of the License, or (at your option)
+# any later version.
+# Postorius is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or
+# FITNESS FOR A PARTICULAR PURPOSE.  See the GNU General Public License for
+# more details.
+#
+# You should have received a copy of the GNU General Public License along with
+# Postorius.  If not, see <http://www.gnu.org/licenses/>.
+
+
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.core.urlresolvers import reverse
+from django.test import Client, TestCase
+from django.test.utils import override_settings
+
+from postorius import utils
+from postorius.utils import get_client
+from postorius.tests.fake_mailman import FakeMailman
+
+
+class ListTabsTest(TestCase):
+    """Tests loading the list tabs via AJAX."""
+
+    def setUp(self):
+        cache.clear()
+        self.mailman = FakeMailman()
+        self.list_id = self.mailman.seed(lists=1, members_per_list=2,
+                                         held_per_list=1)[0]
+        self.mailman.start()
+        self.addCleanup(self.mailman.stop)
+        test_settings = override_settings(**self.mailman.settings())
+        test_settings.enable()
+        self.addCleanup(test_settings.disable)
+        User.objects.create_user('owner', 'owner0@example.org', 'pwd')
+        self.client = Client()
+        self.client.login(username='owner', password='pwd')
+
+    def _get(self, view, ajax=True):
+        self.mailman.reset_log()
+        extra = {'HTTP_X_REQUESTED_WITH': 'XMLHttpRequest'} if ajax else {}
+        response = self.client.get(reverse(view, args=[self.list_id]),
+                                   **extra)
+        self.assertEqual(response.status_code, 200)
+        return response, [path for method, path, status, duration
+                          in self.mailman.request_log]
+
+    def test_partial_page(self):
+        response, calls = self._get('list_held_messages')
+        self.assertContains(response, 'mm_subHeader')
+        self.assertContains(response, 'held_messages.js')
+        self.assertNotContains(response, '<html')
+        self.assertNotContains(response, 'list_tabs.js')
+        response, calls = self._get('list_held_messages', ajax=False)
+        self.assertContains(response, '<html')
+        self.assertContains(response, 'list_tabs.js')
+
+    def test_list_reused_across_tabs(self):
+        response, calls = self._get('list_summary', ajax=False)
+        roster = 'lists/{0}/roster/owner'.format(self.list_id)
+        self.assertEqual(calls.count(roster), 1)
+        response, calls = self._get('list_held_messages')
+        self.assertEqual(calls, ['lists/{0}'.format(self.list_id),
+                                 'lists/list0@example0.org/held'])
+        self.assertTrue(response.context['user'].is_list_owner)
+        response, calls = self._get('list_settings')
+        self.assertNotIn(roster, calls)
+
+    def test_full_page_loads_check_roles(self):
+        self._get('list_summary', ajax=False)
+        response, calls = self._get('list_summary', ajax=False)
+        self.assertIn('lists/{0}/roster/owner'.format(self.list_id),
+                      calls)
+
+    def test_changed_list_is_fetched_again(self):
+        self._get('list_summary', ajax=False)
+        utils.invalidate_list(self.list_id)
+        response, calls = self._get('list_held_messages')
+        self.assertIn('lists/{0}/roster/owner'.format(self.list_id),
+                      calls)
+
+    def test_no_access_for_other_users(self):
+        self._get('list_summary', ajax=False)
+        User.objects.create_user('les', 'les@example.org', 'pwd')
+        client = Client()
+        client.login(username='les', password='pwd')
+        response = client.get(
+            reverse('list_held_messages', args=[self.list_id]),
+            HTTP_X_REQUESTED_WITH='XMLHttpRequest')
+        self.assertEqual(response.status_code, 403)
+
+    def test_removed_owner_loses_access(self):
+        self._get('list_summary', ajax=False)
+        User.objects.create_superuser('su', 'su@example.org', 'pwd')
+        client = Client()
+        client.login(username='su', password='pwd')
+        response = client.post(reverse('remove_role', kwargs=dict(
+            list_id=self.list_id, role='owner',
+            address='owner0@example.org')))
+        self.assertEqual(response.status_code, 302)
+        response = self.client.get(
+            reverse('list_held_messages', args=[self.list_id]),
+            HTTP_X_REQUESTED_WITH='XMLHttpRequest')
+        self.assertEqual(response.status_code, 403)
+
+    def test_unsafe_requests_check_roles(self):
+        self._get('list_summary', ajax=False)
+        # Removed in Mailman directly, so the cached roles are stale.
+        get_client().get_list(self.list_id).remove_owner(
+            'owner0@example.org')
+        response = self.client.post(
+            reverse('mass_subscribe', args=[self.list_id]),
+            {'emails': 'new@example.org'},
+            HTTP_X_REQUESTED_WITH='XMLHttpRequest')
+        self.assertEqual(response.status_code, 403)
+
+    def test_list_pages_vary_on_ajax(self):
+        for view in ('list_summary', 'list_held_messages', 'list_settings'):
+            response, calls = self._get(view)
+            self.assertIn('X-Requested-With', response['Vary'])
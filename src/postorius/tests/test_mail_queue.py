@@ -0,0 +1,116 @@
+# -*- coding: utf-8 -*-
+# Copyright (C) 2012-2015 by the Free Software Foundation, Inc.
+#
+# This file is part of Postorius.
+#
+# Postorius is free software: you can redistribute it and/or modify it under
+# the terms of the GNU General Public License as published by the Free
+# Software Foundation, either version 3 of the License, or (at your option)
+# any later version.
+# Postorius is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or
+# FITNESS FOR A PARTICULAR PURPOSE.  See the GNU General Public License for
+# more details.
+#
+# You should have received a copy of the GNU General Public License along with
+# Postorius.  If not, see <http://www.gnu.org/licenses/>.
+
+from datetime import datetime, timedelta
+from smtplib import SMTPException
+
+from django.core import mail
+from django.core.mail.backends.locmem import EmailBackend
+from django.test import TestCase
+from django.test.utils import override_settings
+from mock import MagicMock, patch
+
+from postorius import models
+from postorius.models import QueuedMail
+
+
+@override_settings(
+    EMAIL_BACKEND='django.core.mail.backends.locmem.EmailBackend')
+class QueuedMailTest(TestCase):
+    """Tests for the outgoing mail queue."""
+
+    def _enqueue(self, to):
+        return QueuedMail.objects.enqueue(
+            'Subject', 'Body', 'postorius@example.org', [to])
+
+    def test_batches_share_a_connection(self):
+        for i in range(5):
+            self._enqueue('les%d@example.org' % i)
+        with patch.object(EmailBackend, 'open') as mock_open:
+            self.assertEqual(QueuedMail.objects.send_queued(batch_size=2), 5)
+        self.assertEqual(mock_open.call_count, 3)
+        self.assertEqual([message.to for message in mail.outbox],
+                         [['les%d@example.org' % i] for i in range(5)])
+        self.assertEqual(QueuedMail.objects.count(), 0)
+
+    def test_failures_are_retried(self):
+        failing = self._enqueue('les@example.org')
+        self._enqueue('anne@example.org')
+        send_messages = EmailBackend.send_messages
+
+        def fail_for_les(backend, messages):
+            if messages[0].to == ['les@example.org']:
+                raise SMTPException('Mailbox unavailable')
+            return send_messages(backend, messages)
+        with patch.object(EmailBackend, 'send_messages', fail_for_les):
+            self.assertEqual(QueuedMail.objects.send_queued(), 1)
+        failing = QueuedMail.objects.get(pk=failing.pk)
+        self.assertEqual(failing.attempts, 1)
+        self.assertEqual(failing.last_error, 'Mailbox unavailable')
+        with self.settings(EMAIL_QUEUE_MAX_ATTEMPTS=1):
+            self.assertEqual(QueuedMail.objects.send_queued(), 0)
+        self.assertEqual(QueuedMail.objects.send_queued(), 1)
+
+    def test_concurrent_runs_send_once(self):
+        for i in range(3):
+            self._enqueue('les%d@example.org' % i)
+        send_messages = EmailBackend.send_messages
+        runs = []
+
+        def send_with_second_run(backend, messages):
+            # Another process drains the queue while this one sends.
+            if not runs:
+                runs.append(None)
+                runs[0] = QueuedMail.objects.send_queued(batch_size=1)
+            return send_messages(backend, messages)
+        with patch.object(EmailBackend, 'send_messages',
+                          send_with_second_run):
+            sent = QueuedMail.objects.send_queued(batch_size=2)
+        self.assertEqual(sent + runs[0], 3)
+        self.assertEqual(sorted(message.to[0] for message in mail.outbox),
+                         ['les%d@example.org' % i for i in range(3)])
+        self.assertEqual(QueuedMail.objects.count(), 0)
+
+    def test_expired_claims_are_sent(self):
+        claimed = self._enqueue('les@example.org')
+        self._enqueue('anne@example.org')
+        QueuedMail.objects.filter(pk=claimed.pk).update(
+            claimed_until=datetime.now() + timedelta(minutes=5))
+        self.assertEqual(QueuedMail.objects.send_queued(), 1)
+        self.assertEqual(mail.outbox[0].to, ['anne@example.org'])
+        # The run that claimed the message died.
+        QueuedMail.objects.filter(pk=claimed.pk).update(
+            claimed_until=datetime.now() - timedelta(seconds=1))
+        self.assertEqual(QueuedMail.objects.send_queued(), 1)
+        self.assertEqual(mail.outbox[1].to, ['les@example.org'])
+
+    def test_worker_is_woken(self):
+        with patch.object(models, 'wake_mail_worker') as mock_wake:
+            self._enqueue('les@example.org')
+        self.assertEqual(mock_wake.call_count, 1)
+        # The worker is disabled in the test settings.
+        models.wake_mail_worker()
+        self.assertEqual(models._mail_worker, None)
+
+    def test_worker_is_enabled_by_default(self):
+        # Settings cannot be deleted with Django < 1.7.
+        unset = MagicMock(spec=[])
+        with patch.object(models, 'settings', unset), \
+                patch.object(models, '_mail_worker', None), \
+                patch.object(models.threading, 'Thread') as mock_thread:
+            models.wake_mail_worker()
+        self.assertEqual(mock_thread.return_value.start.call_count, 1)
@@ -0,0 +1,64 @@
+# -*- coding: utf-8 -*-
+# Copyright (C) 2012-2015 by the Free Software Foundation, Inc.
+#
+# This file is part of Postorius.
+#
+# Postorius is free software: you can redistribute it and/or modify it under
+# the terms of the GNU General Public License as published by the Free
+# Software Foundation, either version 3 of the License, or (at your option)
+# any later version.
+# Postorius is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or
+# FITNESS FOR A PARTICULAR PURPOSE.  See the GNU General Public License for
+# more details.
+#
+# You should have received a copy of the GNU General Public License along with
+# Postorius.  If not, see <http://www.gnu.org/licenses/>.
+
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.test import TestCase
+from mock import patch, MagicMock
+
+from postorius.views import user as user_views
+from postorius.models import MailmanUser, Mailman404Error
+
+
+class MailmanUserCacheTest(TestCase):
+    """Tests the cached mapping of Django users to Mailman users."""
+
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user('les', 'les@example.org', 'pwd')
+        self.mm_user = MagicMock(user_id=42,
+                                 addresses=['les@example.org',
+                                            'les@example.com'])
+
+    def test_record_is_cached(self):
+        with patch.object(MailmanUser.objects, 'get',
+                          return_value=self.mm_user) as mock_get:
+            for i in range(2):
+                self.assertEqual(
+                    MailmanUser.objects.get_addresses(self.user),
+                    ['les@example.org', 'les@example.com'])
+        self.assertEqual(mock_get.call_count, 1)
+        self.assertEqual(MailmanUser.objects.get_record(self.user)[0], '42')
+
+    def test_missing_user_is_cached(self):
+        with patch.object(MailmanUser.objects, 'get',
+                          side_effect=Mailman404Error) as mock_get:
+            for i in range(2):
+                self.assertRaises(Mailman404Error,
+                                  MailmanUser.objects.get_addresses,
+                                  self.user)
+        self.assertEqual(mock_get.call_count, 1)
+
+    def test_adding_an_address_invalidates(self):
+        with patch.object(MailmanUser.objects, 'get',
+                          return_value=self.mm_user) as mock_get:
+            MailmanUser.objects.get_addresses(self.user)
+            with patch('postorius.utils.get_client'):
+                user_views._add_address(MagicMock(), 'les@example.org',
+                                        'les@example.net')
+            MailmanUser.objects.get_addresses(self.user)
+        self.assertEqual(mock_get.call_count, 2)
@@ -0,0 +1,170 @@
+# -*- coding: utf-8 -*-
+# Copyright (C) 2012-2015 by the Free Software Foundation, Inc.
+#
+# This file is part of Postorius.
+#
+# Postorius is free software: you can redistribute it and/or modify it under
+# the terms of the GNU General Public License as published by the Free
+# Software Foundation, either version 3 of the License, or (at your option)
+# any later version.
+# Postorius is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or
+# FITNESS FOR A PARTICULAR PURPOSE.  See the GNU General Public License for
+# more details.
+#
+# You should have received a copy of the GNU General Public License along with
+# Postorius.  If not, see <http://www.gnu.org/licenses/>.
+
+
+import os
+import json
+import shutil
+import tempfile
+import subprocess
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.urlresolvers import reverse
+from django.test import Client, TestCase
+from django.test.utils import override_settings
+from httplib2 import Response
+from mock import MagicMock
+
+from postorius import metrics
+from postorius.instrumentation import InstrumentedConnection
+
+
+class EndpointNameTest(TestCase):
+
+    def test_ids_are_replaced(self):
+        for path, name in (
+                ('lists', 'lists'),
+                ('lists?count=50&page=2', 'lists'),
+                ('lists/foo@example.org/config', 'lists/{list}/config'),
+                ('lists/foo.example.org/roster/member',
+                 'lists/{list}/roster/member'),
+                ('lists/foo.example.org/owner/les@example.org',
+                 'lists/{list}/owner/{address}'),
+                ('lists/foo.example.org/held/12', 'lists/{list}/held/{id}'),
+                ('members/find', 'members/find'),
+                ('members/3/preferences', 'members/{member}/preferences'),
+                ('users/les@example.org/addresses',
+                 'users/{user}/addresses')):
+            self.assertEqual(metrics.endpoint_name(path), name)
+
+
+class RegistryTest(TestCase):
+
+    def setUp(self):
+        self.registry = metrics.Registry()
+
+    def test_exposition(self):
+        counter = self.registry.counter('test_total', 'A counter.')
+        histogram = self.registry.histogram('test_seconds', 'A histogram.',
+                                            buckets=(0.1, 1.0))
+        self.registry.gauge('test_depth', 'A gauge.',
+                            lambda: [({'queue': 'mail'}, 3)])
+        counter.inc(kind='a"b')
+        counter.inc(2, kind='a"b')
+        histogram.observe(0.5, view='index')
+        self.assertEqual(self.registry.exposition().splitlines(), [
+            '# HELP test_total A counter.',
+            '# TYPE test_total counter',
+            'test_total{kind="a\\"b"} 3.0',
+            '# HELP test_seconds A histogram.',
+            '# TYPE test_seconds histogram',
+            'test_seconds_bucket{le="+Inf",view="index"} 1.0',
+            'test_seconds_bucket{le="1.0",view="index"} 1.0',
+            'test_seconds_count{view="index"} 1.0',
+            'test_seconds_sum{view="index"} 0.5',
+            '# HELP test_depth A gauge.',
+            '# TYPE test_depth gauge',
+            'test_depth{queue="mail"} 3.0',
+        ])
+
+    def test_processes_are_added_up(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        counter = self.registry.counter('test_total', 'A counter.')
+        with override_settings(METRICS_DIR=directory):
+            counter.inc(kind='a')
+            # The values of another process.
+            with open(os.path.join(directory, 'metrics-1.json'), 'w') as f:
+                json.dump([['test_total', '', [['kind', 'a']], 2],
+                           ['test_total', '', [['kind', 'b']], 1]], f)
+            exposition = self.registry.exposition()
+        self.assertTrue('test_total{kind="a"} 3.0' in exposition)
+        self.assertTrue('test_total{kind="b"} 1.0' in exposition)
+
+    def test_exited_processes_are_kept_in_the_totals(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        counter = self.registry.counter('test_total', 'A counter.')
+        for value in (2, 3):
+            process = subprocess.Popen(['true'])
+            process.wait()
+            path = os.path.join(directory,
+                                'metrics-{0}.json'.format(process.pid))
+            with open(path, 'w') as f:
+                json.dump([['test_total', '', [], value]], f)
+            with override_settings(METRICS_DIR=directory):
+                counter.inc()
+                exposition = self.registry.exposition()
+            self.assertFalse(os.path.exists(path))
+        self.assertTrue('test_total 7.0' in exposition)
+        with override_settings(METRICS_DIR=directory):
+            self.assertTrue('test_total 7.0' in self.registry.exposition())
+
+
+class MetricsCollectionTest(TestCase):
+
+    def test_mailman_request_duration(self):
+        wrapped = MagicMock()
+        wrapped.baseurl = 'http://localhost:8001/3.0/'
+        wrapped.call.return_value = (Response({'status': '200'}), None)
+        connection = InstrumentedConnection(wrapped, None)
+        connection.call('http://localhost:8001/3.0/lists/foo.example.org')
+        self.assertTrue(
+            'postorius_mailman_request_duration_seconds_count'
+            '{endpoint="lists/{list}",method="GET"}'
+            in metrics.REGISTRY.exposition())
+
+
+class MetricsViewTest(TestCase):
+
+    def test_access(self):
+        response = Client(REMOTE_ADDR='192.0.2.1').get(reverse('metrics'))
+        self.assertEqual(response.status_code, 403)
+        User.objects.create_superuser('su', 'su@example.org', 'pwd')
+        client = Client(REMOTE_ADDR='192.0.2.1')
+        client.login(username='su', password='pwd')
+        self.assertEqual(client.get(reverse('metrics')).status_code, 200)
+        # Internal addresses are not enough, a proxy may be one of them.
+        with override_settings(INTERNAL_IPS=('192.0.2.1',)):
+            response = Client(REMOTE_ADDR='192.0.2.1').get(reverse('metrics'))
+        self.assertEqual(response.status_code, 403)
+        with override_settings(METRICS_ALLOWED_IPS=('192.0.2.1',)):
+            response = Client(REMOTE_ADDR='192.0.2.1').get(reverse('metrics'))
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue('postorius_mail_queue_depth 0.0' in response.content)
+
+    @override_settings(METRICS_TOKEN='s3cret')
+    def test_token(self):
+        response = Client().get(reverse('metrics'),
+                                HTTP_AUTHORIZATION='Bearer s3cret')
+        self.assertEqual(response.status_code, 200)
+        response = Client().get(reverse('metrics'),
+                                HTTP_AUTHORIZATION='Bearer wrong')
+        self.assertEqual(response.status_code, 403)
+
+    @override_settings(
+        METRICS_ALLOWED_IPS=('127.0.0.1',),
+        MIDDLEWARE_CLASSES=settings.MIDDLEWARE_CLASSES + (
+            'postorius.middleware.MetricsMiddleware',))
+    def test_view_duration(self):
+        Client().get(reverse('metrics'))
+        response = Client().get(reverse('metrics'))
+        self.assertTrue(
+            'postorius_view_duration_seconds_count'
+            '{method="GET",status="200",url_name="metrics"}'
+            in response.content)
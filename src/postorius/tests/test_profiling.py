@@ -0,0 +1,95 @@
+# -*- coding: utf-8 -*-
+# Copyright (C) 2012-2015 by the Free Software Foundation, Inc.
+#
+# This file is part of Postorius.
+#
+# Postorius is free software: you can redistribute it and/or modify it under
+# the terms of the GNU General Public License as published by the Free
+# Software Foundation, either version 3 of the License, or (at your option)
+# any later version.
+# Postorius is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or
+# FITNESS FOR A PARTICULAR PURPOSE.  See the GNU General Public License for
+# more details.
+#
+# You should have received a copy of the GNU General Public License along with
+# Postorius.  If not, see <http://www.gnu.org/licenses/>.
+
+
+import shutil
+import tempfile
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.urlresolvers import reverse
+from django.test import Client, TestCase
+from django.test.utils import override_settings
+
+from postorius import profiling
+
+
+class ProfilingTest(TestCase):
+    """Tests the profiling of slow requests."""
+
+    def setUp(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        test_settings = override_settings(
+            PROFILING_DIR=directory, METRICS_ALLOWED_IPS=('127.0.0.1',),
+            MIDDLEWARE_CLASSES=settings.MIDDLEWARE_CLASSES + (
+                'postorius.middleware.ProfilingMiddleware',))
+        test_settings.enable()
+        self.addCleanup(test_settings.disable)
+        User.objects.create_superuser('su', 'su@example.org', 'pwd')
+        self.su_client = Client()
+        self.su_client.login(username='su', password='pwd')
+
+    def test_requested_profile(self):
+        response = self.su_client.get(reverse('metrics'),
+                                      HTTP_X_POSTORIUS_PROFILE='1')
+        name = response['X-Postorius-Profile']
+        response = self.su_client.get(reverse('site_settings'))
+        self.assertEqual([profile.name for profile
+                          in response.context['profiles']], [name])
+        self.assertEqual(response.context['profiles'][0].view, 'metrics')
+        response = self.su_client.get(reverse('profile_download',
+                                              args=[name]))
+        self.assertEqual(response['Content-Type'],
+                         'application/octet-stream')
+        response = self.su_client.get(
+            reverse('profile_download', args=[name]), {'format': 'text'})
+        self.assertTrue('function calls' in response.content)
+
+    def test_failing_views_are_profiled(self):
+        # The view raises Http404, which is handled by Django as usual.
+        response = self.su_client.get(
+            reverse('profile_download', args=['missing.prof']),
+            HTTP_X_POSTORIUS_PROFILE='1')
+        self.assertEqual(response.status_code, 404)
+        self.assertEqual([profile.name for profile
+                          in profiling.list_profiles()],
+                         [response['X-Postorius-Profile']])
+
+    def test_only_superusers_request_profiles(self):
+        User.objects.create_user('les', 'les@example.org', 'pwd')
+        client = Client()
+        client.login(username='les', password='pwd')
+        response = client.get(reverse('metrics'),
+                              HTTP_X_POSTORIUS_PROFILE='1')
+        self.assertFalse(response.has_header('X-Postorius-Profile'))
+        self.assertEqual(profiling.list_profiles(), [])
+
+    @override_settings(PROFILING=True, PROFILING_THRESHOLD=0,
+                       PROFILING_MAX_PROFILES=2)
+    def test_slow_requests(self):
+        for i in range(3):
+            Client().get(reverse('metrics'))
+        self.assertEqual(len(profiling.list_profiles()), 2)
+        with override_settings(PROFILING_THRESHOLD=60):
+            Client().get(reverse('metrics'))
+        self.assertEqual(len(profiling.list_profiles()), 2)
+
+    def test_unknown_profile(self):
+        response = self.su_client.get(
+            reverse('profile_download', args=['..']))
+        self.assertEqual(response.status_code, 404)
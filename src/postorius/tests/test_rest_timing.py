@@ -0,0 +1,86 @@
+# -*- coding: utf-8 -*-
+# Copyright (C) 2012-2015 by the Free Software Foundation, Inc.
+#
+# This file is part of Postorius.
+#
+# Postorius is free software: you can redistribute it and/or modify it under
+# the terms of the GNU General Public License as published by the Free
+# Software Foundation, either version 3 of the License, or (at your option)
+# any later version.
+# Postorius is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or
+# FITNESS FOR A PARTICULAR PURPOSE.  See the GNU General Public License for
+# more details.
+#
+# You should have received a copy of the GNU General Public License along with
+# Postorius.  If not, see <http://www.gnu.org/licenses/>.
+
+
+from urllib2 import HTTPError
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.urlresolvers import reverse
+from django.test import Client, TestCase
+from django.test.utils import override_settings
+from mock import patch
+
+from postorius import instrumentation, middleware
+from postorius.tests.fake_mailman import FakeMailman
+from postorius.utils import get_client
+
+
+class RestTimingTest(TestCase):
+    """Tests the recording of REST calls per request."""
+
+    def setUp(self):
+        self.mailman = FakeMailman()
+        self.list_id = self.mailman.seed(lists=1, members_per_list=2)[0]
+        self.mailman.start()
+        self.addCleanup(self.mailman.stop)
+        test_settings = override_settings(
+            MIDDLEWARE_CLASSES=settings.MIDDLEWARE_CLASSES + (
+                'postorius.middleware.RestTimingMiddleware',),
+            **self.mailman.settings())
+        test_settings.enable()
+        self.addCleanup(test_settings.disable)
+        User.objects.create_superuser('su', 'su@example.org', 'pwd')
+        self.client = Client()
+        self.client.login(username='su', password='pwd')
+
+    def test_connection_records_calls(self):
+        log = instrumentation.start_log()
+        self.addCleanup(instrumentation.stop_log)
+        client = get_client()
+        client.get_list(self.list_id)
+        with self.assertRaises(HTTPError):
+            client.get_list('missing@example.org')
+        self.assertEqual(
+            [call[:3] for call in log.calls],
+            [('GET', 'lists/' + self.list_id, 200),
+             ('GET', 'lists/missing@example.org', 404)])
+        self.assertTrue(log.calls[0].size > 0)
+
+    def test_no_recording_outside_requests(self):
+        client = get_client()
+        self.assertEqual(client._connection._log, None)
+        client.get_list(self.list_id)
+
+    def test_server_timing_header(self):
+        with patch.object(middleware, 'logger') as mock_logger:
+            response = self.client.get(
+                reverse('list_settings', args=[self.list_id]))
+        self.assertTrue(response['Server-Timing'].startswith(
+            'mailman;desc="2 REST calls";dur='))
+        self.assertEqual(mock_logger.info.call_args[0][4], 2)
+        self.assertFalse(mock_logger.warning.called)
+
+    @override_settings(REST_SLOW_REQUEST_THRESHOLD=0, REST_SERVER_TIMING=False)
+    def test_slow_request_trace(self):
+        with patch.object(middleware, 'logger') as mock_logger:
+            response = self.client.get(
+                reverse('list_settings', args=[self.list_id]))
+        self.assertFalse(response.has_header('Server-Timing'))
+        trace = mock_logger.warning.call_args[0][-1]
+        self.assertTrue('GET lists/{0}/config 200'.format(
+            self.list_id.replace('.', '@', 1)) in trace)
@@ -0,0 +1,100 @@
+# -*- coding: utf-8 -*-
+# Copyright (C) 2012-2015 by the Free Software Foundation, Inc.
+#
+# This file is part of Postorius.
+#
+# Postorius is free software: you can redistribute it and/or modify it under
+# the terms of the GNU General Public License as published by the Free
+# Software Foundation, either version 3 of the License, or (at your option)
+# any later version.
+# Postorius is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or
+# FITNESS FOR A PARTICULAR PURPOSE.  See the GNU General Public License for
+# more details.
+#
+# You should have received a copy of the GNU General Public License along with
+# Postorius.  If not, see <http://www.gnu.org/licenses/>.
+
+
+import os
+import shutil
+import tempfile
+
+from django.conf import settings
+from django.contrib.staticfiles import finders
+from django.contrib.staticfiles.storage import staticfiles_storage
+from django.core.management import call_command
+from django.template import Context, Template
+from django.test import SimpleTestCase
+from django.test.utils import override_settings
+from django.utils.functional import empty
+
+from postorius.storage import (BUNDLES, PostoriusStaticFilesStorage,
+                               bundles_enabled, minify_css)
+
+
+class StaticStorageTest(SimpleTestCase):
+    """Tests the bundling and fingerprinting of the static files."""
+
+    def setUp(self):
+        self.static_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.static_root)
+        test_settings = override_settings(
+            STATIC_ROOT=self.static_root, DEBUG=False,
+            STATICFILES_STORAGE='postorius.storage.PostoriusStaticFilesStorage')
+        # Django < 1.8 does not reset the storage when the settings change.
+        self.addCleanup(self._reset_storage)
+        test_settings.enable()
+        self.addCleanup(test_settings.disable)
+        self._reset_storage()
+        call_command('collectstatic', interactive=False, verbosity=0)
+        self.storage = PostoriusStaticFilesStorage()
+
+    def _reset_storage(self):
+        staticfiles_storage._wrapped = empty
+
+    def _hashed(self, name):
+        return self.storage.url(name)[len(settings.STATIC_URL):]
+
+    def test_bundles_are_fingerprinted(self):
+        for name in BUNDLES:
+            hashed = self._hashed(name)
+            self.assertNotEqual(hashed, name)
+            self.assertTrue(os.path.exists(
+                os.path.join(self.static_root, hashed)))
+
+    def test_css_is_minified(self):
+        name = 'postorius/css/postorius.bundle.css'
+        bundle_size = os.path.getsize(
+            os.path.join(self.static_root, self._hashed(name)))
+        sources_size = sum(os.path.getsize(finders.find(source))
+                           for source in BUNDLES[name])
+        self.assertLess(bundle_size, sources_size)
+
+    def test_css_urls_are_rewritten(self):
+        hashed = self._hashed('postorius/css/postorius.bundle.css')
+        with open(os.path.join(self.static_root, hashed)) as bundle:
+            css = bundle.read()
+        image = self._hashed('postorius/img/glyphicons-halflings.png')
+        self.assertIn(os.path.basename(image), css)
+
+    def test_pages_include_bundles(self):
+        self.assertTrue(bundles_enabled())
+        html = Template(
+            '{% load staticfiles %}'
+            '{% static "postorius/js/postorius.bundle.js" %}'
+        ).render(Context())
+        self.assertEqual(html, '/static/' +
+                         self._hashed('postorius/js/postorius.bundle.js'))
+
+    def test_bundles_disabled_in_debug_mode(self):
+        with self.settings(DEBUG=True):
+            self.assertFalse(bundles_enabled())
+
+
+class MinifyCSSTest(SimpleTestCase):
+
+    def test_minify(self):
+        css = ('/* Header */\n'
+               'h1,\n h2 {\n    color: red;\n    margin: 0 auto;\n}\n')
+        self.assertEqual(minify_css(css), 'h1,h2{color: red;margin: 0 auto}')
@@ -0,0 +1,141 @@
+# -*- coding: utf-8 -*-
+# Copyright (C) 2012-2015 by the Free Software Foundation, Inc.
+#
+# This file is part of Postorius.
+#
+# Postorius is free software: you can redistribute it and/or modify it under
+# the terms of the GNU General Public License as published by the Free
+# Software Foundation, either version 3 of the License, or (at your option)
+# any later version.
+# Postorius is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or
+# FITNESS FOR A PARTICULAR PURPOSE.  See the GNU General Public License for
+# more details.
+#
+# You should have received a copy of the GNU General Public License along with
+# Postorius.  If not, see <http://www.gnu.org/licenses/>.
+
+from django.contrib.auth.models import User
+from django.core.urlresolvers import reverse
+from django.test import Client, TestCase
+from mock import patch, MagicMock
+
+from postorius import models, utils
+from postorius.models import UserIndexEntry
+from postorius.tests.fake_connection import FakeConnection
+
+
+def _resources(users):
+    """Returns the REST resources of ``(user_id, name, emails)`` tuples."""
+    resources = {'users': [dict(user_id=user_id, display_name=name,
+                                created_on='2015-01-01T00:00:00')
+                           for user_id, name, emails in users]}
+    for user_id, name, emails in users:
+        resources['users/{0}/addresses'.format(user_id)] = [
+            dict(email=email) for email in emails]
+    return resources
+
+
+class UserIndexTest(TestCase):
+    """Tests for the local user index and the user index page."""
+
+    def setUp(self):
+        self.users = [
+            (1, 'Les', ['les@example.org', 'les@example.com']),
+            (2, 'Anne', ['anne@example.org']),
+            (3, None, ['Ger@Example.org'])]
+        self.connection = FakeConnection(_resources(self.users))
+        client = MagicMock()
+        client._connection = self.connection
+        for module in (models, utils):
+            patcher = patch.object(module, 'get_client', return_value=client)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        User.objects.create_superuser('su', 'su@example.org', 'pwd')
+        self.client = Client()
+        self.client.login(username='su', password='pwd')
+
+    def _change_users(self):
+        self.connection.resources = _resources(self.users)
+
+    def test_refresh_is_incremental(self):
+        UserIndexEntry.objects.refresh(page_size=2)
+        self.assertEqual(UserIndexEntry.objects.get(user_id='3').addresses,
+                         ['ger@example.org'])
+        self.connection.calls = []
+        self.users[1] = (2, 'Anna', ['anne@example.org'])
+        self._change_users()
+        UserIndexEntry.objects.refresh(page_size=2)
+        # Only the pages were fetched, not the addresses.
+        self.assertEqual(self.connection.calls, ['users?count=2&page=1',
+                                                 'users?count=2&page=2'])
+        self.assertEqual(
+            UserIndexEntry.objects.get(user_id='2').display_name, 'Anna')
+
+    def test_full_refresh_removes_deleted_users(self):
+        UserIndexEntry.objects.refresh()
+        del self.users[0]
+        self._change_users()
+        UserIndexEntry.objects.refresh(full=True)
+        self.assertEqual(
+            sorted(UserIndexEntry.objects.values_list('user_id', flat=True)),
+            ['2', '3'])
+
+    def test_search(self):
+        UserIndexEntry.objects.refresh()
+        response = self.client.get(reverse('user_index'),
+                                   {'q': 'example.org les'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(
+            [entry.user_id for entry in response.context['mm_user_page']],
+            ['1'])
+        self.assertContains(response, 'les@example.com')
+
+    def test_search_matches_prefixes(self):
+        UserIndexEntry.objects.refresh()
+        search = UserIndexEntry.objects.search
+        self.assertEqual([e.user_id for e in search('AN')], ['2'])
+        self.assertEqual([e.user_id for e in search('ger@exa')], ['3'])
+        self.assertEqual([e.user_id for e in search('example.com')], ['1'])
+        # Words are not matched in the middle.
+        self.assertEqual(list(search('nne')), [])
+
+    def test_search_index_follows_changes(self):
+        UserIndexEntry.objects.refresh()
+        self.users[1] = (2, 'Anna', ['anna@example.net'])
+        self._change_users()
+        UserIndexEntry.objects.refresh(full=True)
+        search = UserIndexEntry.objects.search
+        self.assertEqual([e.user_id for e in search('anna')], ['2'])
+        self.assertEqual(list(search('anne')), [])
+
+    def test_page_size_and_total(self):
+        UserIndexEntry.objects.refresh()
+        response = self.client.get(reverse('user_index'),
+                                   {'count': 25, 'page': 1})
+        self.assertEqual(response.context['mm_user_page'].paginator.count, 3)
+        # Unknown page sizes fall back to the default.
+        response = self.client.get(reverse('user_index'), {'count': 7})
+        self.assertEqual(response.context['count'], 25)
+
+    def test_without_index_pages_from_mailman(self):
+        with self.settings(USER_INDEX_PAGE_SIZES=(2,)):
+            response = self.client.get(reverse('user_index'), {'page': 2})
+        page = response.context['mm_user_page']
+        self.assertEqual(page.paginator.count, 3)
+        self.assertEqual([entry['user_id'] for entry in page], [3])
+        self.assertEqual(self.connection.calls, ['users?count=2&page=2'])
+
+    def test_without_index_out_of_range_page(self):
+        with self.settings(USER_INDEX_PAGE_SIZES=(2,)):
+            response = self.client.get(reverse('user_index'), {'page': 9})
+        page = response.context['mm_user_page']
+        self.assertEqual(page.number, 2)
+        self.assertEqual([entry['user_id'] for entry in page], [3])
+        self.assertEqual(self.connection.calls, ['users?count=2&page=9',
+                                                 'users?count=2&page=2'])
+
+    def test_superusers_only(self):
+        self.client.logout()
+        response = self.client.get(reverse('user_index'))
+        self.assertEqual(response.status_code, 302)
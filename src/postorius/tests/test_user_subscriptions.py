@@ -0,0 +1,116 @@
+# -*- coding: utf-8 -*-
+# Copyright (C) 2012-2015 by the Free Software Foundation, Inc.
+#
+# This file is part of Postorius.
+#
+# Postorius is free software: you can redistribute it and/or modify it under
+# the terms of the GNU General Public License as published by the Free
+# Software Foundation, either version 3 of the License, or (at your option)
+# any later version.
+# Postorius is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or
+# FITNESS FOR A PARTICULAR PURPOSE.  See the GNU General Public License for
+# more details.
+#
+# You should have received a copy of the GNU General Public License along with
+# Postorius.  If not, see <http://www.gnu.org/licenses/>.
+
+from django.contrib.auth.models import User
+from django.core.urlresolvers import reverse
+from django.test import Client, TestCase
+from django.test.utils import override_settings
+from mock import patch
+
+from postorius import utils
+from postorius.models import MailmanUser
+from postorius.tests.fake_connection import FakeConnection
+
+
+def _memberships(addresses):
+    """Returns the resources of the memberships of ``addresses``."""
+    resources = {}
+    for address in addresses:
+        entries = [dict(list_id='list%d.example.org' % i, role='member',
+                        email=address,
+                        self_link='members/%s/%d' % (address, i))
+                   for i in range(3)]
+        # Only some Mailman versions send the delivery mode along.
+        entries[0]['delivery_mode'] = 'regular'
+        resources['members/find/' + address] = entries
+        for entry in entries:
+            resources[entry['self_link'] + '/preferences'] = dict(
+                delivery_mode='mime_digests')
+    return resources
+
+
+class FakeMailmanUser(object):
+    display_name = 'Les'
+    addresses = ['les@example.org', 'les@example.com']
+
+    def __init__(self):
+        self._connection = FakeConnection(_memberships(self.addresses))
+
+
+class UserSubscriptionsTest(TestCase):
+    """Tests for the subscriptions page of a user."""
+
+    def setUp(self):
+        User.objects.create_user('les', 'les@example.org', 'pwd')
+        self.client = Client()
+        self.client.login(username='les', password='pwd')
+        self.mm_user = FakeMailmanUser()
+
+    def _get(self, **params):
+        with patch.object(MailmanUser.objects, 'get',
+                          return_value=self.mm_user):
+            return self.client.get(reverse('user_subscriptions'), params)
+
+    def _preference_calls(self):
+        return [path for path in self.mm_user._connection.calls
+                if path.endswith('/preferences')]
+
+    def test_rows_are_built_from_memberships(self):
+        response = self._get()
+        memberships = response.context['memberships']
+        self.assertEqual(len(memberships), 6)
+        self.assertEqual(
+            [(row.mlist, row.address, row.delivery_mode)
+             for row in memberships][:2],
+            [('list0.example.org', 'les@example.org', 'regular'),
+             ('list1.example.org', 'les@example.org', 'mime_digests')])
+        # Preferences were only needed where the delivery mode is missing.
+        self.assertEqual(len(self._preference_calls()), 4)
+        self.assertContains(response, 'mime_digests')
+
+    @override_settings(SUBSCRIPTIONS_PAGE_SIZE=2)
+    def test_paging(self):
+        response = self._get(page=2)
+        memberships = response.context['memberships']
+        self.assertEqual([row.mlist for row in memberships],
+                         ['list2.example.org', 'list0.example.org'])
+        self.assertEqual(memberships.paginator.num_pages, 3)
+        self.assertEqual(self._preference_calls(),
+                         ['members/les@example.org/2/preferences'])
+        self.assertEqual(len(self._get(page='x').context['memberships']), 2)
+
+    def test_subscription_preferences_need_one_user_lookup(self):
+        with patch.object(MailmanUser.objects, 'get',
+                          return_value=self.mm_user) as mock_get:
+            response = self.client.get(
+                reverse('user_subscription_preferences'))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(mock_get.call_count, 1)
+        # The memberships are looked up once per address, the members
+        # themselves are not fetched again.
+        calls = self.mm_user._connection.calls
+        self.assertEqual(calls.count('members/find'), 2)
+        self.assertEqual(len(calls), 2 + len(self._preference_calls()))
+
+    def test_members_are_built_from_entries(self):
+        entry = dict(list_id='list0.example.org', role='member',
+                     email='les@example.org',
+                     self_link='members/les@example.org/0')
+        member = utils.member_from_entry(self.mm_user._connection, entry)
+        self.assertEqual((member.list_id, member.email, member.role),
+                         ('list0.example.org', 'les@example.org', 'member'))
+        self.assertEqual(self.mm_user._connection.calls, [])
@@ -20,115 +20,163 @@ from django.conf.urls import *
 from django.conf import settings
 from django.conf.urls.static import static
 from django.contrib.auth.views import login as login_view
+from django.views.decorators.csrf import csrf_exempt
 
-from postorius.views import *
-from postorius.views.generic import *
+from postorius.views import lazy_view
 
 
-per_list_urlpatterns = patterns('postorius.views',
-                                url(r'^members/(?P<page>\d+)/$',
-                                    ListMembersView.as_view(
-                                    ), name='list_members_paged'),
-                                url(r'^csv_view/$',
-                                    'csv_view', name='csv_view'),
-                                url(r'^members/$',
-                                    ListMembersView.as_view(
-                                    ), name='list_members'),
-                                url(r'^members/options/(?P<email>[^/]+)/$',
-                                    ListMemberOptionsView.as_view(
-                                    ), name='list_member_options'),
-                                url(r'^metrics$',
-                                    ListMetricsView.as_view(
-                                    ), name='list_metrics'),
-                                url(r'^$',
-                                    ListSummaryView.as_view(
-                                    ), name='list_summary'),
-                                url(r'^subscribe$',
-                                    ListSubscribeView.as_view(
-                                    ), name='list_subscribe'),
-                                url(r'^change_subscription$',
-                                    ChangeSubscriptionView.as_view(),
-                                    name='change_subscription'),
-                                url(r'^unsubscribe/(?P<email>[^/]+)$',
-                                    ListUnsubscribeView.as_view(
-                                    ), name='list_unsubscribe'),
-                                url(r'^subscriptions$',
-                                    'list_subscriptions',
-                                    name='list_subscriptions'),
-                                url(r'^subscription_requests$',
-                                    'list_subscription_requests',
-                                    name='list_subscription_requests'),
-                                url(r'^handle_subscription_request/(?P<request_id>[^/]+)/(?P<action>[accept|reject|discard|defer]+)$',
-                                    'handle_subscription_request',
-                                    name='handle_subscription_request'),
-                                url(r'^mass_subscribe/$',
-                                    ListMassSubscribeView.as_view(
-                                    ), name='mass_subscribe'),
-                                url(r'^mass_removal/$',
-                                    ListMassRemovalView.as_view(
-                                    ), name='mass_removal'),
-                                url(r'^delete$',
-                                    'list_delete', name='list_delete'),
-                                url(r'^held_messages/(?P<msg_id>[^/]+)/'
-                                    'accept$', 'accept_held_message',
-                                    name='accept_held_message'),
-                                url(r'^held_messages/(?P<msg_id>[^/]+)/'
-                                    'discard$', 'discard_held_message',
-                                    name='discard_held_message'),
-                                url(r'^held_messages/(?P<msg_id>[^/]+)/'
-                                    'defer$', 'defer_held_message',
-                                    name='defer_held_message'),
-                                url(r'^held_messages/(?P<msg_id>[^/]+)/'
-                                    'reject$', 'reject_held_message',
-                                    name='reject_held_message'),
-                                url(r'^held_messages$',
-                                    'list_held_messages',
-                                    name='list_held_messages'),
-                                url(r'^remove/(?P<role>[^/]+)/'
-                                    '(?P<address>[^/]+)',
-                                    'remove_role', name='remove_role'),
-                                url(r'^settings/(?P<visible_section>[^/]+)?$',
-                                    'list_settings',
-                                    name='list_settings'),
-                                url(r'^unsubscribe_all$',
-                                    'remove_all_subscribers', name='unsubscribe_all'),
-                                url(r'^archival_options$',
-                                    'list_archival_options',
-                                    name='list_archival_options'),
-                                )
+per_list_urlpatterns = patterns(
+    '',
+    url(r'^members/(?P<page>\d+)/$',
+        lazy_view('postorius.views.list.ListMembersView'),
+        name='list_members_paged'),
+    url(r'^csv_view/$',
+        lazy_view('postorius.views.list.csv_view'), name='csv_view'),
+    url(r'^members/$',
+        lazy_view('postorius.views.list.ListMembersView'),
+        name='list_members'),
+    url(r'^members/options/(?P<email>[^/]+)/$',
+        lazy_view('postorius.views.list.ListMemberOptionsView'),
+        name='list_member_options'),
+    url(r'^metrics$',
+        lazy_view('postorius.views.list.ListMetricsView'),
+        name='list_metrics'),
+    url(r'^$',
+        lazy_view('postorius.views.list.ListSummaryView'),
+        name='list_summary'),
+    url(r'^subscribe$',
+        lazy_view('postorius.views.list.ListSubscribeView'),
+        name='list_subscribe'),
+    url(r'^change_subscription$',
+        lazy_view('postorius.views.list.ChangeSubscriptionView'),
+        name='change_subscription'),
+    url(r'^unsubscribe/(?P<email>[^/]+)$',
+        lazy_view('postorius.views.list.ListUnsubscribeView'),
+        name='list_unsubscribe'),
+    url(r'^subscriptions$',
+        lazy_view('postorius.views.list.list_subscriptions'),
+        name='list_subscriptions'),
+    url(r'^subscription_requests$',
+        lazy_view('postorius.views.list.list_subscription_requests'),
+        name='list_subscription_requests'),
+    url(r'^handle_subscription_request/(?P<request_id>[^/]+)/(?P<action>[accept|reject|discard|defer]+)$',
+        lazy_view('postorius.views.list.handle_subscription_request'),
+        name='handle_subscription_request'),
+    url(r'^mass_subscribe/$',
+        lazy_view('postorius.views.list.ListMassSubscribeView'),
+        name='mass_subscribe'),
+    url(r'^mass_removal/$',
+        lazy_view('postorius.views.list.ListMassRemovalView'),
+        name='mass_removal'),
+    url(r'^delete$',
+        lazy_view('postorius.views.list.list_delete'), name='list_delete'),
+    url(r'^held_messages/(?P<msg_id>[^/]+)/accept$',
+        lazy_view('postorius.views.list.accept_held_message'),
+        name='accept_held_message'),
+    url(r'^held_messages/(?P<msg_id>[^/]+)/discard$',
+        lazy_view('postorius.views.list.discard_held_message'),
+        name='discard_held_message'),
+    url(r'^held_messages/(?P<msg_id>[^/]+)/defer$',
+        lazy_view('postorius.views.list.defer_held_message'),
+        name='defer_held_message'),
+    url(r'^held_messages/(?P<msg_id>[^/]+)/reject$',
+        lazy_view('postorius.views.list.reject_held_message'),
+        name='reject_held_message'),
+    url(r'^held_messages/poll$',
+        lazy_view('postorius.views.list.list_held_messages_poll'),
+        name='list_held_messages_poll'),
+    url(r'^held_messages$',
+        lazy_view('postorius.views.list.list_held_messages'),
+        name='list_held_messages'),
+    url(r'^remove/(?P<role>[^/]+)/(?P<address>[^/]+)',
+        lazy_view('postorius.views.list.remove_role'), name='remove_role'),
+    url(r'^settings/(?P<visible_section>[^/]+)?$',
+        lazy_view('postorius.views.list.list_settings'),
+        name='list_settings'),
+    url(r'^unsubscribe_all$',
+        lazy_view('postorius.views.list.remove_all_subscribers'),
+        name='unsubscribe_all'),
+    url(r'^archival_options$',
+        lazy_view('postorius.views.list.list_archival_options'),
+        name='list_archival_options'),
+)
 
 urlpatterns = patterns(
-    'postorius.views',
-    (r'^$', 'list_index'),
+    '',
+    (r'^$', lazy_view('postorius.views.list.list_index')),
     # /account/
     url(r'^accounts/login/$', login_view,
         {"template_name": "postorius/login.html"}, name='user_login'),
-    url(r'^accounts/logout/$', 'user_logout', name='user_logout'),
-    url(r'^accounts/profile/$', 'user_profile', name='user_profile'),
-    url(r'^tasks/$', 'user_tasks', name='user_tasks'),
-    url(r'^accounts/subscriptions/$', UserSubscriptionsView.as_view(),
+    url(r'^accounts/logout/$', lazy_view('postorius.views.user.user_logout'),
+        name='user_logout'),
+    url(r'^accounts/profile/$',
+        lazy_view('postorius.views.user.user_profile'), name='user_profile'),
+    url(r'^tasks/$', lazy_view('postorius.views.user.user_tasks'),
+        name='user_tasks'),
+    url(r'^accounts/subscriptions/$',
+        lazy_view('postorius.views.user.UserSubscriptionsView'),
         name='user_subscriptions'),
     url(r'^accounts/per-address-preferences/$',
-        UserAddressPreferencesView.as_view(), name='user_address_preferences'),
+        lazy_view('postorius.views.user.UserAddressPreferencesView'),
+        name='user_address_preferences'),
     url(r'^accounts/per-subscription-preferences/$',
-        UserSubscriptionPreferencesView.as_view(
-        ), name='user_subscription_preferences'),
+        lazy_view('postorius.views.user.UserSubscriptionPreferencesView'),
+        name='user_subscription_preferences'),
     url(r'^accounts/mailmansettings/$',
-        UserMailmanSettingsView.as_view(),
+        lazy_view('postorius.views.user.UserMailmanSettingsView'),
         name='user_mailmansettings'),
     # /settings/
-    url(r'^settings/$', 'site_settings', name="site_settings"),
-    url(r'^domains/$', 'domain_index', name='domain_index'),
-    url(r'^domains/new/$', 'domain_new', name='domain_new'),
+    url(r'^settings/$', lazy_view('postorius.views.settings.site_settings'),
+        name="site_settings"),
+    url(r'^settings/profiles/(?P<name>[^/]+)$',
+        lazy_view('postorius.views.settings.profile_download'),
+        name='profile_download'),
+    url(r'^metrics/$', lazy_view('postorius.views.settings.metrics_view'),
+        name='metrics'),
+    url(r'^domains/$', lazy_view('postorius.views.settings.domain_index'),
+        name='domain_index'),
+    url(r'^domains/new/$', lazy_view('postorius.views.settings.domain_new'),
+        name='domain_new'),
     url(r'^domains/(?P<domain>[^/]+)/delete$',
-        'domain_delete', name='domain_delete'),
+        lazy_view('postorius.views.settings.domain_delete'),
+        name='domain_delete'),
     # /lists/
-    url(r'^lists/$', 'list_index', name='list_index'),
-    url(r'^lists/new/$', 'list_new', name='list_new'),
+    url(r'^lists/$', lazy_view('postorius.views.list.list_index'),
+        name='list_index'),
+    url(r'^lists/new/$', lazy_view('postorius.views.list.list_new'),
+        name='list_new'),
     url(r'^lists/(?P<list_id>[^/]+)/', include(per_list_urlpatterns)),
+    # /api/
+    url(r'^api/token/$', lazy_view('postorius.views.api.api_token'),
+        name='api_token'),
+    url(r'^api/lists/$', lazy_view('postorius.views.api.api_lists'),
+        name='api_lists'),
+    url(r'^api/lists/(?P<list_id>[^/]+)/members/$',
+        lazy_view('postorius.views.api.api_list_members'),
+        name='api_list_members'),
+    url(r'^api/users/(?P<user_id>[^/]+)/subscriptions/$',
+        lazy_view('postorius.views.api.api_user_subscriptions'),
+        name='api_user_subscriptions'),
+    # The CSRF middleware looks at the view before it is imported.
+    url(r'^api/memberships/bulk/$',
+        csrf_exempt(lazy_view('postorius.views.api.api_bulk_memberships')),
+        name='api_bulk_memberships'),
+    url(r'^api/export/lists/$',
+        lazy_view('postorius.views.api.api_export_lists'),
+        name='api_export_lists'),
+    url(r'^api/export/members/$',
+        lazy_view('postorius.views.api.api_export_members'),
+        name='api_export_members'),
+    url(r'^api/export/users/$',
+        lazy_view('postorius.views.api.api_export_users'),
+        name='api_export_users'),
+    # /users/
+    url(r'^users/$', lazy_view('postorius.views.user.user_index'),
+        name='user_index'),
     url(r'^users/address_activation/$',
-        AddressActivationView.as_view(),
+        lazy_view('postorius.views.user.AddressActivationView'),
         name='address_activation'),
     url(r'^users/address_activation/(?P<activation_key>[A-Za-z0-9]{40})/$',
-        'address_activation_link', name='address_activation_link'),
+        lazy_view('postorius.views.user.address_activation_link'),
+        name='address_activation_link'),
 )
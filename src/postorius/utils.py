@@ -15,13 +15,26 @@
 #
 # You should have received a copy of the GNU General Public License along with
 # Postorius.  If not, see <http://www.gnu.org/licenses/>.
+import os
+import time
+import hashlib
 import logging
 
+from functools import wraps
+
 from django.conf import settings
+from django.contrib import messages
+from django.core.cache import cache
 from django.shortcuts import render_to_response, redirect
-from django.template import RequestContext
+from django.template import RequestContext, TemplateSyntaxError
+from django.template.loaders.cached import Loader as CachedLoader
+from django.middleware.csrf import get_token
+from django.utils.translation import get_language
+from django.views.decorators.http import condition
 from mailmanclient import Client
 
+from postorius import instrumentation
+
 
 logger = logging.getLogger(__name__)
 
@@ -35,17 +48,167 @@ def get_domain_name(request):
 
 
 def get_client():
-    return Client('{0}/3.0'.format(settings.MAILMAN_API_URL),
-                  settings.MAILMAN_USER,
-                  settings.MAILMAN_PASS)
+    return instrumentation.instrument(
+        Client('{0}/3.0'.format(settings.MAILMAN_API_URL),
+               settings.MAILMAN_USER,
+               settings.MAILMAN_PASS))
+
+
+def member_from_entry(connection, entry):
+    """Returns a mailmanclient member for an entry of a members resource,
+    without fetching the member again.
+
+    mailmanclient has no public way to do this, so this is the only place
+    relying on its private member class.
+    """
+    try:
+        # mailmanclient >= 3.0
+        from mailmanclient.restobjects.member import Member
+    except ImportError:
+        from mailmanclient._client import _Member
+        member = _Member(connection, entry['self_link'])
+        member._info = entry
+        return member
+    return Member(connection, entry['self_link'], entry)
 
 
 def render_api_error(request):
     """Renders an error template.
     Use if MailmanApiError is catched.
     """
-    return render_to_response(
+    response = render_to_response(
         'postorius/errors/generic.html',
         {'error': "Mailman REST API not available.  "
                   "Please start Mailman core."},
         context_instance=RequestContext(request))
+    response.status_code = 503
+    return response
+
+
+def _generation_key(name):
+    return 'postorius:generation:{0}'.format(name)
+
+
+def get_cache_generation(name):
+    """Returns a counter that changes whenever ``name`` is invalidated.
+
+    Used in cache keys and ETags for data that can change through Postorius
+    without changing the ``http_etag`` of the Mailman resource.
+    """
+    generation = cache.get(_generation_key(name))
+    if generation is None:
+        # Start from the current time, so that a counter lost from the
+        # cache never repeats a value that was handed out before.
+        generation = int(time.time() * 1000)
+        cache.add(_generation_key(name), generation, None)
+    return generation
+
+
+def bump_cache_generation(name):
+    """Invalidates everything keyed by the generation of ``name``.
+    """
+    try:
+        cache.incr(_generation_key(name))
+    except ValueError:
+        get_cache_generation(name)
+
+
+def invalidate_list(list_id):
+    """Invalidates cached pages and fragments that show the given list.
+
+    Call it whenever the list, its settings or its rosters are changed.
+    """
+    bump_cache_generation('lists')
+    bump_cache_generation('list:{0}'.format(list_id))
+    bump_cache_generation('memberships')
+
+
+def make_etag(request, *parts):
+    """Builds the ETag of a page from ``parts``, the requesting user and
+    the CSRF token embedded in the forms of the page.
+
+    Returns None (no conditional response) if one of the parts is unknown
+    or if there are messages waiting to be shown on the next page.
+    """
+    if None in parts or len(messages.get_messages(request)) > 0:
+        return None
+    user = request.user
+    # AJAX requests get the page without header and footer.
+    parts += (request.is_ajax(), user.pk, user.is_superuser,
+              getattr(user, 'is_list_owner', False),
+              getattr(user, 'is_list_moderator', False),
+              get_language(), get_token(request))
+    return hashlib.sha1(repr(parts)).hexdigest()
+
+
+def etag_time_bucket():
+    """Returns a value that changes every ``ETAG_MAX_AGE`` seconds.
+
+    Added to ETags of pages that show data which can change in Mailman
+    without Postorius noticing.
+    """
+    return int(time.time() // getattr(settings, 'ETAG_MAX_AGE', 300))
+
+
+def etag_condition(etag_func):
+    """Like Django's ``condition`` decorator with an ``etag_func``, but only
+    sends the ETag with successful responses, so that error pages, like the
+    one shown while Mailman is not available, are not revalidated.
+    """
+    def decorator(view):
+        conditional_view = condition(etag_func=etag_func)(view)
+
+        def wrapper(request, *args, **kwargs):
+            response = conditional_view(request, *args, **kwargs)
+            if response.status_code not in (200, 304):
+                del response['ETag']
+            return response
+        return wraps(view)(wrapper)
+    return decorator
+
+
+def conditional_response(request, etag, render):
+    """Returns a 304 if the client has the page with ``etag`` already.
+
+    Otherwise returns the response of ``render()`` with the ETag header set.
+    Class based views use this once they have collected the data the
+    ETag is built from.
+    """
+    @etag_condition(lambda request: etag)
+    def view(request):
+        return render()
+    return view(request)
+
+
+def precompile_templates():
+    """Compiles all Postorius templates into the cached template loader.
+
+    Does nothing unless the default template engine uses the cached loader.
+    Returns the number of compiled templates.
+    """
+    try:
+        from django.template.engine import Engine
+    except ImportError:
+        # Django < 1.8
+        return 0
+    engine = Engine.get_default()
+    if not any(isinstance(loader, CachedLoader)
+               for loader in engine.template_loaders):
+        return 0
+    root = os.path.join(os.path.dirname(__file__), 'templates')
+    count = 0
+    for dirpath, dirnames, filenames in os.walk(os.path.join(root,
+                                                             'postorius')):
+        for filename in filenames:
+            if not filename.endswith('.html'):
+                continue
+            name = os.path.relpath(os.path.join(dirpath, filename), root)
+            try:
+                engine.get_template(name.replace(os.sep, '/'))
+            except TemplateSyntaxError, e:
+                # Templates using optional tag libraries, like the
+                # browserid login page, are compiled when used.
+                logger.debug('Could not precompile %s: %s', name, e)
+            else:
+                count += 1
+    return count
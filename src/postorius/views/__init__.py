@@ -16,7 +16,28 @@
 # You should have received a copy of the GNU General Public License along with
 # Postorius.  If not, see <http://www.gnu.org/licenses/>.
 
-from postorius.views.api import *
-from postorius.views.list import *
-from postorius.views.settings import *
-from postorius.views.user import *
+"""The views are kept in the submodules, which are only imported once one
+of their views is requested. The URLconf refers to them through
+:func:`lazy_view`.
+"""
+
+from importlib import import_module
+
+
+def lazy_view(path, **initkwargs):
+    """Returns a view that imports the view at ``path`` on its first
+    request. Class based views are set up with ``as_view(**initkwargs)``.
+    """
+    module_name, name = path.rsplit('.', 1)
+    view = []
+
+    def wrapper(request, *args, **kwargs):
+        if not view:
+            target = getattr(import_module(module_name), name)
+            if hasattr(target, 'as_view'):
+                target = target.as_view(**initkwargs)
+            view.append(target)
+        return view[0](request, *args, **kwargs)
+    wrapper.__module__ = module_name
+    wrapper.__name__ = name
+    return wrapper
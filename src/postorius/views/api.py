@@ -20,7 +20,11 @@
 import re
 import sys
 import json
+import time
+import hashlib
 import logging
+from collections import OrderedDict
+from multiprocessing.pool import ThreadPool
 
 
 from django.conf import settings
@@ -31,16 +35,25 @@ from django.contrib.auth.decorators import (login_required,
                                             user_passes_test)
 from django.contrib.auth.forms import AuthenticationForm
 from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.core.exceptions import PermissionDenied
 from django.core.urlresolvers import reverse
-from django.http import HttpResponse, HttpResponseRedirect
+from django.http import (HttpResponse, HttpResponseRedirect,
+                         StreamingHttpResponse)
 from django.shortcuts import render_to_response, redirect
 from django.template import Context, loader, RequestContext
+from django.utils.cache import patch_vary_headers
 from django.utils.decorators import method_decorator
+from django.utils.http import http_date, urlencode
+from django.utils.text import compress_string
 from django.utils.translation import gettext as _
+from django.views.decorators.csrf import csrf_exempt
+from django.views.decorators.http import require_POST
+from mailmanclient import MailmanConnectionError
 from urllib2 import HTTPError
 
-from postorius import utils
-from postorius.models import (Domain, List, Member, MailmanUser,
+from postorius import metrics, utils
+from postorius.models import (Domain, List, ListSnapshot, Member, MailmanUser,
                               MailmanApiError, Mailman404Error)
 from postorius.forms import *
 from postorius.auth.decorators import *
@@ -50,10 +63,585 @@ from postorius.views.generic import MailingListView, MailmanUserView
 logger = logging.getLogger(__name__)
 
 
+API_PAGE_SIZE = getattr(settings, 'API_PAGE_SIZE', 50)
+API_MAX_PAGE_SIZE = getattr(settings, 'API_MAX_PAGE_SIZE', 500)
+API_EXPORT_PAGE_SIZE = getattr(settings, 'API_EXPORT_PAGE_SIZE', 500)
+API_CACHE_TIMEOUT = getattr(settings, 'API_CACHE_TIMEOUT', 60)
+API_BULK_MAX_OPERATIONS = getattr(settings, 'API_BULK_MAX_OPERATIONS', 5000)
+API_BULK_CONCURRENCY = getattr(settings, 'API_BULK_CONCURRENCY', 8)
+API_IDEMPOTENCY_TIMEOUT = getattr(settings, 'API_IDEMPOTENCY_TIMEOUT',
+                                  60 * 60 * 24)
+# A request that is still marked as running after this long is assumed to
+# have crashed, and may be sent again.
+API_IDEMPOTENCY_RUNNING_TIMEOUT = getattr(
+    settings, 'API_IDEMPOTENCY_RUNNING_TIMEOUT', 10 * 60)
+
+# Payloads smaller than this are not worth compressing.
+GZIP_MIN_LENGTH = 200
+
+re_accepts_gzip = re.compile(r'\bgzip\b')
+
+MEMBER_ROLES = ('member', 'owner', 'moderator')
+
+
+class ApiRequestError(Exception):
+    """Raised for API requests that cannot be answered."""
+
+    def __init__(self, status, message):
+        super(ApiRequestError, self).__init__(message)
+        self.status = status
+
+
+def _json_response(data, status=200):
+    return HttpResponse(json.dumps(data), status=status,
+                        content_type="application/json")
+
+
+def _paging(request):
+    """Returns the ``page`` and ``count`` parameters of a request.
+
+    The page size defaults to ``API_PAGE_SIZE`` and is capped at
+    ``API_MAX_PAGE_SIZE``.
+    """
+    try:
+        page = int(request.GET.get('page', 1))
+        count = int(request.GET.get('count', API_PAGE_SIZE))
+    except ValueError:
+        raise ApiRequestError(400, 'page and count must be integers')
+    if page < 1 or count < 1:
+        raise ApiRequestError(400, 'page and count must be positive')
+    return page, min(count, API_MAX_PAGE_SIZE)
+
+
+def _fields(request):
+    """Returns the field names requested with ``fields=a,b`` or None."""
+    fields = [field.strip()
+              for field in request.GET.get('fields', '').split(',')]
+    return [field for field in fields if field] or None
+
+
+def _project(entry, fields):
+    if fields is None:
+        return entry
+    return dict((field, entry[field]) for field in fields if field in entry)
+
+
+def _call(path):
+    """Calls the Mailman REST API and returns the content of the response.
+    """
+    try:
+        response, content = utils.get_client()._connection.call(path)
+    except HTTPError, e:
+        if e.code == 404:
+            raise ApiRequestError(404, 'Not found')
+        raise ApiRequestError(502, 'Mailman API error')
+    except MailmanConnectionError:
+        raise ApiRequestError(503, 'Mailman API unavailable')
+    return content or {}
+
+
+def _get_page(path, page, count):
+    """Fetches one page of a Mailman collection.
+
+    Returns a tuple of the entries and the total size of the collection.
+    """
+    content = _call('{0}?count={1}&page={2}'.format(path, count, page))
+    return content.get('entries', []), content.get('total_size', 0)
+
+
+def _public_lists():
+    """Returns the entries of the advertised lists.
+
+    Mailman cannot filter the lists by their settings, so without the list
+    snapshot (``LIST_INDEX_SNAPSHOT``) the settings of every list are
+    fetched, like the list index does.
+    """
+    if getattr(settings, 'LIST_INDEX_SNAPSHOT', False):
+        return [snapshot.as_entry() for snapshot in
+                ListSnapshot.objects.visible(only_public=True)]
+    return [entry for entry in _call('lists').get('entries', [])
+            if _call('lists/{0}/config'.format(entry['list_id'])).get(
+                'advertised', False)]
+
+
+def _page_data(request, entries, total_size, page, count):
+    fields = _fields(request)
+    return {
+        'page': page,
+        'count': count,
+        'total_size': total_size,
+        'entries': [_project(entry, fields) for entry in entries],
+    }
+
+
+def _payload_cache_key(request, resource, version):
+    query = urlencode(sorted(request.GET.items()))
+    key = u'{0}?{1}#{2}'.format(resource, query, u':'.join(
+        unicode(part) for part in version))
+    return 'postorius:api:' + hashlib.sha1(key.encode('utf-8')).hexdigest()
+
+
+def cached_json_response(request, resource, build, *version):
+    """Returns the data made by ``build`` as a JSON response.
+
+    The serialized payload is cached for ``API_CACHE_TIMEOUT`` seconds,
+    together with a gzip compressed copy, keyed by the resource, the query
+    string and ``version``. Clients accepting gzip get the compressed copy.
+    Access checks have to be done before, as the payload is shared.
+    """
+    key = _payload_cache_key(request, resource, version)
+    payload = cache.get(key)
+    metrics.CACHE_REQUESTS.inc(cache='api',
+                               result='miss' if payload is None else 'hit')
+    if payload is None:
+        body = json.dumps(build())
+        compressed = None
+        if len(body) >= GZIP_MIN_LENGTH:
+            compressed = compress_string(body)
+            if len(compressed) >= len(body):
+                compressed = None
+        payload = (body, compressed)
+        cache.set(key, payload, API_CACHE_TIMEOUT)
+    body, compressed = payload
+    accepts_gzip = re_accepts_gzip.search(
+        request.META.get('HTTP_ACCEPT_ENCODING', ''))
+    if compressed is not None and accepts_gzip:
+        response = HttpResponse(compressed, content_type="application/json")
+        response['Content-Encoding'] = 'gzip'
+    else:
+        response = HttpResponse(body, content_type="application/json")
+    patch_vary_headers(response, ('Accept-Encoding',))
+    return response
+
+
+def api_view(fn):
+    """Renders ``ApiRequestError`` as a JSON error response."""
+    def wrapper(request, *args, **kwargs):
+        try:
+            return fn(request, *args, **kwargs)
+        except ApiRequestError, e:
+            return _json_response({'error': str(e)}, status=e.status)
+    return wrapper
+
+
 @basic_auth_login
 @loggedin_or_403
 def api_list_index(request):
-    client = utils.get_client()
-    res, content = client._connection.call('lists')
-    return HttpResponse(json.dumps(content['entries']),
-                        content_type="application/json")
+    if getattr(settings, 'LIST_INDEX_SNAPSHOT', False):
+        last_updated = ListSnapshot.objects.last_updated()
+        response = cached_json_response(
+            request, 'snapshot', lambda: [
+                snapshot.as_entry()
+                for snapshot in ListSnapshot.objects.visible()],
+            last_updated)
+        if last_updated is not None:
+            response['Last-Modified'] = http_date(
+                time.mktime(last_updated.timetuple()))
+        return response
+
+    def build():
+        client = utils.get_client()
+        res, content = client._connection.call('lists')
+        return content['entries']
+    return cached_json_response(request, 'list_index', build,
+                                utils.get_cache_generation('lists'))
+
+
+@basic_auth_login
+@loggedin_or_403
+@api_view
+def api_lists(request):
+    """Returns one page of the mailing lists.
+
+    Supports the ``page``, ``count`` and ``fields`` parameters. Like the
+    list index, only superusers get the lists that are not advertised.
+    """
+    page, count = _paging(request)
+    if request.user.is_superuser:
+        def build():
+            entries, total_size = _get_page('lists', page, count)
+            return _page_data(request, entries, total_size, page, count)
+        return cached_json_response(request, 'lists/page', build,
+                                    utils.get_cache_generation('lists'))
+
+    def build_public():
+        entries = _public_lists()
+        return _page_data(request, entries[(page - 1) * count:page * count],
+                          len(entries), page, count)
+    return cached_json_response(request, 'lists/public-page', build_public,
+                                utils.get_cache_generation('lists'),
+                                ListSnapshot.objects.last_updated())
+
+
+@basic_auth_login
+@list_owner_required
+@api_view
+def api_list_members(request, list_id):
+    """Returns one page of the roster of a list.
+
+    Besides ``page``, ``count`` and ``fields``, the ``role`` parameter
+    selects the roster (``member``, ``owner`` or ``moderator``).
+    """
+    role = request.GET.get('role', 'member')
+    if role not in MEMBER_ROLES:
+        raise ApiRequestError(400, 'Unknown role')
+    page, count = _paging(request)
+    path = 'lists/{0}/roster/{1}'.format(list_id, role)
+
+    def build():
+        entries, total_size = _get_page(path, page, count)
+        return _page_data(request, entries, total_size, page, count)
+    return cached_json_response(
+        request, path, build,
+        utils.get_cache_generation('list:{0}'.format(list_id)))
+
+
+def _user_subscriptions(user_id):
+    """Returns the memberships of all addresses of a Mailman user."""
+    connection = utils.get_client()._connection
+    try:
+        response, content = connection.call(
+            'users/{0}/addresses'.format(user_id))
+        subscriptions = []
+        for address in (content or {}).get('entries', []):
+            response, content = connection.call(
+                'members/find', data={'subscriber': address['email']})
+            subscriptions.extend((content or {}).get('entries', []))
+    except HTTPError, e:
+        if e.code == 404:
+            raise ApiRequestError(404, 'Not found')
+        raise ApiRequestError(502, 'Mailman API error')
+    except MailmanConnectionError:
+        raise ApiRequestError(503, 'Mailman API unavailable')
+    return subscriptions
+
+
+def _is_mailman_user(user, user_id):
+    try:
+        response, content = utils.get_client()._connection.call(
+            'users/{0}'.format(user.email))
+    except (HTTPError, MailmanConnectionError):
+        return False
+    return str(content.get('user_id')) == str(user_id)
+
+
+@basic_auth_login
+@loggedin_or_403
+@api_view
+def api_user_subscriptions(request, user_id):
+    """Returns one page of the subscriptions of a Mailman user.
+
+    Only superusers and the user themselves may see the subscriptions.
+    Supports the ``page``, ``count`` and ``fields`` parameters.
+    """
+    if not (request.user.is_superuser or
+            _is_mailman_user(request.user, user_id)):
+        raise PermissionDenied
+    page, count = _paging(request)
+
+    def build():
+        subscriptions = _user_subscriptions(user_id)
+        entries = subscriptions[(page - 1) * count:page * count]
+        return _page_data(request, entries, len(subscriptions), page, count)
+    return cached_json_response(
+        request, 'users/{0}/subscriptions'.format(user_id), build,
+        utils.get_cache_generation('memberships'))
+
+
+def _cursor(request):
+    """Returns the ``cursor`` parameter of an export request."""
+    try:
+        cursor = int(request.GET.get('cursor', 0))
+    except ValueError:
+        raise ApiRequestError(400, 'cursor must be an integer')
+    if cursor < 0:
+        raise ApiRequestError(400, 'cursor must not be negative')
+    return cursor
+
+
+def _iter_entries(path, start=0):
+    """Yields the entries of a Mailman collection, page by page.
+
+    The first ``start`` entries are skipped without fetching the pages
+    they are on.
+    """
+    count = API_EXPORT_PAGE_SIZE
+    page = start // count + 1
+    skip = start % count
+    while True:
+        entries, total_size = _get_page(path, page, count)
+        for entry in entries[skip:]:
+            yield entry
+        if not entries or page * count >= total_size:
+            break
+        page += 1
+        skip = 0
+
+
+def _ndjson_response(request, entries):
+    """Streams entries as newline delimited JSON.
+
+    If Mailman fails during the export, a last line with an ``error`` key
+    is sent. The export can be resumed by passing the number of records
+    received as ``cursor``.
+    """
+    fields = _fields(request)
+
+    def lines():
+        try:
+            for entry in entries:
+                yield json.dumps(_project(entry, fields)) + '\n'
+        except ApiRequestError, e:
+            logger.error('Export failed: %s', e)
+            yield json.dumps({'error': str(e)}) + '\n'
+    return StreamingHttpResponse(lines(),
+                                 content_type='application/x-ndjson')
+
+
+def _with_preferences(members):
+    connection = utils.get_client()._connection
+    for member in members:
+        try:
+            response, preferences = connection.call(
+                'members/{0}/preferences'.format(member['member_id']))
+        except HTTPError:
+            raise ApiRequestError(502, 'Mailman API error')
+        except MailmanConnectionError:
+            raise ApiRequestError(503, 'Mailman API unavailable')
+        member['preferences'] = dict(
+            (key, value) for key, value in (preferences or {}).items()
+            if key not in ('http_etag', 'self_link'))
+        yield member
+
+
+def _without_password(users):
+    for user in users:
+        user.pop('password', None)
+        yield user
+
+
+@basic_auth_login
+@superuser_or_403
+@api_view
+def api_export_lists(request):
+    """Streams all mailing lists as NDJSON."""
+    return _ndjson_response(request, _iter_entries('lists', _cursor(request)))
+
+
+@basic_auth_login
+@superuser_or_403
+@api_view
+def api_export_members(request):
+    """Streams the memberships of all lists as NDJSON.
+
+    Every record contains the list, address, role and delivery mode. With
+    ``preferences=1`` the delivery preferences of the membership are
+    added, at the cost of one more request to Mailman per record.
+    """
+    members = _iter_entries('members', _cursor(request))
+    if request.GET.get('preferences') == '1':
+        members = _with_preferences(members)
+    return _ndjson_response(request, members)
+
+
+@basic_auth_login
+@superuser_or_403
+@api_view
+def api_export_users(request):
+    """Streams all Mailman users as NDJSON."""
+    return _ndjson_response(
+        request, _without_password(_iter_entries('users', _cursor(request))))
+
+
+@basic_auth_login
+@loggedin_or_403
+def api_token(request):
+    """Returns a token to send as ``Authorization: Token <token>``."""
+    return _json_response({'token': make_api_token(request.user),
+                           'expires_in': API_TOKEN_MAX_AGE})
+
+
+SUBSCRIBE_OPTIONS = ('display_name', 'delivery_mode', 'pre_verified',
+                     'pre_confirmed', 'pre_approved')
+
+
+def _list_owners(connection, list_id):
+    try:
+        response, content = connection.call(
+            'lists/{0}/roster/owner'.format(list_id))
+    except HTTPError:
+        return set()
+    except MailmanConnectionError:
+        raise ApiRequestError(503, 'Mailman API unavailable')
+    return set(owner['email'] for owner in (content or {}).get('entries', []))
+
+
+def _subscribe(connection, operation):
+    data = dict(list_id=operation['list_id'],
+                subscriber=operation['address'])
+    options = operation.get('options') or {}
+    for option in SUBSCRIBE_OPTIONS:
+        if option in options:
+            data[option] = options[option]
+    try:
+        response, content = connection.call('members', data)
+    except HTTPError, e:
+        if e.code == 409:
+            return {'status': 'unchanged'}
+        raise
+    if content and 'token' in content:
+        return {'status': 'pending'}
+    return {'status': 'subscribed'}
+
+
+def _unsubscribe(connection, operation):
+    response, content = connection.call(
+        'members/find', data=dict(list_id=operation['list_id'],
+                                  subscriber=operation['address']))
+    members = (content or {}).get('entries', [])
+    # Only the member role is removed, owners and moderators stay.
+    members = [member for member in members
+               if member.get('role', 'member') == 'member']
+    if not members:
+        return {'status': 'unchanged'}
+    for member in members:
+        connection.call(member['self_link'], method='DELETE')
+    return {'status': 'unsubscribed'}
+
+
+BULK_ACTIONS = {
+    'subscribe': _subscribe,
+    'unsubscribe': _unsubscribe,
+}
+
+
+def _run_operation(operation):
+    connection = utils.get_client()._connection
+    try:
+        return BULK_ACTIONS[operation['action']](connection, operation)
+    except HTTPError, e:
+        return {'status': 'error', 'code': e.code, 'error': e.msg}
+    except MailmanConnectionError:
+        return {'status': 'error', 'code': 503,
+                'error': 'Mailman API unavailable'}
+
+
+def _validate_operation(operation):
+    if not isinstance(operation, dict):
+        return 'Operations must be objects'
+    for key in ('list_id', 'address', 'action'):
+        if not operation.get(key):
+            return 'Missing {0}'.format(key)
+        if not isinstance(operation[key], basestring):
+            return '{0} must be a string'.format(key)
+    if operation['action'] not in BULK_ACTIONS:
+        return 'Unknown action'
+
+
+@csrf_exempt
+@require_POST
+@basic_auth_login
+@csrf_protect_sessions
+@loggedin_or_403
+@api_view
+def api_bulk_memberships(request):
+    """Subscribes and unsubscribes addresses in bulk.
+
+    The request body is a JSON object with a list of ``operations``, each
+    with ``list_id``, ``address``, ``action`` (``subscribe`` or
+    ``unsubscribe``) and optional subscription ``options``. Operations run
+    concurrently, at most ``API_BULK_CONCURRENCY`` at a time, except that
+    operations on the same membership run in order. The response holds
+    one result per operation, in order.
+
+    Requests sent with an ``Idempotency-Key`` header are only processed
+    once: repeating them returns the stored results. Requests authenticated
+    by the session cookie instead of API credentials need a CSRF token.
+    """
+    content_type = request.META.get('CONTENT_TYPE', '').split(';')[0]
+    if content_type.strip().lower() != 'application/json':
+        raise ApiRequestError(415, 'Expected application/json')
+    idempotency_key = request.META.get('HTTP_IDEMPOTENCY_KEY')
+    if idempotency_key:
+        cache_key = 'postorius:api:bulk:' + hashlib.sha1(u'{0}:{1}'.format(
+            request.user.pk, idempotency_key).encode('utf-8')).hexdigest()
+        stored = cache.get(cache_key)
+        if stored == 'running':
+            raise ApiRequestError(409, 'Request is still being processed')
+        if stored is not None:
+            return _json_response(stored)
+        if not cache.add(cache_key, 'running',
+                         API_IDEMPOTENCY_RUNNING_TIMEOUT):
+            raise ApiRequestError(409, 'Request is still being processed')
+    results = None
+    try:
+        results = _bulk_memberships(request)
+    finally:
+        if idempotency_key and results is None:
+            cache.delete(cache_key)
+        elif idempotency_key:
+            cache.set(cache_key, results, API_IDEMPOTENCY_TIMEOUT)
+    return _json_response(results)
+
+
+def _bulk_memberships(request):
+    try:
+        operations = json.loads(request.body)['operations']
+    except (ValueError, KeyError, TypeError):
+        raise ApiRequestError(400, 'Expected a JSON object with operations')
+    if not isinstance(operations, list):
+        raise ApiRequestError(400, 'operations must be a list')
+    if len(operations) > API_BULK_MAX_OPERATIONS:
+        raise ApiRequestError(400, 'Too many operations')
+    results = [None] * len(operations)
+    pending = []
+    owned_lists = {}
+    connection = utils.get_client()._connection
+    for index, operation in enumerate(operations):
+        error = _validate_operation(operation)
+        if error is not None:
+            results[index] = {'status': 'error', 'code': 400, 'error': error}
+            continue
+        list_id = operation['list_id']
+        if not request.user.is_superuser:
+            if list_id not in owned_lists:
+                owned_lists[list_id] = (
+                    request.user.email in _list_owners(connection, list_id))
+            if not owned_lists[list_id]:
+                results[index] = {'status': 'error', 'code': 403,
+                                  'error': 'Permission denied'}
+                continue
+        pending.append(index)
+    if pending:
+        # Operations on the same membership run one after the other, in
+        # the order they were sent.
+        memberships = OrderedDict()
+        for index in pending:
+            memberships.setdefault((operations[index]['list_id'],
+                                    operations[index]['address']),
+                                   []).append(index)
+
+        def run(indexes):
+            return [(index, _run_operation(operations[index]))
+                    for index in indexes]
+        pool = ThreadPool(min(API_BULK_CONCURRENCY, len(memberships)))
+        try:
+            done = pool.map(run, memberships.values())
+        finally:
+            pool.close()
+            pool.join()
+        for membership_results in done:
+            for index, result in membership_results:
+                results[index] = result
+        for list_id in set(operations[index]['list_id']
+                           for index in pending):
+            utils.invalidate_list(list_id)
+    summary = {}
+    for operation, result in zip(operations, results):
+        summary[result['status']] = summary.get(result['status'], 0) + 1
+        action = (operation.get('action') if isinstance(operation, dict)
+                  else None)
+        metrics.MASS_OPERATIONS.inc(
+            source='api', result=result['status'],
+            operation=action if action in BULK_ACTIONS else 'invalid')
+    return {'results': results, 'summary': summary}
@@ -16,10 +16,12 @@
 # You should have received a copy of the GNU General Public License along with
 # Postorius.  If not, see <http://www.gnu.org/licenses/>.
 
+from multiprocessing.pool import ThreadPool
 
 from django.conf import settings
 from django.shortcuts import render_to_response, redirect
 from django.template import Context, loader, RequestContext
+from django.utils.cache import patch_vary_headers
 from django.views.generic import TemplateView, View
 
 from postorius.models import (Domain, List, Member, MailmanUser,
@@ -46,38 +48,117 @@ class MailingListView(TemplateView, MailmanClientMixin):
     """
 
     def _get_list(self, list_id, page):
-        return List.objects.get_or_404(fqdn_listname=list_id)
-
-    def _is_list_owner(self, user, mailing_list):
-        if not user.is_authenticated():
-            return False
-        if user.email in mailing_list.owners:
-            return True
-        return False
-
-    def _is_list_moderator(self, user, mailing_list):
-        if not user.is_authenticated():
-            return False
-        if user.email in mailing_list.moderators:
-            return True
-        return False
+        return List.objects.get_for_request(self.request, list_id)
 
     def dispatch(self, request, *args, **kwargs):
-        # get the list object.
+        # get the list object, this also sets the list roles of the user.
         if 'list_id' in kwargs:
             try:
                 self.mailing_list = self._get_list(kwargs['list_id'],
                                                    int(kwargs.get('page', 1)))
             except MailmanApiError:
                 return utils.render_api_error(request)
-            request.user.is_list_owner = self._is_list_owner(
-                request.user, self.mailing_list)
-            request.user.is_list_moderator = self._is_list_moderator(
-                request.user, self.mailing_list)
         # set the template
         if 'template' in kwargs:
             self.template = kwargs['template']
-        return super(MailingListView, self).dispatch(request, *args, **kwargs)
+        response = super(MailingListView, self).dispatch(request, *args,
+                                                         **kwargs)
+        # List tabs loaded via AJAX only get the main block of the page.
+        patch_vary_headers(response, ('X-Requested-With',))
+        return response
+
+
+class MembershipRow(object):
+
+    """A subscription of a user, built from a ``members/find`` entry.
+
+    The preferences of the membership are only fetched from Mailman when
+    they are used.
+    """
+
+    def __init__(self, connection, entry):
+        self._connection = connection
+        self._preferences = None
+        self.entry = entry
+        self.mlist = entry['list_id']
+        self.role = entry['role']
+        self.address = entry['email']
+
+    @property
+    def preferences(self):
+        if self._preferences is None:
+            response, content = self._connection.call(
+                '{0}/preferences'.format(self.entry['self_link']))
+            self._preferences = content or {}
+        return self._preferences
+
+    @property
+    def delivery_mode(self):
+        if 'delivery_mode' in self.entry:
+            return self.entry['delivery_mode']
+        return self.preferences.get('delivery_mode')
+
+
+def prefetch_preferences(rows):
+    """Fetches the preferences of membership rows concurrently.
+
+    At most ``PREFERENCES_FETCH_CONCURRENCY`` requests are made at a time.
+    """
+    rows = [row for row in rows if row._preferences is None]
+    if len(rows) < 2:
+        return
+    pool = ThreadPool(min(len(rows), getattr(
+        settings, 'PREFERENCES_FETCH_CONCURRENCY', 8)))
+    try:
+        pool.map(lambda row: row.preferences, rows)
+    finally:
+        pool.close()
+
+
+class RequestMailmanUser(object):
+
+    """Wraps a mailmanclient user object for the duration of a request.
+
+    The addresses and memberships are fetched once. Subscriptions are
+    built from the ``members/find`` entries, so reading their attributes
+    needs no further requests.
+    """
+
+    def __init__(self, user):
+        self._user = user
+        self._addresses = None
+        self._membership_entries = None
+        self._subscriptions = None
+
+    def __getattr__(self, name):
+        return getattr(self._user, name)
+
+    @property
+    def addresses(self):
+        if self._addresses is None:
+            self._addresses = list(self._user.addresses)
+        return self._addresses
+
+    @property
+    def membership_entries(self):
+        if self._membership_entries is None:
+            entries = []
+            for address in self.addresses:
+                response, content = self._connection.call(
+                    'members/find', data={'subscriber': address})
+                entries.extend((content or {}).get('entries', []))
+            self._membership_entries = entries
+        return self._membership_entries
+
+    @property
+    def subscriptions(self):
+        if self._subscriptions is None:
+            subscriptions = []
+            for entry in self.membership_entries:
+                subscriptions.append(
+                    utils.member_from_entry(self._connection, entry))
+            self._subscriptions = subscriptions
+        return self._subscriptions
 
 
 class MailmanUserView(TemplateView, MailmanClientMixin):
@@ -86,6 +167,7 @@ class MailmanUserView(TemplateView, MailmanClientMixin):
     user object.
 
     Sets self.mm_user to list object if user_id in **kwargs.
+    The user is looked up once per request.
     """
 
     def _get_first_address(self, user_obj):
@@ -93,8 +175,14 @@ class MailmanUserView(TemplateView, MailmanClientMixin):
             return address
 
     def _get_user(self, user_id):
+        users = getattr(self.request, '_mailman_users', None)
+        if users is None:
+            users = self.request._mailman_users = {}
+        if user_id in users:
+            return users[user_id]
         try:
-            user_obj = MailmanUser.objects.get(address=user_id)
+            user_obj = RequestMailmanUser(
+                MailmanUser.objects.get(address=user_id))
         except Mailman404Error:
             user_obj = None
         # replace display_name with first address if display_name is not set
@@ -103,8 +191,15 @@ class MailmanUserView(TemplateView, MailmanClientMixin):
                user_obj.display_name is None):
                 user_obj.display_name = ''
             user_obj.first_address = self._get_first_address(user_obj)
+        users[user_id] = user_obj
         return user_obj
 
+    def _require_user(self):
+        """Returns self.mm_user or raises Mailman404Error."""
+        if getattr(self, 'mm_user', None) is None:
+            raise Mailman404Error('Mailman resource could not be found.')
+        return self.mm_user
+
     def _get_list(self, list_id):
         if getattr(self, 'lists', None) is None:
             self.lists = {}
@@ -115,14 +210,9 @@ class MailmanUserView(TemplateView, MailmanClientMixin):
     def _get_memberships(self):
         memberships = []
         if (self.mm_user):
-            for m in self.mm_user.subscriptions:
-                mlist = m.list_id
+            for entry in self.mm_user.membership_entries:
                 memberships.append(
-                    dict(
-                        mlist=mlist,
-                        role=m.role,
-                        preferences=m.preferences,
-                        address=m.address))
+                    MembershipRow(self.mm_user._connection, entry))
         return memberships
 
     def dispatch(self, request, *args, **kwargs):
@@ -17,23 +17,33 @@
 # Postorius.  If not, see <http://www.gnu.org/licenses/>.
 import logging
 import csv
+import json
+import hashlib
 
-from django.http import HttpResponse
+from django.conf import settings
+from django.http import HttpResponse, HttpResponseNotModified
 
 from django.contrib import messages
 from django.contrib.auth.decorators import (login_required,
                                             user_passes_test)
+from django.core.cache import cache
 from django.core.urlresolvers import reverse
 from django.shortcuts import render_to_response, redirect
 from django.template import RequestContext
+from django.template.loader import render_to_string
 from django.core.validators import validate_email
 from django.core.exceptions import ValidationError
+from django.core.paginator import EmptyPage, PageNotAnInteger, Paginator
+from django.utils.cache import patch_cache_control
 from django.utils.decorators import method_decorator
+from django.utils.functional import SimpleLazyObject
+from django.utils.http import parse_etags, quote_etag
+from django.views.decorators.vary import vary_on_headers
 from django.utils.translation import gettext as _
 from urllib2 import HTTPError
 
-from postorius import utils
-from postorius.models import (Domain, List, MailmanApiError)
+from postorius import metrics, utils
+from postorius.models import (Domain, List, ListSnapshot, MailmanApiError)
 from postorius.forms import *
 from postorius.auth.decorators import *
 from postorius.views.generic import MailingListView
@@ -64,6 +74,7 @@ class ListMembersView(MailingListView):
                 try:
                     self.mailing_list.add_owner(
                         owner_form.cleaned_data['owner_email'])
+                    utils.invalidate_list(self.mailing_list.list_id)
                     messages.success(
                         request, _('%s has been added as list owner.'
                                    % request.POST['owner_email']))
@@ -75,6 +86,7 @@ class ListMembersView(MailingListView):
                 try:
                     self.mailing_list.add_moderator(
                         moderator_form.cleaned_data['moderator_email'])
+                    utils.invalidate_list(self.mailing_list.list_id)
                     messages.success(
                         request, _('%s has been added as list moderator.'
                                    % request.POST['moderator_email']))
@@ -164,9 +176,14 @@ class ListMetricsView(MailingListView):
 
     @method_decorator(list_owner_required)
     def get(self, request, list_id):
-        return render_to_response('postorius/lists/metrics.html',
-                                  {'list': self.mailing_list},
-                                  context_instance=RequestContext(request))
+        list_settings = self.mailing_list.settings
+        etag = utils.make_etag(request, list_settings.get('http_etag'))
+        return utils.conditional_response(
+            request, etag, lambda: render_to_response(
+                'postorius/lists/metrics.html',
+                {'list': self.mailing_list,
+                 'list_settings': list_settings},
+                context_instance=RequestContext(request)))
 
 
 class ListSummaryView(MailingListView):
@@ -174,16 +191,15 @@ class ListSummaryView(MailingListView):
     """
 
     def get(self, request, list_id):
-        try:
-            mm_user = MailmanUser.objects.get(address=request.user.email)
-            user_emails = [str(address) for address in getattr(mm_user, 'addresses')]
-            # TODO:maxking - add the clause below in above
-            # statement after the subscription policy is sorted out
-            # if address.verified_on is not None]
-        except Mailman404Error:
-            # The user does not have a mailman user associated with it.
-            user_emails = [request.user.email]
-        except AttributeError:
+        if request.user.is_authenticated():
+            try:
+                user_emails = MailmanUser.objects.get_addresses(request.user)
+                # TODO:maxking - only use verified addresses after the
+                # subscription policy is sorted out
+            except Mailman404Error:
+                # The user does not have a mailman user associated with it.
+                user_emails = [request.user.email]
+        else:
             # Anonymous User, everyone logged out.
             user_emails = None
 
@@ -198,7 +214,14 @@ class ListSummaryView(MailingListView):
                 else:
                     userSubscribed = True
                     subscribed_address = address
+        # The settings are only fetched if the cached list header
+        # fragment has expired.
+        list_settings = SimpleLazyObject(lambda: self.mailing_list.settings)
+        list_generation = utils.get_cache_generation(
+            'list:{0}'.format(self.mailing_list.list_id))
         data =  {'list': self.mailing_list,
+                 'list_generation': list_generation,
+                 'list_settings': list_settings,
                  'userSubscribed': userSubscribed,
                  'subscribed_address': subscribed_address}
         if user_emails is not None:
@@ -207,9 +230,15 @@ class ListSummaryView(MailingListView):
             data['subscribe_form'] = ListSubscribe(user_emails)
         else:
             data['change_subscription_form'] = None
-        return render_to_response(
-            'postorius/lists/summary.html', data,
-            context_instance=RequestContext(request))
+        # The settings are not fetched for the ETag, so changes made in
+        # Mailman directly only show up when the time bucket changes.
+        etag = utils.make_etag(request, list_generation,
+                               utils.etag_time_bucket(),
+                               user_emails, subscribed_address)
+        return utils.conditional_response(
+            request, etag, lambda: render_to_response(
+                'postorius/lists/summary.html', data,
+                context_instance=RequestContext(request)))
 
 class ChangeSubscriptionView(MailingListView):
     """Change mailing list subscription
@@ -218,8 +247,7 @@ class ChangeSubscriptionView(MailingListView):
     @method_decorator(login_required)
     def post(self, request, list_id):
         try:
-            mm_user = MailmanUser.objects.get(address=request.user.email)
-            user_emails = [str(address) for address in mm_user.addresses]
+            user_emails = MailmanUser.objects.get_addresses(request.user)
             form = ListSubscribe(user_emails, request.POST)
             for address in user_emails:
                 try:
@@ -236,6 +264,7 @@ class ChangeSubscriptionView(MailingListView):
                 else:
                     self.mailing_list.unsubscribe(old_email)
                     self.mailing_list.subscribe(email)
+                    utils.invalidate_list(self.mailing_list.list_id)
                     messages.success(request,
                         'Subscription changed to {} address'.format(email))
             else:
@@ -260,16 +289,18 @@ class ListSubscribeView(MailingListView):
         """
         try:
             try:
-                mm_user = MailmanUser.objects.get(address=request.user.email)
-                user_addresses = [str(address) for address in mm_user.addresses]
+                user_addresses = MailmanUser.objects.get_addresses(
+                    request.user)
             except Mailman404Error:
-                mm_user = None
                 user_addresses = (request.POST.get('email'),)
+                # Subscribing may create the Mailman user.
+                MailmanUser.objects.invalidate(request.user)
             form = ListSubscribe(user_addresses, request.POST)
             if form.is_valid():
                 email = request.POST.get('email')
                 response = self.mailing_list.subscribe(
                     email, pre_verified=True, pre_confirmed=True)
+                utils.invalidate_list(self.mailing_list.list_id)
                 if type(response) == dict and response.get('token_owner') == \
                         'moderator':
                     messages.success(
@@ -299,6 +330,7 @@ class ListUnsubscribeView(MailingListView):
         email = kwargs['email']
         try:
             self.mailing_list.unsubscribe(email)
+            utils.invalidate_list(self.mailing_list.list_id)
             messages.success(request,
                              '%s has been unsubscribed from this list.' %
                              email)
@@ -319,6 +351,7 @@ class ListMassSubscribeView(MailingListView):
                                   {'form': form, 'list': self.mailing_list},
                                   context_instance=RequestContext(request))
 
+    @method_decorator(list_owner_required)
     def post(self, request, *args, **kwargs):
         form = ListMassSubscription(request.POST)
         if not form.is_valid():
@@ -330,6 +363,9 @@ class ListMassSubscribeView(MailingListView):
                     validate_email(email)
                     self.mailing_list.subscribe(address=email, pre_verified=True,
                                                 pre_confirmed=True)
+                    metrics.MASS_OPERATIONS.inc(source='web',
+                                                operation='subscribe',
+                                                result='subscribed')
                     messages.success(
                         request,
                         'The address %s has been subscribed to %s.' %
@@ -337,11 +373,15 @@ class ListMassSubscribeView(MailingListView):
                 except MailmanApiError:
                     return utils.render_api_error(request)
                 except HTTPError, e:
+                    metrics.MASS_OPERATIONS.inc(source='web',
+                                                operation='subscribe',
+                                                result='error')
                     messages.error(request, e)
                 except ValidationError:
                     messages.error(request,
                                    'The email address %s is not valid.' %
                                    email)
+            utils.invalidate_list(self.mailing_list.list_id)
         return redirect('mass_subscribe', self.mailing_list.list_id)
 
 
@@ -367,19 +407,24 @@ class ListMassRemovalView(MailingListView):
                 try:
                     validate_email(email)
                     self.mailing_list.unsubscribe(email.lower())
+                    metrics.MASS_OPERATIONS.inc(source='web',
+                                                operation='unsubscribe',
+                                                result='unsubscribed')
                     messages.success(request,
                                     'The address %s has been unsubscribed from %s.' %
                                     (email, self.mailing_list.fqdn_listname))
                 except MailmanApiError:
                     return utils.render_api_error(request)
-                except HTTPError, e:
-                    messages.error(request, e)
-                except ValueError, e:
+                except (HTTPError, ValueError), e:
+                    metrics.MASS_OPERATIONS.inc(source='web',
+                                                operation='unsubscribe',
+                                                result='error')
                     messages.error(request, e)
                 except ValidationError:
                     messages.error(request,
                                   'The email address %s is not valid.' %
                                   email)
+            utils.invalidate_list(self.mailing_list.list_id)
         return redirect('mass_removal', self.mailing_list.list_id)
 
 
@@ -447,6 +492,7 @@ def list_new(request, template='postorius/lists/new.html'):
                 list_settings["description"] = form.cleaned_data['description']
                 list_settings["advertised"] = form.cleaned_data['advertised']
                 list_settings.save()
+                utils.invalidate_list(mailing_list.list_id)
                 messages.success(request, _("List created"))
                 return redirect("list_summary",
                                 list_id=mailing_list.list_id)
@@ -465,27 +511,81 @@ def list_new(request, template='postorius/lists/new.html'):
                               context_instance=RequestContext(request))
 
 
+def _list_index_etag(request, *args, **kwargs):
+    query = request.GET.get('q', '').strip()
+    if query or getattr(settings, 'LIST_INDEX_SNAPSHOT', False):
+        return utils.make_etag(request, ListSnapshot.objects.last_updated(),
+                               utils.get_cache_generation('lists'), query,
+                               request.GET.get('page'))
+    # Changes made outside of Postorius are only picked up when the time
+    # bucket changes. Fetching the lists collection for the ETag would
+    # double the REST calls whenever the page is rendered.
+    return utils.make_etag(request, utils.get_cache_generation('lists'),
+                           utils.etag_time_bucket())
+
+
+@utils.etag_condition(_list_index_etag)
 def list_index(request, template='postorius/lists/index.html'):
     """Show a table of all public mailing lists.
+
+    If ``LIST_INDEX_SNAPSHOT`` is set, the lists are taken from the
+    snapshot stored by the ``snapshot_lists`` command. Once a snapshot
+    exists, the ``q`` parameter searches the names and descriptions of
+    the lists in it.
     """
     lists = []
     error = None
     only_public = True
     if request.user.is_superuser:
         only_public = False
+    snapshot_updated = None
+    snapshot_stale = False
+    snapshot_missing = False
+    search_page = None
+    query = request.GET.get('q', '').strip()
+    search_enabled = (getattr(settings, 'LIST_INDEX_SNAPSHOT', False) or
+                      ListSnapshot.objects.exists())
     try:
-        lists = List.objects.all(only_public=only_public)
+        if query and search_enabled:
+            paginator = Paginator(
+                ListSnapshot.objects.search(query, only_public=only_public),
+                getattr(settings, 'LIST_SEARCH_PAGE_SIZE', 50))
+            try:
+                search_page = paginator.page(request.GET.get('page', 1))
+            except PageNotAnInteger:
+                search_page = paginator.page(1)
+            except EmptyPage:
+                search_page = paginator.page(paginator.num_pages)
+            lists = search_page.object_list
+            snapshot_updated = ListSnapshot.objects.last_updated()
+            snapshot_stale = ListSnapshot.objects.is_stale()
+        elif getattr(settings, 'LIST_INDEX_SNAPSHOT', False):
+            lists = ListSnapshot.objects.visible(only_public=only_public)
+            snapshot_updated = ListSnapshot.objects.last_updated()
+            snapshot_stale = ListSnapshot.objects.is_stale()
+            snapshot_missing = snapshot_updated is None
+        else:
+            lists = List.objects.all(only_public=only_public)
         logger.debug(lists)
     except MailmanApiError:
         return utils.render_api_error(request)
-    choosable_domains = _get_choosable_domains(request)
     if request.method == 'POST':
         return redirect("list_summary", list_id=request.POST["list"])
     else:
+        # The domain count is only used for the superuser's buttons.
+        domain_count = 0
+        if request.user.is_superuser:
+            domain_count = len(_get_choosable_domains(request))
         return render_to_response(template,
                                   {'error': error,
                                    'lists': lists,
-                                   'domain_count': len(choosable_domains)},
+                                   'query': query,
+                                   'search_page': search_page,
+                                   'search_enabled': search_enabled,
+                                   'snapshot_updated': snapshot_updated,
+                                   'snapshot_stale': snapshot_stale,
+                                   'snapshot_missing': snapshot_missing,
+                                   'domain_count': domain_count},
                                   context_instance=RequestContext(request))
 
 
@@ -529,9 +629,13 @@ def list_subscriptions(request, option=None, list_id=None,
                     the_list.subscribe(
                         address=email,
                         display_name=form.cleaned_data.get('display_name', ''))
+                    utils.invalidate_list(the_list.list_id)
                     return render_to_response(
                         'postorius/lists/summary.html',
                         {'list': the_list, 'option': option,
+                         'list_settings': the_list.settings,
+                         'list_generation': utils.get_cache_generation(
+                             'list:{0}'.format(the_list.list_id)),
                          'message': _("Subscribed ") + email},
                         context_instance=RequestContext(request))
                 except HTTPError, e:
@@ -550,10 +654,14 @@ def list_subscriptions(request, option=None, list_id=None,
                 # the form was valid so try to unsubscribe the user
                 try:
                     email = form.cleaned_data["email"]
-                    the_list.unsubscribe(address=email)
+                    the_list.unsubscribe(email)
+                    utils.invalidate_list(the_list.list_id)
                     return render_to_response(
                         'postorius/lists/summary.html',
                         {'list': the_list,
+                         'list_settings': the_list.settings,
+                         'list_generation': utils.get_cache_generation(
+                             'list:{0}'.format(the_list.list_id)),
                          'message': _("Unsubscribed ") + email},
                         context_instance=RequestContext(request))
                 except ValueError, e:
@@ -590,16 +698,18 @@ def list_subscriptions(request, option=None, list_id=None,
                               context_instance=RequestContext(request))
 
 
+@vary_on_headers('X-Requested-With')
 @list_owner_required
 def list_delete(request, list_id):
     """Deletes a list but asks for confirmation first.
     """
     try:
-        the_list = List.objects.get_or_404(fqdn_listname=list_id)
+        the_list = List.objects.get_for_request(request, list_id)
     except MailmanApiError:
         return utils.render_api_error(request)
     if request.method == 'POST':
         the_list.delete()
+        utils.invalidate_list(list_id)
         return redirect("list_index")
     else:
         submit_url = reverse('list_delete',
@@ -612,19 +722,101 @@ def list_delete(request, list_id):
             context_instance=RequestContext(request))
 
 
+# Seconds a held queue snapshot is remembered for incremental polling.
+HELD_CURSOR_TIMEOUT = 60 * 60
+
+
+def _held_cursor_key(list_id, cursor):
+    return 'postorius:held:{0}:{1}'.format(list_id, cursor)
+
+
+def _held_cursor(list_id, held):
+    """Store the request ids of a held queue and return a cursor for them.
+
+    The cursor is a fingerprint of the queue contents, so it doubles as the
+    ETag of the poll endpoint.
+    """
+    request_ids = sorted(msg['request_id'] for msg in held)
+    cursor = hashlib.sha1(
+        '{0}:{1}'.format(list_id, request_ids).encode('utf-8')).hexdigest()
+    cache.set(_held_cursor_key(list_id, cursor), request_ids,
+              HELD_CURSOR_TIMEOUT)
+    return cursor
+
+
+@vary_on_headers('X-Requested-With')
 @list_moderator_required
 def list_held_messages(request, list_id):
     """Shows a list of held messages.
     """
     try:
-        the_list = List.objects.get_or_404(fqdn_listname=list_id)
+        the_list = List.objects.get_for_request(request, list_id)
+        held_messages = the_list.held
     except MailmanApiError:
         return utils.render_api_error(request)
     return render_to_response('postorius/lists/held_messages.html',
-                              {'list': the_list},
+                              {'list': the_list,
+                               'held_messages': held_messages,
+                               'held_cursor': _held_cursor(the_list.list_id,
+                                                           held_messages)},
                               context_instance=RequestContext(request))
 
 
+@list_moderator_required
+def list_held_messages_poll(request, list_id):
+    """Returns the held messages added or removed since a given cursor.
+
+    The client passes the cursor of its last response in the ``cursor``
+    query parameter (and that cursor as ``If-None-Match``, which is answered
+    with a 304 if the queue did not change). If the cursor is unknown or
+    has expired, all held messages are returned and ``reset`` is set.
+    """
+    try:
+        # Loaded by the decorator already.
+        the_list = List.objects.get_for_request(request, list_id)
+        held_messages = the_list.held
+    except MailmanApiError:
+        return HttpResponse(
+            json.dumps({'error': 'Mailman REST API not available.'}),
+            status=503, content_type='application/json')
+    cursor = _held_cursor(the_list.list_id, held_messages)
+    etag = quote_etag(cursor)
+    if cursor in parse_etags(request.META.get('HTTP_IF_NONE_MATCH', '')):
+        response = HttpResponseNotModified()
+    else:
+        known_ids = None
+        if request.GET.get('cursor'):
+            known_ids = cache.get(
+                _held_cursor_key(the_list.list_id, request.GET['cursor']))
+        if known_ids is None:
+            known_ids = set()
+            reset = True
+        else:
+            known_ids = set(known_ids)
+            reset = False
+        current_ids = set(msg['request_id'] for msg in held_messages)
+        # The rows are rendered with the template of the page, so that
+        # they look and work the same.
+        added = [dict(request_id=msg['request_id'],
+                      html=render_to_string(
+                          'postorius/lists/held_message_row.html',
+                          {'list': the_list, 'msg': msg},
+                          context_instance=RequestContext(request)))
+                 for msg in held_messages
+                 if msg['request_id'] not in known_ids]
+        removed = sorted(known_ids - current_ids)
+        response = HttpResponse(
+            json.dumps({'cursor': cursor,
+                        'reset': reset,
+                        'count': len(held_messages),
+                        'added': added,
+                        'removed': removed}),
+            content_type='application/json')
+    response['ETag'] = etag
+    patch_cache_control(response, private=True, max_age=0)
+    return response
+
+
 @list_moderator_required
 def accept_held_message(request, list_id, msg_id):
     """Accepts a held message.
@@ -689,12 +881,13 @@ def reject_held_message(request, list_id, msg_id):
     return redirect('list_held_messages', the_list.list_id)
 
 
+@vary_on_headers('X-Requested-With')
 @list_moderator_required
 def list_subscription_requests(request, list_id):
     """Shows a list of held messages.
     """
     try:
-        m_list = utils.get_client().get_list(list_id)
+        m_list = List.objects.get_for_request(request, list_id)
     except MailmanApiError:
         return utils.render_api_error(request)
     return render_to_response('postorius/lists/subscription_requests.html',
@@ -721,6 +914,7 @@ def handle_subscription_request(request, list_id, request_id, action):
         m_list = utils.get_client().get_list(list_id)
         # Moderate request and add feedback message to session.
         m_list.moderate_request(request_id, action)
+        utils.invalidate_list(m_list.list_id)
         messages.success(request, confirmation_messages[action])
     except MailmanApiError:
         return utils.render_api_error(request)
@@ -751,6 +945,7 @@ SETTINGS_FORMS = {
 }
 
 
+@vary_on_headers('X-Requested-With')
 @list_owner_required
 def list_settings(request, list_id=None, visible_section=None,
                   template='postorius/lists/settings.html'):
@@ -769,7 +964,7 @@ def list_settings(request, list_id=None, visible_section=None,
         visible_section = 'list_identity'
     form_class = SETTINGS_FORMS.get(visible_section)
     try:
-        m_list = List.objects.get_or_404(fqdn_listname=list_id)
+        m_list = List.objects.get_for_request(request, list_id)
         list_settings = m_list.settings
     except MailmanApiError, HTTPError:
         return utils.render_api_error(request)
@@ -782,6 +977,7 @@ def list_settings(request, list_id=None, visible_section=None,
                     for key in form.fields.keys():
                         list_settings[key] = form.cleaned_data[key]
                     list_settings.save()
+                    utils.invalidate_list(m_list.list_id)
                     messages.success(request,
                                      _('The settings have been updated.'))
                 except HTTPError as e:
@@ -824,6 +1020,7 @@ def remove_role(request, list_id=None, role=None, address=None,
     if request.method == 'POST':
         try:
             the_list.remove_role(role, address)
+            utils.invalidate_list(the_list.list_id)
         except MailmanApiError:
             return utils.render_api_error(request)
         except HTTPError as e:
@@ -889,8 +1086,11 @@ def remove_all_subscribers(request, list_id):
             return redirect('mass_removal', mlist.list_id)
         if request.method == 'POST':
             try:
-                for names in mlist.members:
-                    mlist.unsubscribe(names.email)
+                try:
+                    for names in mlist.members:
+                        mlist.unsubscribe(names.email)
+                finally:
+                    utils.invalidate_list(mlist.list_id)
                 messages.success(request,
                                 'All members have been unsubscribed from the list.')
                 return redirect('list_members', mlist.list_id)
@@ -903,13 +1103,14 @@ def remove_all_subscribers(request, list_id):
         return utils.render_api_error(request)
 
 
+@vary_on_headers('X-Requested-With')
 @list_owner_required
 def list_archival_options(request, list_id):
     """
     Activate or deactivate list archivers.
     """
     # Get the list and cache the archivers property.
-    m_list = utils.get_client().get_list(list_id)
+    m_list = List.objects.get_for_request(request, list_id)
     archivers = m_list.archivers
 
     # Process form submission.
@@ -29,15 +29,17 @@ from django.contrib.auth.decorators import (login_required,
 from django.contrib.auth.forms import (AuthenticationForm, PasswordResetForm,
                                        SetPasswordForm, PasswordChangeForm)
 from django.contrib.auth.models import User
+from django.core.exceptions import PermissionDenied
 from django.core.urlresolvers import reverse
-from django.http import HttpResponse, HttpResponseRedirect
+from django.http import Http404, HttpResponse, HttpResponseRedirect
 from django.shortcuts import render_to_response, redirect
 from django.template import Context, loader, RequestContext
+from django.utils.crypto import constant_time_compare
 from django.utils.decorators import method_decorator
 from django.utils.translation import gettext as _
 from urllib2 import HTTPError
 
-from postorius import utils
+from postorius import metrics, profiling, utils
 from postorius.models import (Domain, List, Member, MailmanUser,
                               MailmanApiError, Mailman404Error)
 from postorius.forms import *
@@ -48,11 +50,61 @@ from postorius.auth.decorators import *
 @user_passes_test(lambda u: u.is_superuser)
 def site_settings(request):
     return render_to_response('postorius/site_settings.html',
+                              {'profiles': profiling.list_profiles()},
                               context_instance=RequestContext(request))
 
 
 @login_required
 @user_passes_test(lambda u: u.is_superuser)
+def profile_download(request, name):
+    """Returns a stored request profile, or a text summary of it if the
+    ``format`` parameter is ``text``.
+    """
+    profile = profiling.get_profile(name)
+    if profile is None:
+        raise Http404
+    if request.GET.get('format') == 'text':
+        return HttpResponse(profiling.profile_summary(profile),
+                            content_type='text/plain')
+    with open(profile.path, 'rb') as stream:
+        response = HttpResponse(stream.read(),
+                                content_type='application/octet-stream')
+    response['Content-Disposition'] = 'attachment; filename="{0}"'.format(
+        profile.name)
+    return response
+
+
+def _may_read_metrics(request):
+    if request.user.is_superuser:
+        return True
+    if request.META.get('REMOTE_ADDR') in getattr(
+            settings, 'METRICS_ALLOWED_IPS', ()):
+        return True
+    token = getattr(settings, 'METRICS_TOKEN', None)
+    return bool(token) and constant_time_compare(
+        request.META.get('HTTP_AUTHORIZATION', ''), 'Bearer ' + token)
+
+
+@basic_auth_login
+def metrics_view(request):
+    """Exposes the metrics of :mod:`postorius.metrics` in the Prometheus
+    text format to superusers, to the addresses in ``METRICS_ALLOWED_IPS``
+    and to requests sending ``METRICS_TOKEN`` as a bearer token.
+    """
+    if not _may_read_metrics(request):
+        raise PermissionDenied
+    return HttpResponse(metrics.REGISTRY.exposition(),
+                        content_type='text/plain; version=0.0.4')
+
+
+def _domain_index_etag(request):
+    return utils.make_etag(request, utils.get_cache_generation('domains'),
+                           utils.etag_time_bucket())
+
+
+@login_required
+@user_passes_test(lambda u: u.is_superuser)
+@utils.etag_condition(_domain_index_etag)
 def domain_index(request):
     try:
         existing_domains = Domain.objects.all()
@@ -81,6 +133,7 @@ def domain_new(request):
             except HTTPError, e:
                 messages.error(request, e)
             else:
+                utils.bump_cache_generation('domains')
                 messages.success(request, _("New Domain registered"))
             return redirect("domain_index")
     else:
@@ -97,6 +150,7 @@ def domain_delete(request, domain):
         try:
             client = utils.get_client()
             client.delete_domain(domain)
+            utils.bump_cache_generation('domains')
             messages.success(request,
                              _('The domain %s has been deleted.' % domain))
             return redirect("domain_index")
@@ -20,6 +20,8 @@
 import logging
 
 
+from django.conf import settings
+from django.core.paginator import EmptyPage, PageNotAnInteger, Paginator
 from django.forms.formsets import formset_factory
 from django.contrib import messages
 from django.contrib.auth import logout, authenticate, login
@@ -36,10 +38,10 @@ from urllib2 import HTTPError
 from postorius import utils
 from postorius.models import (
     MailmanUser, MailmanConnectionError, MailmanApiError, Mailman404Error,
-    AddressConfirmationProfile)
+    AddressConfirmationProfile, UserIndexEntry)
 from postorius.forms import *
 from postorius.auth.decorators import *
-from postorius.views.generic import MailmanUserView
+from postorius.views.generic import MailmanUserView, prefetch_preferences
 from smtplib import SMTPException
 
 
@@ -49,7 +51,7 @@ class UserMailmanSettingsView(MailmanUserView):
     @method_decorator(login_required)
     def post(self, request):
         try:
-            mm_user = MailmanUser.objects.get(address=request.user.email)
+            mm_user = self._require_user()
             global_preferences_form = UserPreferences(request.POST)
             if global_preferences_form.is_valid():
                 preferences = mm_user.preferences
@@ -70,7 +72,7 @@ class UserMailmanSettingsView(MailmanUserView):
     @method_decorator(login_required)
     def get(self, request):
         try:
-            mm_user = MailmanUser.objects.get(address=request.user.email)
+            mm_user = self._require_user()
             settingsform = UserPreferences(initial=mm_user.preferences)
         except MailmanApiError:
             return utils.render_api_error(request)
@@ -89,7 +91,7 @@ class UserAddressPreferencesView(MailmanUserView):
     @method_decorator(login_required)
     def post(self, request):
         try:
-            mm_user = MailmanUser.objects.get(address=request.user.email)
+            mm_user = self._require_user()
             formset_class = formset_factory(UserPreferences)
             formset = formset_class(request.POST)
             zipped_data = zip(formset.forms, mm_user.addresses)
@@ -114,7 +116,7 @@ class UserAddressPreferencesView(MailmanUserView):
     def get(self, request):
         try:
             helperform = UserPreferences()
-            mm_user = MailmanUser.objects.get(address=request.user.email)
+            mm_user = self._require_user()
             addresses = mm_user.addresses
             i = 0
             for address in addresses:
@@ -146,7 +148,7 @@ class UserSubscriptionPreferencesView(MailmanUserView):
     @method_decorator(login_required)
     def post(self, request):
         try:
-            mm_user = MailmanUser.objects.get(address=request.user.email)
+            mm_user = self._require_user()
             formset_class = formset_factory(UserPreferences)
             formset = formset_class(request.POST)
             zipped_data = zip(formset.forms, mm_user.subscriptions)
@@ -169,7 +171,7 @@ class UserSubscriptionPreferencesView(MailmanUserView):
     @method_decorator(login_required)
     def get(self, request):
         try:
-            mm_user = MailmanUser.objects.get(address=request.user.email)
+            mm_user = self._require_user()
             subscriptions = mm_user.subscriptions
             i = len(subscriptions)
             member_subscriptions = []
@@ -219,7 +221,18 @@ class UserSubscriptionsView(MailmanUserView):
     """
 
     def get(self, request):
-        memberships = self._get_memberships()
+        paginator = Paginator(self._get_memberships(), getattr(
+            settings, 'SUBSCRIPTIONS_PAGE_SIZE', 50))
+        try:
+            memberships = paginator.page(request.GET.get('page', 1))
+        except PageNotAnInteger:
+            memberships = paginator.page(1)
+        except EmptyPage:
+            memberships = paginator.page(paginator.num_pages)
+        # Only the rows on this page whose delivery mode is not part of
+        # the membership need their preferences.
+        prefetch_preferences(row for row in memberships
+                             if 'delivery_mode' not in row.entry)
         return render_to_response('postorius/user_subscriptions.html',
                                   {'memberships': memberships},
                                   context_instance=RequestContext(request))
@@ -256,27 +269,99 @@ class AddressActivationView(TemplateView):
                                   context_instance=RequestContext(request))
 
 
+class _UserPageEntries(object):
+    """One page of Mailman's users, sized like the whole collection.
+
+    Lets a Paginator work on the users without fetching all of them.
+    """
+
+    def __init__(self, entries, offset, total_size):
+        self.entries = entries
+        self.offset = offset
+        self.total_size = total_size
+
+    def count(self):
+        return self.total_size
+
+    def __len__(self):
+        return self.total_size
+
+    def __getitem__(self, key):
+        return self.entries[key.start - self.offset:key.stop - self.offset]
+
+
+def _mailman_user_pages(count, page):
+    """Returns a Paginator over Mailman's users holding only ``page``."""
+    response, content = utils.get_client()._connection.call(
+        'users?count={0}&page={1}'.format(count, page))
+    return Paginator(_UserPageEntries(
+        content.get('entries', []), (page - 1) * count,
+        content.get('total_size', 0)), count)
+
+
 @user_passes_test(lambda u: u.is_superuser)
 def user_index(request, page=1, template='postorius/users/index.html'):
     """Show a table of all users.
+
+    The users are taken from the index maintained by the ``index_users``
+    command, which can be searched with the ``q`` parameter. Until the
+    index exists, the users are paged from Mailman. The page size is
+    chosen with ``count`` from ``USER_INDEX_PAGE_SIZES``.
     """
-    page = int(page)
-    error = None
+    page_sizes = getattr(settings, 'USER_INDEX_PAGE_SIZES',
+                         (25, 50, 100, 200))
     try:
-        mm_user_page = utils.get_client().get_user_page(25, page)
-    except MailmanApiError:
-        return utils.render_api_error(request)
+        count = int(request.GET.get('count', page_sizes[0]))
+    except ValueError:
+        count = page_sizes[0]
+    if count not in page_sizes:
+        count = page_sizes[0]
+    try:
+        page = int(request.GET.get('page', page))
+    except ValueError:
+        page = 1
+    query = request.GET.get('q', '').strip()
+    indexed = UserIndexEntry.objects.exists()
+    if indexed or query:
+        users = UserIndexEntry.objects.search(query)
+        if query and '@' in query and not users.exists():
+            # Addresses not yet in the index can still be looked up.
+            users = _find_user_by_address(query)
+        paginator = Paginator(users, count)
+    else:
+        try:
+            paginator = _mailman_user_pages(count, max(page, 1))
+            if not 1 <= page <= paginator.num_pages:
+                # Show the last page, fetched at its own offset.
+                page = max(paginator.num_pages, 1)
+                paginator = _mailman_user_pages(count, page)
+        except (MailmanApiError, MailmanConnectionError):
+            return utils.render_api_error(request)
+    try:
+        mm_user_page = paginator.page(page)
+    except (EmptyPage, PageNotAnInteger):
+        mm_user_page = paginator.page(max(paginator.num_pages, 1))
     return render_to_response(
         template,
-        {'error': error,
-         'mm_user_page': mm_user_page,
-         'mm_user_page_nr': page,
-         'mm_user_page_previous_nr': page - 1,
-         'mm_user_page_next_nr': page + 1,
-         'mm_user_page_show_next': len(mm_user_page) >= 25},
+        {'mm_user_page': mm_user_page,
+         'query': query,
+         'indexed': indexed,
+         'count': count,
+         'page_sizes': page_sizes},
         context_instance=RequestContext(request))
 
 
+def _find_user_by_address(address):
+    try:
+        mm_user = MailmanUser.objects.get(address=address)
+        return [dict(user_id=mm_user.user_id,
+                     display_name=mm_user.display_name,
+                     created_on=mm_user.created_on,
+                     addresses=[address])]
+    except (Mailman404Error, MailmanApiError, MailmanConnectionError):
+        return []
+
+
 @user_passes_test(lambda u: u.is_superuser)
 def user_new(request):
     message = None
@@ -362,6 +447,8 @@ def _add_address(request, user_email, address):
         mailman_user.add_address(address)
     except (MailmanApiError, MailmanConnectionError) as e:
         messages.error(request, 'The address could not be added.')
+    for user in User.objects.filter(email=user_email):
+        MailmanUser.objects.invalidate(user)
 
 
 def address_activation_link(request, activation_key):
@@ -371,11 +458,10 @@ def address_activation_link(request, activation_key):
     If the key is not valid, it will be ignored. 
     """
     try:
-        profile = AddressConfirmationProfile.objects.get(
+        profile = AddressConfirmationProfile.objects.unexpired().get(
             activation_key=activation_key)
-        if not profile.is_expired:
-            _add_address(request, profile.user.email, profile.email)
-    except profile.DoesNotExist:
+        _add_address(request, profile.user.email, profile.email)
+    except AddressConfirmationProfile.DoesNotExist:
         pass
     return render_to_response('postorius/user_address_activation_link.html',
         {}, context_instance=RequestContext(request))
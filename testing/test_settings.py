@@ -83,8 +83,10 @@ SECRET_KEY = '$!-7^wl#wiifjbh)5@f7ji%x!vp7s1vzbvwt26hxv$idixq0u0'
 
 # List of callables that know how to import templates from various sources.
 TEMPLATE_LOADERS = (
-    'django.template.loaders.filesystem.Loader',
-    'django.template.loaders.app_directories.Loader',
+    ('django.template.loaders.cached.Loader', (
+        'django.template.loaders.filesystem.Loader',
+        'django.template.loaders.app_directories.Loader',
+    )),
 )
 
 AUTHENTICATION_BACKENDS = (
@@ -153,3 +155,6 @@ BROWSERID_USERNAME_ALGO = username
 # Set VCR_RECORD_MODE to 'all' to re-record all API responses.
 # (Remember to use an empty mailman database!)
 VCR_RECORD_MODE = 'once'
+
+# Queued mail is sent explicitly in the tests.
+EMAIL_QUEUE_WORKER = False